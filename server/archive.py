@@ -0,0 +1,172 @@
+"""Archival of old finished orders, with their items and payment.
+
+archive() walks the live `order` table in id ranges of --batch-size ids.  In
+each range, orders in a terminal status (Completed, Cancelled) placed before
+the cutoff are copied, along with their order_item and payment rows, into
+order_archive / order_item_archive / payment_archive (same columns and ids),
+then deleted from the live tables.  Each range is one short transaction, so
+a crash leaves every order either live or archived, never both.  After a
+batch the job sleeps so that it is busy only --duty-cycle of the time; a
+batch that held the write lock for 20 ms is followed by 60 ms of idle at the
+default 0.25, leaving the lock to live traffic.
+
+Only orders the sales rollups have already folded in (at or below the
+rollup watermark) are moved, so run `python rollups.py run` first; rollup
+backfills read the archive too.
+
+Reads that need the full history go through order_history()/get_order()
+with include_archived=True; they return Order and ArchivedOrder objects with
+the same attributes (check `.archived` to tell them apart).
+
+    python archive.py --older-than-days 365 --batch-size 500 --duty-cycle 0.25
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.orm import selectinload
+
+import database
+from models import (db, ArchivedOrder, ArchivedOrderItem, ArchivedPayment, Order, OrderItem,
+                    Payment, RollupWatermark)
+from rollups import WATERMARK
+
+TERMINAL_STATUSES = ('Completed', 'Cancelled')
+
+ArchiveReport = namedtuple('ArchiveReport', ['orders', 'items', 'payments', 'batches', 'seconds'])
+
+# (live table, archive table) in the order rows are copied.
+TABLES = [(Order.__table__, ArchivedOrder.__table__),
+          (OrderItem.__table__, ArchivedOrderItem.__table__),
+          (Payment.__table__, ArchivedPayment.__table__)]
+
+
+def _bounds(connection, cutoff):
+    """(first, last) live order ids that could be archived, or None."""
+    o = Order.__table__.c
+    first = connection.execute(select(func.min(o.id))).scalar()
+    last = connection.execute(select(func.max(o.id)).where(o.created_at < cutoff)).scalar()
+    watermark = connection.execute(
+        select(RollupWatermark.last_order_id).where(RollupWatermark.name == WATERMARK)).scalar()
+    if first is None or last is None or not watermark:
+        return None
+    return first, min(last, watermark)
+
+
+def _copy(connection, live, archived, key, ids, now):
+    columns = [c.name for c in live.columns]
+    source = select(*live.columns).where(live.c[key].in_(ids))
+    if archived.c.get('archived_at') is not None:
+        source = source.add_columns(literal(now, DateTime()).label('archived_at'))
+        columns.append('archived_at')
+    connection.execute(insert(archived).from_select(columns, source))
+    return connection.execute(delete(live).where(live.c[key].in_(ids))).rowcount
+
+
+def archive_batch(connection, low, high, cutoff, statuses=TERMINAL_STATUSES, now=None):
+    """Move eligible orders with ids in [low, high]; returns (orders, items, payments)."""
+    o = Order.__table__.c
+    ids = connection.execute(
+        select(o.id).where(o.id.between(low, high), o.status.in_(statuses),
+                           o.created_at < cutoff)).scalars().all()
+    if not ids:
+        return 0, 0, 0
+    now = now or datetime.utcnow()
+    orders_table, items_table, payments_table = TABLES
+    # Children first: their rows reference the live order until it is gone.
+    items = _copy(connection, *items_table, 'order_id', ids, now)
+    payments = _copy(connection, *payments_table, 'order_id', ids, now)
+    orders = _copy(connection, *orders_table, 'id', ids, now)
+    return orders, items, payments
+
+
+def archive(engine, older_than=timedelta(days=365), batch_size=500, duty_cycle=0.25,
+            statuses=TERMINAL_STATUSES, max_batches=None, now=None):
+    """Archive finished orders placed more than `older_than` ago; returns an ArchiveReport."""
+    now = now or datetime.utcnow()
+    cutoff = now - older_than
+    started = time.perf_counter()
+    totals = [0, 0, 0]
+    batches = 0
+    with engine.connect() as connection:
+        bounds = _bounds(connection, cutoff)
+    if bounds is not None:
+        low, last = bounds
+        while low <= last and (max_batches is None or batches < max_batches):
+            high = min(low + batch_size - 1, last)
+            batch_started = time.perf_counter()
+            with database.write_transaction(engine) as connection:
+                moved = archive_batch(connection, low, high, cutoff, statuses, now)
+            totals = [t + n for t, n in zip(totals, moved)]
+            batches += 1
+            low = high + 1
+            if duty_cycle < 1:
+                busy = time.perf_counter() - batch_started
+                time.sleep(busy * (1 - duty_cycle) / duty_cycle)
+    return ArchiveReport(*totals, batches, time.perf_counter() - started)
+
+
+# Read-through: live orders first, archived ones on request.
+
+def history_query(model, user_id, limit):
+    """One user's Order or ArchivedOrder rows, newest first, items and payment loaded."""
+    stmt = (select(model)
+            .options(selectinload(model.order_items), selectinload(model.payment))
+            .where(model.user_id == user_id)
+            .order_by(model.created_at.desc(), model.id.desc()))
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def merge_history(live, archived, limit):
+    orders = live + archived
+    orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    return orders[:limit] if limit is not None else orders
+
+
+def order_history(session, user_id, include_archived=False, limit=20):
+    """A user's orders, newest first, with items and payment loaded.
+
+    include_archived merges in archived orders, so callers that need the full
+    history get it without knowing where each order lives.
+    """
+    orders = session.execute(history_query(Order, user_id, limit)).scalars().all()
+    if include_archived:
+        archived = session.execute(history_query(ArchivedOrder, user_id, limit)).scalars().all()
+        orders = merge_history(orders, archived, limit)
+    return orders
+
+
+def get_order(session, order_id, include_archived=True):
+    """The live order, else the archived one (unless include_archived is False)."""
+    order = session.get(Order, order_id)
+    if order is None and include_archived:
+        order = session.get(ArchivedOrder, order_id)
+    return order
+
+
+def main():
+    from app import create_app
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Move old finished orders to the archive.')
+    parser.add_argument('--older-than-days', type=int, default=365)
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='order ids per transaction')
+    parser.add_argument('--duty-cycle', type=float, default=0.25,
+                        help='fraction of wall time spent in transactions')
+    parser.add_argument('--max-batches', type=int)
+    args = parser.parse_args()
+
+    with app.app_context():
+        report = archive(db.engine, timedelta(days=args.older_than_days), args.batch_size,
+                         args.duty_cycle, max_batches=args.max_batches)
+    print(f'{report.orders} orders, {report.items} items, {report.payments} payments '
+          f'archived in {report.batches} batches, {report.seconds:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""ASGI entry point for the asyncio read path (async_routes.py).
+
+    uvicorn asgi:app --workers 4
+
+This app serves only the catalog, review and order-history GETs; the proxy
+in front sends those here.  Everything else stays on the WSGI app (wsgi.py):
+writes, also-bought, categories, the response cache and /metrics.  Tokens
+are checked with the same secret, and a logout on any worker reaches this
+app through the shared revocations within TOKEN_REVOCATION_POLL seconds.
+"""
+import os
+
+from async_routes import create_asgi_app
+
+app = create_asgi_app(os.environ.get('APP_CONFIG', 'production'))
@@ -0,0 +1,103 @@
+"""Asyncio read path: catalog, review and order-history reads on AsyncSession.
+
+The sync app ties up a worker for every request while SQLite (or whatever
+the database is) does its work.  This module runs the same reads on
+SQLAlchemy's asyncio engine over aiosqlite, so one event loop keeps many
+requests in flight.  It uses the same models.py mappings and the same
+statements as the sync path (catalog.listing_query, catalog.product_query,
+catalog.reviews_query, archive.history_query), so the results are
+identical.
+
+Connections are read-only and get the production pragmas (WAL, mmap,
+cache size; see database.py).  Writes stay on the sync app.  Every
+relationship a view needs is eager-loaded, so serializing a result after
+its session has closed never triggers a lazy load, which AsyncSession
+can't do.
+
+    from async_reads import reads
+    reads.init_app(app)                          # asgi.py does this
+    page = await reads.list_products(sort='price', limit=24)
+    product = await reads.get_product(42)
+    await reads.dispose()
+"""
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import archive
+import catalog
+import database
+from models import db, ArchivedOrder, Order
+
+# Sync driver -> asyncio driver for the same database.
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(url):
+    """The asyncio-driver URL for a sync SQLAlchemy URL."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return url.set(drivername=driver) if driver else url
+
+
+class AsyncReads:
+    def __init__(self):
+        self.engine = None
+        self.sessions = None
+
+    def init_app(self, app):
+        url = app.config.get('ASYNC_DATABASE_URI')
+        if url is None:
+            # The sync engine's URL, with Flask-SQLAlchemy's path resolution.
+            with app.app_context():
+                url = async_url(db.engine.url)
+        options = {}
+        if make_url(url).get_backend_name() == 'sqlite':
+            options['pool_size'] = app.config.get('ASYNC_POOL_SIZE', 8)
+        self.engine = create_async_engine(url, **options)
+        if self.engine.dialect.name == 'sqlite':
+            database.apply_pragmas(self.engine.sync_engine, app.config.get('SQLITE_PRAGMAS'),
+                                   readonly=True)
+        # Results are used after the session closes; nothing here writes.
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        app.extensions['async_reads'] = self
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def list_products(self, sort='newest', cursor=None, limit=24, category=None,
+                            min_rating=None, with_reviews=False, now=None):
+        """catalog.list_products: a Page of products after `cursor`."""
+        stmt, sort, limit = catalog.listing_query(sort, cursor, limit, category, min_rating,
+                                                  with_reviews, now)
+        async with self.sessions() as session:
+            rows = (await session.execute(stmt)).scalars().all()
+        return catalog.paginate(rows, sort, limit)
+
+    async def get_product(self, product_id, now=None):
+        """catalog.get_product: the product with reviews and active discounts, or None."""
+        async with self.sessions() as session:
+            return (await session.execute(
+                catalog.product_query(product_id, now))).scalars().first()
+
+    async def list_reviews(self, product_id, limit=20, before=None):
+        async with self.sessions() as session:
+            return (await session.execute(
+                catalog.reviews_query(product_id, limit, before))).scalars().all()
+
+    async def order_history(self, user_id, include_archived=False, limit=20):
+        """archive.order_history: newest first, items and payment loaded."""
+        async with self.sessions() as session:
+            orders = (await session.execute(
+                archive.history_query(Order, user_id, limit))).scalars().all()
+            if include_archived:
+                archived = (await session.execute(
+                    archive.history_query(ArchivedOrder, user_id, limit))).scalars().all()
+                orders = archive.merge_history(orders, archived, limit)
+        return orders
+
+
+reads = AsyncReads()
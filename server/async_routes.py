@@ -0,0 +1,171 @@
+"""Catalog, review and order-history reads as a minimal ASGI application.
+
+The asyncio counterpart of routes.py: the same URLs and JSON, with the
+data read through async_reads (AsyncSession on aiosqlite).  asgi.py is the
+entry point.
+
+    GET /products?sort=&cursor=&limit=&category=
+    GET /products/<id>
+    GET /products/<id>/reviews?limit=&before=
+    GET /orders?limit=&archived=0        Authorization: Bearer <token>
+
+There is no conditional-GET cache here, and errors are JSON bodies.  Token
+revocations from other processes are read by a background task in a worker
+thread, not by verify() on the event loop, and stale effective prices are
+reloaded in a worker thread before a product response is serialized.
+"""
+import asyncio
+import json
+import logging
+import re
+from urllib.parse import parse_qs
+
+import routes
+from app import create_app
+from async_reads import reads
+from models import Product, Review
+from pricing import prices
+from serializers import serialize, serialize_many
+from tokens import tokens
+
+log = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _arg(query, name, default=None):
+    return query.get(name, [default])[0]
+
+
+def _int(query, name, default=None):
+    # Like request.args.get(name, default, type=int): junk means the default.
+    try:
+        return int(query[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+async def _load_prices():
+    # Serializing effective_price would reload stale prices synchronously.
+    if not prices.fresh():
+        await asyncio.to_thread(prices.refresh)
+
+
+async def list_products(query, headers):
+    try:
+        page = await reads.list_products(sort=_arg(query, 'sort', 'newest'),
+                                         cursor=_arg(query, 'cursor'),
+                                         limit=_int(query, 'limit', 24),
+                                         category=_arg(query, 'category'))
+    except ValueError:
+        raise HTTPError(400, 'bad request')
+    await _load_prices()
+    return {'items': serialize_many(page.items, 'listing', Product),
+            'next_cursor': page.next_cursor}
+
+
+async def get_product(query, headers, product_id):
+    product = await reads.get_product(int(product_id))
+    if product is None:
+        raise HTTPError(404, 'not found')
+    await _load_prices()
+    return serialize(product, 'detail')
+
+
+async def list_reviews(query, headers, product_id):
+    limit = max(1, min(_int(query, 'limit', 20), routes.MAX_REVIEWS))
+    reviews = await reads.list_reviews(int(product_id), limit, _int(query, 'before'))
+    return serialize_many(reviews, 'default', Review)
+
+
+async def order_history(query, headers):
+    user_id = routes.bearer_user_id(headers.get('authorization'), poll=False)
+    if user_id is None:
+        raise HTTPError(401, 'unauthorized')
+    limit = max(1, min(_int(query, 'limit', 20), routes.MAX_ORDERS))
+    include_archived = _arg(query, 'archived', '1') != '0'
+    orders = await reads.order_history(user_id, include_archived, limit)
+    return [serialize(order, 'detail') for order in orders]
+
+
+ROUTES = [
+    (re.compile(r'/products'), list_products),
+    (re.compile(r'/products/(\d+)'), get_product),
+    (re.compile(r'/products/(\d+)/reviews'), list_reviews),
+    (re.compile(r'/orders'), order_history),
+]
+
+
+async def poll_revocations():
+    while True:
+        try:
+            await asyncio.to_thread(tokens.poll)
+        except Exception:
+            log.exception('polling token revocations failed')
+        await asyncio.sleep(tokens.poll_interval)
+
+
+class ReadApp:
+    """A minimal ASGI application: GET routes returning JSON."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self._poller = None
+
+    def _start_polling(self):
+        # At startup, or on the first request if the server skips lifespan.
+        if self._poller is None:
+            self._poller = asyncio.get_running_loop().create_task(poll_revocations())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            self._start_polling()
+            status, payload = await self._handle(scope)
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': [(b'content-type', b'application/json'),
+                                    (b'content-length', str(len(body)).encode())]})
+            await send({'type': 'http.response.body', 'body': body})
+
+    async def _handle(self, scope):
+        for pattern, handler in self.routes:
+            match = pattern.fullmatch(scope['path'])
+            if match is not None:
+                break
+        else:
+            return 404, {'error': 'not found'}
+        if scope['method'] not in ('GET', 'HEAD'):
+            return 405, {'error': 'method not allowed'}
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        headers = {name.decode('latin-1'): value.decode('latin-1')
+                   for name, value in scope['headers']}
+        try:
+            return 200, await handler(query, headers, *match.groups())
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start_polling()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._poller is not None:
+                    self._poller.cancel()
+                    self._poller = None
+                await reads.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None):
+    """The ASGI app for a create_app() config (name, class or dict)."""
+    reads.init_app(create_app(config))
+    return ReadApp(ROUTES)
@@ -0,0 +1,183 @@
+"""Load test: the asyncio read path (asgi.py) vs. the sync app (wsgi.py).
+
+Seeds a database, starts each server with the same number of worker
+processes (gunicorn sync workers vs. uvicorn), and drives both with the
+same request mix at several concurrency levels: product listings, product
+details, review pages and signed-in order history.  Every request opens its
+own connection (gunicorn's sync workers don't keep connections alive).  The
+response cache is off on the sync side, so both paths do the same database
+work per request.
+
+    cd server && python -m benchmarks.async_reads --workers 2 --concurrency 1 16 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from models import db
+from seeding import SeedConfig, seed
+from tokens import TokenManager
+
+SECRET = 'load-test-secret'
+SORTS = ('newest', 'price', 'price_desc', 'rating')
+
+
+def _config():
+    return {'SQLALCHEMY_DATABASE_URI': os.environ['BENCH_DATABASE_URI'], 'DEBUG': False,
+            'SECRET_KEY': SECRET, 'RESPONSE_CACHE_MAX_ENTRIES': 0,
+            'SQL_METRICS_SAMPLE_RATE': 0.0,
+            'CART_STORE_JOURNAL_DIR': os.environ.get('BENCH_JOURNAL_DIR')}
+
+
+def sync_app():
+    """gunicorn factory: the WSGI app as wsgi.py builds it, for the load-test database."""
+    import prefork
+    from app import create_app
+
+    app = create_app(_config())
+    prefork.warm_up(app)
+    prefork.install(app)
+    return app
+
+
+def async_app():
+    """uvicorn factory: the ASGI app as asgi.py builds it, for the load-test database."""
+    from async_routes import create_asgi_app
+    return create_asgi_app(_config())
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    if kind == 'sync':
+        cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--preload',
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+               'benchmarks.async_reads:sync_app()']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', '--factory', '--workers', str(workers),
+               '--port', str(port), '--log-level', 'warning', '--no-access-log',
+               'benchmarks.async_reads:async_app']
+    return subprocess.Popen(cmd, env=env)
+
+
+async def request(port, path, token=None):
+    """(status, seconds) of one GET on a fresh connection."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    auth = f'Authorization: Bearer {token}\r\n' if token else ''
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n{auth}'
+                 f'Connection: close\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b' ', 2)[1]) if response else 0
+    return status, time.perf_counter() - started
+
+
+async def wait_until_up(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = await request(port, '/products?limit=1')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def next_request(rng, sizes, tokens):
+    kind = rng.random()
+    if kind < 0.4:
+        return f'/products?sort={rng.choice(SORTS)}&limit=24', None
+    if kind < 0.7:
+        return f'/products/{rng.randint(1, sizes.products)}', None
+    if kind < 0.85:
+        return f'/products/{rng.randint(1, sizes.products)}/reviews', None
+    return '/orders', rng.choice(tokens)
+
+
+async def drive(port, concurrency, seconds, sizes, tokens, seed):
+    samples, failures = [], 0
+    stop = time.monotonic() + seconds
+
+    async def client(n):
+        nonlocal failures
+        rng = random.Random(f'{seed}:{n}')
+        while time.monotonic() < stop:
+            path, token = next_request(rng, sizes, tokens)
+            try:
+                status, elapsed = await request(port, path, token)
+            except OSError:
+                status, elapsed = 0, 0
+            if status == 200:
+                samples.append(elapsed)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    wall = time.perf_counter() - started
+    ms = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {'requests': len(ms), 'failures': failures, 'rps': len(ms) / wall,
+            'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='processes per server')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sizes = SeedConfig(users=2_000, products=args.products, orders=args.products * 2,
+                       reviews=args.products * 2, bcrypt_rounds=4, batch_size=50_000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load.db')
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        seed(engine, sizes)
+        engine.dispose()
+        signer = TokenManager(secret=SECRET)
+        tokens = [signer.issue(user_id) for user_id in range(1, sizes.users + 1, 7)]
+        env = dict(os.environ, BENCH_DATABASE_URI=f'sqlite:///{path}',
+                   BENCH_JOURNAL_DIR=os.path.join(tmp, 'journal'),
+                   PYTHONPATH=os.getcwd())
+
+        print(f'{args.workers} workers each; {args.seconds:.0f}s per run')
+        print(f'{"server":<7} {"clients":>7} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+              f'{"p99 ms":>8} {"failed":>7}')
+        for kind in ('sync', 'async'):
+            port = _free_port()
+            server = start_server(kind, port, args.workers, env)
+            try:
+                asyncio.run(wait_until_up(port))
+                for concurrency in args.concurrency:
+                    r = asyncio.run(drive(port, concurrency, args.seconds, sizes, tokens,
+                                          args.seed))
+                    print(f'{kind:<7} {concurrency:>7} {r["rps"]:>8.0f} {r["p50"]:>8.1f} '
+                          f'{r["p95"]:>8.1f} {r["p99"]:>8.1f} {r["failures"]:>7}')
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
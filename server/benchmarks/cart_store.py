@@ -0,0 +1,88 @@
+"""Add-to-cart throughput: one ORM transaction per change vs. the cart store.
+
+Simulated shoppers add products and change quantities in their carts.  The
+baseline writes each change straight to CartItem and bumps Cart.updated_at in
+its own transaction, as a plain view would; the store takes the same changes
+and writes them behind on its flush interval.
+
+    cd server && python -m benchmarks.cart_store --changes 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import select
+
+from app import create_app
+from cart_store import carts
+from models import db, Cart, CartItem
+from seeding import SeedConfig, seed
+
+
+def orm_change(cart_id, product_id, delta):
+    item = db.session.execute(select(CartItem).where(
+        CartItem.cart_id == cart_id, CartItem.product_id == product_id)).scalar()
+    if item is None:
+        db.session.add(CartItem(cart_id=cart_id, product_id=product_id, quantity=max(delta, 1)))
+    elif item.quantity + delta <= 0:
+        db.session.delete(item)
+    else:
+        item.quantity += delta
+    db.session.get(Cart, cart_id).updated_at = db.func.current_timestamp()
+    db.session.commit()
+
+
+def store_change(cart_id, product_id, delta):
+    carts.add_item(cart_id, product_id, delta)
+
+
+def run(change, cart_ids, args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.changes):
+        cart_id = rng.choice(cart_ids)
+        # Shoppers fiddle with a handful of products each.
+        product_id = 1 + (cart_id * 7 + rng.randint(0, 4)) % args.products
+        change(cart_id, product_id, rng.choice([1, 1, 1, -1]))
+    return args.changes / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--changes', type=int, default=20_000)
+    parser.add_argument('--carts', type=int, default=500)
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--fsync', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'cart.db')}",
+                          'DEBUG': False, 'CART_STORE_JOURNAL_DIR': os.path.join(tmp, 'journal'),
+                          'CART_STORE_FSYNC': args.fsync})
+        with app.app_context():
+            db.create_all()
+            seed(db.engine, SeedConfig(users=args.carts, products=args.products, orders=0,
+                                       reviews=0, bcrypt_rounds=4, cart_ratio=0))
+            cart_ids = [carts.cart_for_user(user_id) for user_id in range(1, args.carts + 1)]
+
+            orm = run(orm_change, cart_ids, args)
+            db.session.execute(CartItem.__table__.delete())
+            db.session.commit()
+            store = run(store_change, cart_ids, args)
+            carts.close()
+            stats = carts.stats()
+
+    print(f'{"mode":<12} {"changes/s":>10}')
+    print(f'{"orm":<12} {orm:>10,.0f}')
+    print(f'{"cart store":<12} {store:>10,.0f}')
+    print(f'coalescing ratio {stats["coalescing_ratio"]:.1f} '
+          f'({stats["changes"]:,} changes -> {stats["rows_written"]:,} rows), '
+          f'{stats["flushes"]} flushes, avg {stats["flush_ms_avg"]:.1f} ms, '
+          f'max {stats["flush_ms_max"]:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
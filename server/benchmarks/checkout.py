@@ -0,0 +1,85 @@
+"""Concurrent checkout stress test: proves no oversell, measures checkouts/sec.
+
+Many threads check out random carts against a small, scarce catalog so most
+products sell out mid-run.  Afterwards every product must satisfy
+
+    initial stock - sold == final stock >= 0
+
+    cd server && python -m benchmarks.checkout --threads 16 --checkouts 4000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func, insert, select
+
+from checkout import OutOfStock, checkout
+from models import db, OrderItem, Product, User
+from pricing import prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--checkouts', type=int, default=4000)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--stock', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'checkout.db')}",
+                               connect_args={'timeout': 60}, pool_size=args.threads)
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(User).values(
+                id=1, firstname='Load', lastname='Test', username='load', email='load@example.com',
+                _password_hash='x'))
+            connection.execute(insert(Product), [
+                {'id': i, 'name': f'Product {i}', 'price': 10.0 + i, 'stock': args.stock,
+                 'creator_id': 1} for i in range(1, args.products + 1)])
+        # checkout() takes discounts from pricing.prices; there's no app to bind it.
+        prices.bind(engine)
+
+        counts = {'ok': 0, 'short': 0}
+        lock = threading.Lock()
+
+        def one(seed):
+            rng = random.Random(seed)
+            picked = rng.sample(range(1, args.products + 1), rng.randint(1, 4))
+            lines = sorted((pid, rng.randint(1, 3)) for pid in picked)
+            try:
+                checkout(cart_id=None, user_id=1, lines=lines, clear_cart=False, engine=engine)
+                outcome = 'ok'
+            except OutOfStock:
+                outcome = 'short'
+            with lock:
+                counts[outcome] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(one, range(args.checkouts)))
+        elapsed = time.perf_counter() - started
+
+        with engine.connect() as connection:
+            sold = dict(connection.execute(
+                select(OrderItem.product_id, func.sum(OrderItem.quantity))
+                .group_by(OrderItem.product_id)).all())
+            stock = dict(connection.execute(select(Product.id, Product.stock)).all())
+        engine.dispose()
+
+    oversold = [pid for pid, left in stock.items()
+                if left < 0 or args.stock - sold.get(pid, 0) != left]
+    print(f'{args.checkouts} checkouts on {args.threads} threads in {elapsed:.2f}s '
+          f'({args.checkouts / elapsed:,.0f}/sec)')
+    print(f'placed {counts["ok"]}, rejected short {counts["short"]}, '
+          f'sold out {sum(1 for left in stock.values() if left == 0)}/{args.products}')
+    print('stock consistent, no oversell' if not oversold else f'OVERSOLD: {oversold}')
+    return 1 if oversold else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
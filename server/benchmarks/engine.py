@@ -0,0 +1,113 @@
+"""Mixed read/write throughput: default engine vs. the SQLite profile.
+
+Reader threads fetch random products by id; writer threads bump stock on a
+random product and insert a review.  With the default engine every writer
+commits on its own under a rollback journal; with the profile reads use the
+read-only WAL pool and writes are group-committed by the single writer.
+
+    cd server && python -m benchmarks.engine --readers 8 --writers 4 --seconds 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from database import SQLiteProfile
+from models import db, Product, Review
+from seeding import SeedConfig, seed
+
+
+def _write(connection, rng, products):
+    pid = rng.randint(1, products)
+    connection.execute(update(Product).where(Product.id == pid).values(stock=Product.stock + 1))
+    connection.execute(insert(Review).values(user_id=1, product_id=pid, rating=5, comment='bench'))
+
+
+def _read(connection, rng, products):
+    pid = rng.randint(1, products)
+    connection.execute(select(Product.id, Product.name, Product.price)
+                       .where(Product.id == pid)).all()
+
+
+def run(kind, path, args):
+    stop = time.monotonic() + args.seconds
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    if kind == 'default':
+        engine = create_engine(f'sqlite:///{path}')
+
+        def read(rng):
+            with engine.connect() as connection:
+                _read(connection, rng, args.products)
+
+        def write(rng):
+            with engine.begin() as connection:
+                _write(connection, rng, args.products)
+    else:
+        profile = SQLiteProfile(path, read_pool_size=args.readers)
+
+        def read(rng):
+            with profile.reader() as connection:
+                _read(connection, rng, args.products)
+
+        def write(rng):
+            profile.write(_write, rng, args.products).result()
+
+    def loop(fn, counter, seed_):
+        rng = random.Random(seed_)
+        done = errors = 0
+        while time.monotonic() < stop:
+            try:
+                fn(rng)
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts[counter] += done
+            counts['errors'] += errors
+
+    threads = [threading.Thread(target=loop, args=(read, 'reads', i)) for i in range(args.readers)]
+    threads += [threading.Thread(target=loop, args=(write, 'writes', 1000 + i))
+                for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if kind == 'default':
+        engine.dispose()
+    else:
+        profile.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--products', type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f'{"engine":<10} {"reads/s":>10} {"writes/s":>10} {"lock errors":>12}')
+    for kind in ('default', 'profile'):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'engine.db')
+            engine = create_engine(f'sqlite:///{path}')
+            db.metadata.create_all(engine)
+            seed(engine, SeedConfig(users=100, products=args.products, orders=0, reviews=0,
+                                    bcrypt_rounds=4))
+            engine.dispose()
+            counts = run(kind, path, args)
+        print(f'{kind:<10} {counts["reads"] / args.seconds:>10,.0f} '
+              f'{counts["writes"] / args.seconds:>10,.0f} {counts["errors"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
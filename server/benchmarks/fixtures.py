@@ -0,0 +1,83 @@
+"""Test database resets: reseeding vs. template clones vs. SAVEPOINT rollback.
+
+Times the ways a test can get a pristine seeded database:
+
+    reseed         drop_all/create_all + seed(), as seed_db() does
+    clone_memory   fixtures.create_app() on a :memory: backup of the template
+    clone_file     the same into a temp file
+    rollback       one fixtures.rollback() block that adds and commits a review
+
+The template is built (or found in the cache) before anything is timed.
+
+    cd server && python -m benchmarks.fixtures --products 1000 --rounds 12
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import fixtures
+from app import create_app
+from models import db, Review
+from seeding import SeedConfig, seed
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost of seeded users')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    config = SeedConfig(users=max(args.products // 10, 10), products=args.products,
+                        orders=args.products, reviews=args.products,
+                        bcrypt_rounds=args.rounds)
+    fixtures.template(config)
+
+    def reseed():
+        app = create_app('testing')
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            seed(db.engine, config)
+            db.engine.dispose()
+
+    tmp = tempfile.mkdtemp()
+
+    def clone_file():
+        path = os.path.join(tmp, f'{time.time_ns()}.db')
+        app = fixtures.create_app(config, target=path)
+        with app.app_context():
+            db.engine.dispose()
+        os.remove(path)
+
+    app = fixtures.create_app(config)
+
+    def rollback():
+        with fixtures.rollback(app):
+            db.session.add(Review(user_id=1, product_id=1, rating=4, comment='fine'))
+            db.session.commit()
+
+    runs = [('reseed', reseed, max(args.repeat // 10, 1)),
+            ('clone_memory', lambda: fixtures.create_app(config), args.repeat),
+            ('clone_file', clone_file, args.repeat),
+            ('rollback', rollback, args.repeat * 10)]
+    print(f'{config.products:,} products, {config.users:,} users at {args.rounds} bcrypt rounds')
+    print(f'{"reset":<14} {"ms (median)":>12}')
+    for name, fn, n in runs:
+        print(f'{name:<14} {timed(fn, n):>12.1f}')
+    os.rmdir(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Login throughput vs. hashing pool size.
+
+    cd server && python -m benchmarks.login --logins 200 --threads 32 --rounds 10
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hashing import HashingPool
+
+
+def run(pool_size, logins, threads, rounds):
+    pool = HashingPool(rounds=rounds, workers=pool_size, max_queue=threads, timeout=60)
+    stored = pool.hash_password("password123")
+
+    def login(_):
+        return pool.check_password(stored, "password123")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as clients:
+        results = list(clients.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--sizes", type=int, nargs="*",
+                        default=sorted({1, 2, 4, 8, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    print(f"{'pool size':>9} {'logins/sec':>12}")
+    for size in args.sizes:
+        rate = run(size, args.logins, args.threads, args.rounds)
+        print(f"{size:>9} {rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Login throttle: cost per check, and bcrypt work spent during a flood.
+
+Times throttle.admit() with the in-process LRU and with the shared SQLite
+store.  Then replays a simulated credential-stuffing flood: --attempts
+guesses over --minutes from --addresses sources, each trying a different
+username, alongside ordinary users logging in once a second.  Reported
+for each run: the attempts let through to bcrypt, the bcrypt CPU time they
+cost (measured per check at --rounds), and the legitimate logins that got
+through.
+
+    cd server && python -m benchmarks.login_throttle --attempts 100000 --addresses 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from hashing import HashingPool
+from throttle import LoginThrottle, MemoryBuckets, SQLiteBuckets, Throttled
+
+
+def admit_cost(throttle, n):
+    started = time.perf_counter()
+    for i in range(n):
+        try:
+            throttle.admit(f'user{i % 5000}', f'10.0.{i % 50}.1', now=i * 0.01)
+        except Throttled:
+            pass
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def flood(throttle, args):
+    rng = random.Random(args.seed)
+    seconds = args.minutes * 60
+    events = [(rng.uniform(0, seconds), 'attack', f'victim{i}', f'198.51.100.{i % args.addresses}')
+              for i in range(args.attempts)]
+    events += [(t, 'user', f'user{rng.randint(1, 10_000)}', f'203.0.113.{rng.randint(1, 250)}')
+               for t in range(int(seconds))]
+    events.sort()
+    admitted = {'attack': 0, 'user': 0}
+    for now, kind, username, address in events:
+        try:
+            throttle.admit(username, address, now=now)
+        except Throttled:
+            continue
+        admitted[kind] += 1
+    return admitted, len(events) - args.attempts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=100_000)
+    parser.add_argument('--addresses', type=int, default=20)
+    parser.add_argument('--minutes', type=float, default=10)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--checks', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pool = HashingPool(rounds=args.rounds, workers=1)
+    stored = pool.hash_password('password')
+    started = time.perf_counter()
+    for _ in range(5):
+        pool.check_password(stored, 'wrong')
+    bcrypt_seconds = (time.perf_counter() - started) / 5
+    pool.shutdown()
+    print(f'bcrypt check at {args.rounds} rounds: {bcrypt_seconds * 1000:.0f} ms')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {'memory': lambda: MemoryBuckets(),
+                  'sqlite': lambda: SQLiteBuckets(os.path.join(tmp, f'{time.time_ns()}.db'))}
+        print(f'\n{"store":<8} {"us/admit()":>10}')
+        for name, store in stores.items():
+            print(f'{name:<8} {admit_cost(LoginThrottle(store=store()), args.checks):>10.1f}')
+
+        print(f'\n{args.attempts:,} guesses from {args.addresses} addresses over '
+              f'{args.minutes:.0f} min, plus one real login a second')
+        print(f'{"throttle":<10} {"to bcrypt":>10} {"bcrypt CPU s":>13} {"real logins ok":>15}')
+        for name, throttle in (('off', LoginThrottle(enabled=False)),
+                               ('memory', LoginThrottle(store=stores['memory']())),
+                               ('sqlite', LoginThrottle(store=stores['sqlite']()))):
+            admitted, users = flood(throttle, args)
+            through = admitted['attack'] + admitted['user']
+            print(f'{name:<10} {through:>10,} {through * bcrypt_seconds:>13,.0f} '
+                  f'{admitted["user"]:>7,}/{users:,}')
+
+
+if __name__ == '__main__':
+    main()
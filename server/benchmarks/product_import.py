@@ -0,0 +1,118 @@
+"""Bulk product import throughput: streaming upserts vs. one ORM object per row.
+
+Generates a merchant catalog (a few rows deliberately invalid), imports it
+as CSV and as NDJSON, re-imports it unchanged and then with new prices and
+stock (every row an update), and times a plain ORM loop over a slice of it
+for comparison.
+
+    cd server && python -m benchmarks.product_import --rows 100000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from app import create_app
+from models import db, Product, User
+from product_import import import_products
+from seeding import CATEGORY_NAMES
+
+
+def catalog(rows, seed):
+    rng = random.Random(seed)
+    for i in range(rows):
+        yield {
+            'sku': f'SKU-{i:07d}',
+            'name': f'Product {i}',
+            'description': 'Imported in bulk. ' * rng.randint(1, 5),
+            # One row in a thousand has a bad price.
+            'price': 'n/a' if i % 1000 == 999 else f'{rng.uniform(1, 2000):.2f}',
+            'category': rng.choice(CATEGORY_NAMES),
+            'stock': rng.randint(0, 500),
+            'image_url': f'http://example.com/sku/{i}.jpg',
+        }
+
+
+def as_csv(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=['sku', 'name', 'description', 'price', 'category',
+                                             'stock', 'image_url'])
+    writer.writeheader()
+    writer.writerows(records)
+    out.seek(0)
+    return out
+
+
+def as_ndjson(records):
+    out = io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+    return out
+
+
+def run(owner_id, stream, fmt, batch_size):
+    started = time.perf_counter()
+    rows = inserted = updated = errors = 0
+    for report in import_products(db.engine, stream, owner_id, fmt, batch_size):
+        rows += report.rows
+        inserted += report.inserted
+        updated += report.updated
+        errors += len(report.errors)
+    elapsed = time.perf_counter() - started
+    return rows / elapsed, inserted, updated, errors
+
+
+def orm_loop(owner_id, records):
+    started = time.perf_counter()
+    for record in records:
+        try:
+            price = float(record['price'])
+        except ValueError:
+            continue
+        db.session.add(Product(creator_id=owner_id, sku='ORM-' + record['sku'],
+                               name=record['name'], description=record['description'],
+                               price=price, category=record['category'],
+                               stock=record['stock'], image_url=record['image_url']))
+        db.session.commit()
+    return len(records) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--orm-rows', type=int, default=2_000)
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    records = list(catalog(args.rows, args.seed))
+    repriced = [dict(record, price=f'{i % 500 + 0.99}', stock=i % 7)
+                for i, record in enumerate(records)]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'import.db')}",
+                          'DEBUG': False})
+        with app.app_context():
+            db.create_all()
+            for n, fmt in enumerate(('csv', 'ndjson'), 1):
+                owner = User(firstname='Bulk', lastname='Merchant', username=f'merchant{n}',
+                             email=f'merchant{n}@example.com', is_owner=True)
+                owner._password_hash = 'x'
+                db.session.add(owner)
+                db.session.commit()
+                owner_id = owner.id
+                db.session.commit()  # don't hold a read snapshot across the import
+                encode = as_csv if fmt == 'csv' else as_ndjson
+                print(f'{fmt:<7} {"rows/s":>9} {"inserted":>9} {"updated":>9} {"errors":>7}')
+                for label, source in (('import', records), ('unchanged', records),
+                                      ('repriced', repriced)):
+                    rate, inserted, updated, errors = run(owner_id, encode(source), fmt,
+                                                          args.batch_size)
+                    print(f'{label:<10} {rate:>9,.0f} {inserted:>9,} {updated:>9,} {errors:>7,}')
+            rate = orm_loop(owner_id, records[:args.orm_rows])
+            print(f'ORM, one commit per product: {rate:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
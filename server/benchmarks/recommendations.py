@@ -0,0 +1,104 @@
+"""Co-purchase recommendations: build time and memory, update time, read latency.
+
+Seeds --orders orders, builds the matrix and neighbour table in a fresh
+process (so its peak RSS is the build's own), folds in 1% more orders with
+update(), then compares the product-page read against the per-request
+self-join it replaces.
+
+    cd server && python -m benchmarks.recommendations --orders 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import recommendations
+from benchmarks.rollups import _add_orders
+from models import db
+from seeding import SeedConfig, seed
+
+SELF_JOIN = text(
+    'SELECT b.product_id, count(*) AS n FROM order_item a '
+    'JOIN order_item b ON b.order_id = a.order_id AND b.product_id != a.product_id '
+    'WHERE a.product_id = :product_id GROUP BY b.product_id ORDER BY n DESC LIMIT 10')
+
+
+def _child(db_path, matrix_path, build, queue):
+    import numpy  # noqa: F401  (count the libraries in the baseline, not the build)
+    import scipy.sparse  # noqa: F401
+    engine = create_engine(f'sqlite:///{db_path}')
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report = recommendations.build(engine, matrix_path) if build else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((report, baseline, peak))
+
+
+def _in_fresh_process(db_path, matrix_path, build):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(db_path, matrix_path, build, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _median_ms(fn, args, repeat):
+    samples = []
+    for arg in args:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn(arg)
+            samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'recommendations.db')
+        matrix_path = os.path.join(tmp, 'copurchase.npz')
+        engine = create_engine(f'sqlite:///{db_path}')
+        db.metadata.create_all(engine)
+        started = time.perf_counter()
+        seed(engine, SeedConfig(users=10_000, products=args.products, orders=args.orders,
+                                reviews=0, bcrypt_rounds=4, cart_ratio=0, address_ratio=0,
+                                payment_ratio=0, batch_size=50_000))
+        print(f'seeded {args.orders:,} orders in {time.perf_counter() - started:.0f}s')
+
+        report, baseline, peak = _in_fresh_process(db_path, matrix_path, build=True)
+        print(f'build: {report.seconds:.1f}s, {report.nonzeros:,} nonzeros, '
+              f'{report.products:,} products; peak RSS {peak / 1024:.0f} MB '
+              f'({(peak - baseline) / 1024:.0f} MB over the idle process), '
+              f'matrix file {os.path.getsize(matrix_path) / 2**20:.1f} MB')
+
+        _add_orders(engine, args.orders // 100)
+        report = recommendations.update(engine, matrix_path)
+        print(f'update: {report.orders:,} new orders, {report.products:,} products '
+              f'refreshed in {report.seconds:.2f}s')
+
+        product_ids = list(range(1, 101, 10))
+        with Session(engine) as session:
+            fast = _median_ms(lambda pid: recommendations.also_bought(session, pid),
+                              product_ids, args.repeat)
+            slow = _median_ms(lambda pid: session.execute(SELF_JOIN, {'product_id': pid}).all(),
+                              product_ids, args.repeat)
+        print(f'{"read":<22} {"ms":>8}')
+        print(f'{"self-join per request":<22} {slow:>8.2f}')
+        print(f'{"product_neighbor":<22} {fast:>8.2f}  ({slow / fast:.0f}x)')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
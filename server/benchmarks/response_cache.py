@@ -0,0 +1,77 @@
+"""Catalog read endpoints with and without the conditional-GET cache.
+
+Simulated clients request product pages with a skewed popularity; a share of
+them revalidate with the ETag they saw last time, and a small share of
+requests are writes (a stock or price change through the ORM) that invalidate
+the affected entries.
+
+    cd server && python -m benchmarks.response_cache --requests 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app import create_app
+from models import db, Product
+from response_cache import cache
+from seeding import SeedConfig, seed
+
+
+def run(client, args, cached):
+    rng = random.Random(args.seed)
+    etags = {}
+    bytes_sent = 0
+    cache.clear()
+    cache.reset_stats()
+    cache.max_bytes = 64 * 1024 * 1024 if cached else 0
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        # Power-law popularity: a few products get most of the traffic.
+        pid = int(args.products * rng.random() ** 3) + 1
+        if rng.random() < args.write_ratio:
+            product = db.session.get(Product, pid)
+            product.stock += 1
+            db.session.commit()
+            continue
+        url = rng.choice([f'/products/{pid}', f'/products/{pid}/reviews',
+                          '/products?sort=newest', '/categories'])
+        headers = {}
+        if cached and url in etags and rng.random() < args.revalidate:
+            headers['If-None-Match'] = etags[url]
+        response = client.get(url, headers=headers)
+        etags[url] = response.headers.get('ETag')
+        bytes_sent += len(response.data)
+    elapsed = time.perf_counter() - started
+    return args.requests / elapsed, bytes_sent, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5_000)
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--revalidate', type=float, default=0.5)
+    parser.add_argument('--write-ratio', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'cache.db')}",
+                          'DEBUG': False, 'SQLITE_PROFILE': False})
+        with app.app_context():
+            db.create_all()
+            seed(db.engine, SeedConfig(users=500, products=args.products, orders=0,
+                                       reviews=args.products * 5, bcrypt_rounds=4))
+            client = app.test_client()
+            print(f'{"mode":<10} {"req/s":>8} {"bytes sent":>12} {"hit rate":>9} '
+                  f'{"304s":>6} {"bytes saved":>12}')
+            for cached in (False, True):
+                rate, sent, stats = run(client, args, cached)
+                print(f'{"cache" if cached else "no cache":<10} {rate:>8,.0f} {sent:>12,} '
+                      f'{stats["hit_rate"]:>9.1%} {stats["not_modified"]:>6} '
+                      f'{stats["bytes_saved"]:>12,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Dashboard queries: raw OrderItem aggregation vs. the daily rollups.
+
+Seeds ~--items order items (3 per order on average) over a year, rolls them
+up, then times each dashboard query both ways.  Also times an incremental
+run() after 1% more orders arrive.
+
+    cd server && python -m benchmarks.rollups --items 10000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import rollups
+from models import db
+from seeding import SeedConfig, seed
+
+START, END = date(2023, 12, 1), date(2024, 1, 1)
+QUARTER = date(2023, 10, 1)
+SOLD = 'o.status IN (%s) AND ' % ', '.join(f"'{s}'" for s in rollups.REVENUE_STATUSES)
+
+RAW = {
+    'revenue by day (30d)': (
+        'SELECT date(o.created_at) AS day, sum(i.quantity), sum(i.quantity * i.price), '
+        'count(DISTINCT o.id) FROM order_item i JOIN "order" o ON o.id = i.order_id '
+        'WHERE ' + SOLD + 'o.created_at >= :start AND o.created_at < :end GROUP BY day ORDER BY day'),
+    'top products (30d)': (
+        'SELECT i.product_id, p.name, sum(i.quantity), sum(i.quantity * i.price) AS revenue '
+        'FROM order_item i JOIN "order" o ON o.id = i.order_id '
+        'JOIN product p ON p.id = i.product_id '
+        'WHERE ' + SOLD + 'o.created_at >= :start AND o.created_at < :end '
+        'GROUP BY i.product_id, p.name ORDER BY revenue DESC LIMIT 10'),
+    'revenue by category (90d)': (
+        'SELECT p.category_id, c.name, sum(i.quantity), sum(i.quantity * i.price) AS revenue '
+        'FROM order_item i JOIN "order" o ON o.id = i.order_id '
+        'JOIN product p ON p.id = i.product_id LEFT JOIN category c ON c.id = p.category_id '
+        'WHERE ' + SOLD + 'o.created_at >= :quarter AND o.created_at < :end '
+        'GROUP BY p.category_id, c.name ORDER BY revenue DESC'),
+}
+
+ROLLUP = {
+    'revenue by day (30d)': lambda s: rollups.revenue_by_day(s, START, END),
+    'top products (30d)': lambda s: rollups.top_products(s, START, END),
+    'revenue by category (90d)': lambda s: rollups.revenue_by_category(s, QUARTER, END),
+}
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def _add_orders(engine, count):
+    """Copy the first `count` orders (with their items) to new ids on the last day."""
+    with engine.begin() as connection:
+        offset = connection.execute(text('SELECT max(id) FROM "order"')).scalar()
+        connection.execute(text(
+            'INSERT INTO "order" (id, user_id, total_amount, status, created_at, updated_at) '
+            'SELECT id + :offset, user_id, total_amount, status, :when, :when '
+            'FROM "order" WHERE id <= :count'),
+            {'offset': offset, 'count': count, 'when': '2023-12-31 12:00:00.000000'})
+        connection.execute(text(
+            'INSERT INTO order_item (order_id, product_id, quantity, price, created_at, updated_at) '
+            'SELECT order_id + :offset, product_id, quantity, price, created_at, updated_at '
+            'FROM order_item WHERE order_id <= :count'),
+            {'offset': offset, 'count': count})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10_000_000)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    orders = args.items // 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'rollups.db')}")
+        db.metadata.create_all(engine)
+        started = time.perf_counter()
+        seed(engine, SeedConfig(users=10_000, products=args.products, orders=orders,
+                                reviews=0, bcrypt_rounds=4, cart_ratio=0, address_ratio=0,
+                                payment_ratio=0, batch_size=50_000))
+        print(f'seeded {orders:,} orders in {time.perf_counter() - started:.0f}s')
+
+        started = time.perf_counter()
+        rollups.backfill(engine, date(2023, 1, 1), date(2024, 1, 1), chunk_days=30)
+        print(f'backfill: {time.perf_counter() - started:.1f}s')
+
+        _add_orders(engine, orders // 100)
+        started = time.perf_counter()
+        report = rollups.run(engine)
+        print(f'incremental run: {report.orders:,} new orders in '
+              f'{time.perf_counter() - started:.2f}s')
+
+        params = {'start': START, 'end': END, 'quarter': QUARTER}
+        print(f'{"dashboard":<28} {"raw ms":>10} {"rollup ms":>10} {"speedup":>8}')
+        with Session(engine) as session:
+            for name, sql in RAW.items():
+                raw = _median_ms(lambda: session.execute(text(sql), params).all(), args.repeat)
+                fast = _median_ms(lambda: ROLLUP[name](session), args.repeat)
+                print(f'{name:<28} {raw:>10.1f} {fast:>10.2f} {raw / fast:>7.0f}x')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
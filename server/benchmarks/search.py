@@ -0,0 +1,65 @@
+"""FTS5 product search vs. the LIKE '%term%' baseline.
+
+    cd server && python -m benchmarks.search --products 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import text
+
+import search
+from models import db
+from seeding import SeedConfig, seed
+
+# Synthetic names draw on a tiny vocabulary, so word terms match 5-15% of the
+# catalog; the numeric terms are selective, like most real searches.
+TERMS = ['sofa', 'velvet chair', 'walnut', 'rustic table', 'marb', '4242', '77777']
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def like_search(term, per_page=20):
+    # Name matches first, as the closest LIKE equivalent of a relevance rank.
+    words = term.split()
+    clauses = ' AND '.join(f'(name LIKE :w{i} OR description LIKE :w{i})'
+                           for i in range(len(words)))
+    params = {f'w{i}': f'%{word}%' for i, word in enumerate(words)}
+    sql = text(f'SELECT id, name, price FROM product WHERE {clauses} '
+               f'ORDER BY (name LIKE :w0) DESC, id LIMIT {per_page}')
+    return db.session.execute(sql, params).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'search.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            seed(db.engine, SeedConfig(users=1_000, products=args.products, orders=0,
+                                       reviews=0, bcrypt_rounds=4))
+            print(f'{"query":<16} {"LIKE ms":>10} {"FTS5 ms":>10} {"speedup":>8}')
+            for term in TERMS:
+                like = _median_ms(lambda: like_search(term), args.repeat)
+                fts = _median_ms(lambda: search.search_products(term), args.repeat)
+                print(f'{term:<16} {like:>10.2f} {fts:>10.2f} {like / fts:>7.1f}x')
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
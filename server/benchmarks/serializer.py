@@ -0,0 +1,59 @@
+"""Compiled serializers vs. SerializerMixin.to_dict() on lists of rows.
+
+    cd server && python -m benchmarks.serializer --rows 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import select
+
+from models import db, User
+from seeding import SeedConfig, seed
+from serializers import VIEWS, serialize_many, serialize_rows
+
+FIELDS = VIEWS[User]['private'][0]
+
+
+def _time(fn):
+    started = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'serializer.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            seed(db.engine, SeedConfig(users=args.rows, products=100, orders=0, reviews=0,
+                                       bcrypt_rounds=4, cart_ratio=0, address_ratio=0))
+            users = db.session.execute(select(User)).scalars().all()
+            rows = db.session.execute(select(*(getattr(User, f) for f in FIELDS))).all()
+
+            # to_dict() follows every relationship, so it lazy-loads each user's
+            # orders, cart, reviews, addresses and payments.
+            full, _ = _time(lambda: [u.to_dict() for u in users])
+            only, _ = _time(lambda: [u.to_dict(only=FIELDS) for u in users])
+            compiled, _ = _time(lambda: serialize_many(users, 'private'))
+            core, _ = _time(lambda: serialize_rows(rows))
+
+            print(f'{args.rows:,} users')
+            print(f'{"to_dict()":<28} {full:>10.1f} ms')
+            print(f'{"to_dict(only=...)":<28} {only:>10.1f} ms')
+            print(f'{"serialize_many(private)":<28} {compiled:>10.1f} ms')
+            print(f'{"serialize_rows (Core)":<28} {core:>10.1f} ms')
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
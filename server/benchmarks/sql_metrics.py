@@ -0,0 +1,81 @@
+"""Overhead of the SQL instrumentation on uncached catalog reads.
+
+Runs the same request mix with the cursor listeners removed, then traced at
+several sample rates, and prints the best of --repeat runs for each.
+
+    cd server && python -m benchmarks.sql_metrics --requests 3000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import sql_metrics
+from app import create_app
+from models import db
+from response_cache import cache
+from seeding import SeedConfig, seed
+from sql_metrics import metrics
+
+LISTENERS = [('before_cursor_execute', sql_metrics._before_cursor_execute),
+             ('after_cursor_execute', sql_metrics._after_cursor_execute)]
+
+
+def best(client, args):
+    return max(run(client, args) for _ in range(args.repeat))
+
+
+def run(client, args):
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        pid = rng.randint(1, args.products)
+        client.get(rng.choice([f'/products/{pid}', f'/products/{pid}/reviews',
+                               '/products?sort=newest', '/categories']))
+    return args.requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=3_000)
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'sql.db')}",
+                          'DEBUG': False, 'SQLITE_PROFILE': False})
+        with app.app_context():
+            db.create_all()
+            seed(db.engine, SeedConfig(users=500, products=args.products, orders=0,
+                                       reviews=args.products * 5, bcrypt_rounds=4))
+        client = app.test_client()
+        cache.max_bytes = 0  # every request hits the database
+        run(client, args)  # warm up
+
+        for name, fn in LISTENERS:
+            event.remove(Engine, name, fn)
+        baseline = best(client, args)
+        for name, fn in LISTENERS:
+            event.listen(Engine, name, fn)
+
+        print(f'{"mode":<16} {"req/s":>8} {"overhead":>9}')
+        print(f'{"no listeners":<16} {baseline:>8,.0f}')
+        for rate in (0.0, 0.1, 1.0):
+            metrics.sample_rate = rate
+            metrics.reset()
+            throughput = best(client, args)
+            print(f'{f"sample {rate:.0%}":<16} {throughput:>8,.0f} '
+                  f'{baseline / throughput - 1:>9.1%}')
+        report = max(metrics.recent(), key=lambda r: r['statements'])
+        print(f'busiest request: {report["name"]}, {report["statements"]} statements, '
+              f'{report["db_ms"]} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""App start-up time and per-worker memory, with and without pre-fork warm-up.
+
+Builds the app in this process (the "master"), optionally runs
+prefork.warm_up(), then forks workers that each serve a few catalog pages and
+serializations before reporting their memory from /proc.  Private_Dirty is
+what a worker costs on top of the shared copy-on-write pages.
+
+    cd server && python -m benchmarks.startup --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from models import db
+
+
+def _smaps():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+
+def _work(app, requests):
+    import catalog
+    from serializers import serialize_many
+
+    started = time.perf_counter()
+    with app.app_context():
+        for _ in range(requests):
+            page = catalog.list_products(limit=24)
+            serialize_many(page.items, 'listing')
+        db.session.remove()
+    return (time.perf_counter() - started) * 1000
+
+
+def run(path, warm, workers, requests):
+    import prefork
+    from app import create_app
+
+    started = time.perf_counter()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'DEBUG': False})
+    created = (time.perf_counter() - started) * 1000
+    if warm:
+        prefork.warm_up(app)
+    ready = (time.perf_counter() - started) * 1000
+
+    pids = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            try:
+                prefork.after_fork(app)
+                first = _work(app, 1)
+                _work(app, requests)
+                mem = _smaps()
+                os.write(write, f'{first} {mem["Rss"]} {mem.get("Pss", 0)} '
+                                f'{mem.get("Private_Dirty", 0)}'.encode())
+            finally:
+                os._exit(0)
+        os.close(write)
+        pids.append((pid, read))
+
+    results = []
+    for pid, read in pids:
+        with os.fdopen(read) as f:
+            results.append([float(v) for v in f.read().split()])
+        os.waitpid(pid, 0)
+    n = len(results)
+    first, rss, pss, dirty = (sum(r[i] for r in results) / n for i in range(4))
+    return created, ready, first, rss, pss, dirty
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--products', type=int, default=2_000)
+    args = parser.parse_args()
+
+    from seeding import SeedConfig, seed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        seed(engine, SeedConfig(users=100, products=args.products, orders=0, reviews=1_000,
+                                bcrypt_rounds=4))
+        engine.dispose()
+
+        print(f'{"mode":<8} {"create ms":>10} {"ready ms":>9} {"1st req ms":>11} '
+              f'{"RSS kB":>9} {"PSS kB":>9} {"private kB":>11}')
+        for warm in (False, True):
+            # Each mode in its own child so the first doesn't warm the second.
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read)
+                try:
+                    row = run(path, warm, args.workers, args.requests)
+                    os.write(write, ' '.join(map(str, row)).encode())
+                finally:
+                    os._exit(0)
+            os.close(write)
+            with os.fdopen(read) as f:
+                created, ready, first, rss, pss, dirty = map(float, f.read().split())
+            os.waitpid(pid, 0)
+            print(f'{"warm" if warm else "cold":<8} {created:>10.1f} {ready:>9.1f} {first:>11.1f} '
+                  f'{rss:>9,.0f} {pss:>9,.0f} {dirty:>11,.0f}')
+
+
+if __name__ == '__main__':
+    main()
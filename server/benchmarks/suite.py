@@ -0,0 +1,285 @@
+"""Benchmark suite: the core data paths timed against a seeded database.
+
+Seeds a database at the chosen scale (cached under --data-dir and reused
+while the schema and seed parameters stay the same), copies it so writes
+don't leak into the next run, then times each canonical operation through the
+same code the app uses:
+
+    product_listing    catalog.list_products, random sort/category/page
+    product_detail     catalog.get_product + the 'detail' view
+    order_history      archive.order_history, live + archived, with items
+    add_to_cart        carts.add_item (write-behind cart store)
+    checkout           carts.checkout of a 1-3 line cart
+    login              username lookup + tokens.login (User.authenticate)
+    review_insert      a new Review, committed (rating aggregates included)
+
+Results go to --out (or stdout) as JSON with p50/p90/p95/p99 per operation
+plus the commit and environment they came from.  --compare checks the run
+against an earlier results file and exits 1 if any operation's --metric got
+more than --threshold slower.
+
+    cd server && python -m benchmarks.suite --scale 100k --out bench-100k.json
+    python -m benchmarks.suite --scale 100k --compare bench-100k.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+import archive
+import catalog
+import fixtures
+from app import create_app
+from cart_store import carts
+from checkout import EmptyCart, OutOfStock
+from models import db, Review, User
+from seeding import CATEGORY_NAMES, SeedConfig
+from serializers import serialize
+from tokens import tokens
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def seed_config(size, args):
+    return SeedConfig(users=max(size // 10, 100), products=size, orders=size, reviews=size,
+                      bcrypt_rounds=args.bcrypt_rounds, batch_size=50_000, seed=args.seed)
+
+
+def seeded_database(size, args):
+    """Path of a pristine seeded database, building it if it isn't cached."""
+    return fixtures.template(seed_config(size, args), args.data_dir, name=f'suite-{size}')
+
+
+# Operations: each is (setup, call).  setup(rng) runs untimed and returns the
+# arguments for call(*args), which is what gets timed.
+
+def _no_setup(fn):
+    return lambda rng: (rng,), fn
+
+
+def operations(sizes):
+    users, products = sizes['users'], sizes['products']
+
+    def listing(rng):
+        # A third filter by category; half of the time the next page is read too.
+        category = rng.choice(CATEGORY_NAMES) if rng.random() < 0.3 else None
+        page = catalog.list_products(sort=rng.choice(list(catalog.SORTS)), limit=24,
+                                     category=category, with_reviews=False)
+        if page.next_cursor and rng.random() < 0.5:
+            page = catalog.list_products(cursor=page.next_cursor, limit=24, category=category,
+                                         with_reviews=False)
+        return page
+
+    def detail(rng):
+        product = catalog.get_product(rng.randint(1, products))
+        return serialize(product, 'detail') if product is not None else None
+
+    def history(rng):
+        return archive.order_history(db.session, rng.randint(1, users), include_archived=True)
+
+    def cart_setup(rng):
+        return carts.cart_for_user(rng.randint(1, users)), rng.randint(1, products)
+
+    def checkout_setup(rng):
+        user_id = rng.randint(1, users)
+        cart_id = carts.cart_for_user(user_id)
+        for product_id in rng.sample(range(1, products + 1), rng.randint(1, 3)):
+            carts.add_item(cart_id, product_id, 1)
+        return cart_id, user_id
+
+    def login_setup(rng):
+        user_id = rng.randint(1, users)
+        return f'user{user_id}', 'password'
+
+    def login(username, password):
+        user = db.session.execute(select(User).where(User.username == username)).scalar_one()
+        return tokens.login(user, password)
+
+    def review(rng):
+        db.session.add(Review(user_id=rng.randint(1, users), product_id=rng.randint(1, products),
+                              rating=rng.randint(1, 5), comment='benchmark review'))
+        db.session.commit()
+
+    return {
+        'product_listing': _no_setup(listing),
+        'product_detail': _no_setup(detail),
+        'order_history': _no_setup(history),
+        'add_to_cart': (cart_setup, carts.add_item),
+        'checkout': (checkout_setup, carts.checkout),
+        'login': (login_setup, login),
+        'review_insert': _no_setup(review),
+    }
+
+
+def summarize(samples, errors):
+    ms = sorted(s * 1000 for s in samples)
+    result = {'n': len(ms), 'errors': errors}
+    if not ms:
+        return result
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    result.update({f'p{p}_ms': round(cuts[p - 1], 4) for p in PERCENTILES})
+    result.update({
+        'mean_ms': round(statistics.fmean(ms), 4),
+        'min_ms': round(ms[0], 4),
+        'max_ms': round(ms[-1], 4),
+        'ops_per_s': round(len(ms) / (sum(ms) / 1000), 1),
+    })
+    return result
+
+
+def time_operation(setup, call, iterations, warmup, rng):
+    samples, errors = [], 0
+    for i in range(warmup + iterations):
+        args = setup(rng)
+        started = time.perf_counter()
+        try:
+            call(*args)
+        except (EmptyCart, OutOfStock):
+            errors += 1
+            continue
+        finally:
+            elapsed = time.perf_counter() - started
+            db.session.remove()
+        if i >= warmup:
+            samples.append(elapsed)
+    return summarize(samples, errors)
+
+
+def environment():
+    def git(*cmd):
+        try:
+            return subprocess.run(['git', *cmd], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, metric, threshold, min_delta_ms):
+    """[(operation, old, new, change, regressed)] for operations in both runs."""
+    rows = []
+    for name, new in results['operations'].items():
+        old = baseline['operations'].get(name)
+        if not old or metric not in old or metric not in new:
+            continue
+        change = new[metric] / old[metric] - 1 if old[metric] else 0.0
+        regressed = change > threshold and new[metric] - old[metric] > min_delta_ms
+        rows.append((name, old[metric], new[metric], change, regressed))
+    return rows
+
+
+def run(args):
+    size = SCALES.get(args.scale.lower()) or int(args.scale)
+    config = seed_config(size, args)
+    pristine = seeded_database(size, args)
+    sizes = {'users': config.users, 'products': config.products, 'orders': config.orders,
+             'reviews': config.reviews}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'suite.db')
+        shutil.copyfile(pristine, path)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'DEBUG': False,
+                          'BCRYPT_LOG_ROUNDS': args.bcrypt_rounds,
+                          'CART_STORE_JOURNAL_DIR': os.path.join(tmp, 'journal'),
+                          'SQL_METRICS_SAMPLE_RATE': 0.0})
+        ops = operations(sizes)
+        selected = args.only or list(ops)
+        results = {}
+        with app.app_context():
+            for name in selected:
+                setup, call = ops[name]
+                rng = random.Random(f'{args.seed}:{name}')
+                iterations = args.iterations
+                if name == 'login':
+                    iterations = min(iterations, args.login_iterations)
+                results[name] = time_operation(setup, call, iterations, args.warmup, rng)
+                print(f'{name:<16} p50 {results[name].get("p50_ms", 0):>8.3f} ms  '
+                      f'p99 {results[name].get("p99_ms", 0):>8.3f} ms', file=sys.stderr)
+            carts.close()
+        database = app.extensions.get('sqlite_profile')
+        if database is not None:
+            database.close()
+
+    return {
+        'suite': 'core-data-paths',
+        'scale': size,
+        'sizes': sizes,
+        'seed': args.seed,
+        'iterations': args.iterations,
+        'bcrypt_rounds': args.bcrypt_rounds,
+        'environment': environment(),
+        'operations': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='10k',
+                        help='products and orders to seed: 10k, 100k, 1m or a number')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--login-iterations', type=int, default=50,
+                        help='login is bcrypt-bound; time fewer of them')
+    parser.add_argument('--bcrypt-rounds', type=int, default=10)
+    parser.add_argument('--only', nargs='+', metavar='OPERATION',
+                        choices=['product_listing', 'product_detail', 'order_history',
+                                 'add_to_cart', 'checkout', 'login', 'review_insert'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'bench-suite'),
+                        help='where seeded databases are cached')
+    parser.add_argument('--out', help='write the JSON results here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results file')
+    parser.add_argument('--metric', default='p50_ms',
+                        choices=[f'p{p}_ms' for p in PERCENTILES] + ['mean_ms'])
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='fractional slowdown that counts as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help='ignore slowdowns smaller than this (timer noise)')
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != results['scale']:
+            print(f'warning: baseline scale {baseline.get("scale")} != {results["scale"]}',
+                  file=sys.stderr)
+        rows = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+        print(f'\n{"operation":<16} {"baseline":>10} {"current":>10} {"change":>8}',
+              file=sys.stderr)
+        for name, old, new, change, regressed in rows:
+            print(f'{name:<16} {old:>10.3f} {new:>10.3f} {change:>+8.1%}'
+                  f'{"  REGRESSION" if regressed else ""}', file=sys.stderr)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
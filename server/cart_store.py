@@ -0,0 +1,478 @@
+"""Write-behind cart store.
+
+Cart reads and writes are served from memory; changes are coalesced per
+(cart, product) and written to Cart/CartItem in batched upserts every
+`flush_interval` seconds and right after a checkout.  Ten quantity changes to
+one line between flushes cost one row write.
+
+Every change is first appended to a small journal (one JSON line, absolute
+quantities and the time of the change, so replay is idempotent).  The
+journal is split into segments: a flush starts a new segment and deletes the
+older ones once its transaction commits.  Segments left behind by a dead
+process are replayed by every worker when it starts and then every
+`recover_interval` seconds, so a killed worker's changes don't wait for a
+restart.  A replayed change only lands if its cart hasn't been written
+since (Cart.updated_at, set by every flush), so a late replay never
+overwrites newer contents.  Writes reach the OS on every change; set
+CART_STORE_FSYNC to also survive power loss at the cost of an fsync each.
+
+The backend holding cart contents is pluggable (get/put/delete/clear of
+{product_id: quantity} dicts); MemoryBackend is per process, so with several
+workers either pin a user's requests to one worker or plug in a shared
+backend.
+
+    from cart_store import carts
+    cart_id = carts.cart_for_user(user_id)
+    carts.add_item(cart_id, product_id, 2)
+    carts.items(cart_id)        # {product_id: quantity}
+    carts.checkout(cart_id)     # flushes, then checkout.checkout()
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+from models import db, Cart, CartItem
+
+log = logging.getLogger(__name__)
+
+_SEGMENT = re.compile(r'cart-(\d+)\.(\d+)\.journal$')
+
+
+class MemoryBackend:
+    """In-process LRU of cart contents.  Evicted carts are reloaded from the
+    database (plus any changes not yet flushed) on the next read."""
+
+    def __init__(self, max_carts=100_000):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+
+    def get(self, cart_id):
+        items = self._carts.get(cart_id)
+        if items is not None:
+            self._carts.move_to_end(cart_id)
+        return items
+
+    def put(self, cart_id, items):
+        self._carts[cart_id] = items
+        self._carts.move_to_end(cart_id)
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+
+    def delete(self, cart_id):
+        self._carts.pop(cart_id, None)
+
+    def clear(self):
+        self._carts.clear()
+
+
+class _Journal:
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self.seq = 0
+        self.bytes = 0
+        self._file = None
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f'cart-{self.pid}.{seq}.journal')
+
+    def _open(self):
+        self.seq += 1
+        self._file = open(self._path(self.seq), 'a', encoding='utf-8')
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.bytes += len(line)
+
+    def rotate(self):
+        """Start a new segment; returns the last sequence number closed."""
+        closed = self.seq
+        self._file.close()
+        self._open()
+        return closed
+
+    def discard(self, upto):
+        for seq in range(1, upto + 1):
+            try:
+                os.remove(self._path(seq))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def orphaned_segments(directory):
+    """Journal segments of processes that are no longer running, in write order."""
+    segments = []
+    for path in glob.glob(os.path.join(directory, 'cart-*.journal')):
+        match = _SEGMENT.search(path)
+        if match:
+            pid, seq = int(match.group(1)), int(match.group(2))
+            if pid != os.getpid() and not _alive(pid):
+                segments.append((pid, seq, path))
+    # Segments of one process are ordered; different processes never shared
+    # a cart's pending writes, so their relative order doesn't matter.
+    return [path for _, _, path in sorted(segments)]
+
+
+class CartStore:
+    def __init__(self, backend=None, engine=None, journal_dir=None, flush_interval=1.0,
+                 fsync=False, recover_interval=30.0):
+        self.backend = backend or MemoryBackend()
+        self.engine = engine
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.recover_interval = recover_interval
+        self._pid = None
+        self.reset_stats()
+
+    def init_app(self, app):
+        self.close()  # flush anything pending against a previous app
+        self.backend.clear()
+        with app.app_context():
+            self.engine = db.engine
+        self.journal_dir = app.config.get(
+            'CART_STORE_JOURNAL_DIR', os.path.join(app.instance_path, 'cart-journal'))
+        self.flush_interval = app.config.get('CART_STORE_FLUSH_INTERVAL', self.flush_interval)
+        self.fsync = app.config.get('CART_STORE_FSYNC', self.fsync)
+        self.recover_interval = app.config.get('CART_STORE_RECOVER_INTERVAL',
+                                               self.recover_interval)
+        self._pid = None
+        self.recover()
+
+    def reset_stats(self):
+        self.changes = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    def stats(self):
+        return {
+            'carts_pending': len(self._pending) if self._pid else 0,
+            'changes': self.changes,
+            'rows_written': self.rows_written,
+            # Changes accepted per row written to the database.
+            'coalescing_ratio': self.changes / self.rows_written if self.rows_written else 0.0,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'flush_ms_avg': self.flush_seconds / self.flushes * 1000 if self.flushes else 0.0,
+            'flush_ms_max': self.max_flush_seconds * 1000,
+            'flush_ms_last': self.last_flush_seconds * 1000,
+            'journal_bytes': self._journal.bytes if self._pid and self._journal else 0,
+        }
+
+    def _ensure_started(self):
+        # Lazily (re)start per process: a forked worker gets its own lock,
+        # journal and flusher thread instead of the parent's.
+        if self._pid == os.getpid():
+            return
+        self._lock = threading.RLock()
+        self._pending = {}  # cart_id -> {product_id: quantity}
+        self._wake = threading.Event()
+        self._stopped = False
+        self._journal = _Journal(self.journal_dir, self.fsync) if self.journal_dir else None
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='cart-flusher', daemon=True)
+        self._thread.start()
+        # Under a pre-fork server init_app's recovery ran in the master, before
+        # any worker died; pick up what earlier workers left.
+        self._recover_logged()
+
+    # Reads
+
+    def items(self, cart_id):
+        """{product_id: quantity} for the cart, from memory."""
+        self._ensure_started()
+        with self._lock:
+            return dict(self._load(cart_id))
+
+    def lines(self, cart_id):
+        return sorted(self.items(cart_id).items())
+
+    def _load(self, cart_id):
+        items = self.backend.get(cart_id)
+        if items is None:
+            with self.engine.connect() as connection:
+                items = dict(connection.execute(
+                    select(CartItem.product_id, CartItem.quantity)
+                    .where(CartItem.cart_id == cart_id)).all())
+            for product_id, quantity in self._pending.get(cart_id, {}).items():
+                if quantity > 0:
+                    items[product_id] = quantity
+                else:
+                    items.pop(product_id, None)
+            self.backend.put(cart_id, items)
+        return items
+
+    def cart_for_user(self, user_id):
+        """The user's cart id, creating the (empty) Cart row if needed."""
+        # Locked from the start, so two requests can't both create one.
+        with database.write_transaction(self.engine) as connection:
+            cart_id = connection.execute(
+                select(Cart.id).where(Cart.user_id == user_id).order_by(Cart.id)).scalar()
+            if cart_id is None:
+                now = datetime.utcnow()
+                cart_id = connection.execute(
+                    Cart.__table__.insert().values(user_id=user_id, created_at=now, updated_at=now)
+                    .returning(Cart.id)).scalar_one()
+        return cart_id
+
+    # Writes
+
+    def set_quantity(self, cart_id, product_id, quantity):
+        """Set a line's quantity; 0 removes it."""
+        quantity = max(0, int(quantity))
+        self._ensure_started()
+        with self._lock:
+            items = self._load(cart_id)
+            if self._journal is not None:
+                self._journal.append({'c': cart_id, 'p': product_id, 'q': quantity,
+                                      't': datetime.utcnow().isoformat()})
+            if quantity:
+                items[product_id] = quantity
+            else:
+                items.pop(product_id, None)
+            self._pending.setdefault(cart_id, {})[product_id] = quantity
+            self.changes += 1
+            return quantity
+
+    def add_item(self, cart_id, product_id, quantity=1):
+        self._ensure_started()
+        with self._lock:
+            current = self._load(cart_id).get(product_id, 0)
+            return self.set_quantity(cart_id, product_id, current + quantity)
+
+    def remove_item(self, cart_id, product_id):
+        return self.set_quantity(cart_id, product_id, 0)
+
+    def checkout(self, cart_id, user_id=None):
+        """Place an order for the in-memory cart, then flush.
+
+        Only the quantities that were ordered are taken out of the cart, so an
+        item added while the order was being placed stays in it.
+        """
+        import checkout
+
+        lines = self.lines(cart_id)
+        if not lines:
+            raise checkout.EmptyCart(f'cart {cart_id} is empty')
+        result = checkout.checkout(cart_id, user_id=user_id, lines=lines, clear_cart=False,
+                                   engine=self.engine)
+        with self._lock:
+            items = self._load(cart_id)
+            for product_id, quantity in lines:
+                self.set_quantity(cart_id, product_id, items.get(product_id, 0) - quantity)
+        self.flush()
+        return result
+
+    # Flushing
+
+    def _run(self):
+        next_recover = time.monotonic() + self.recover_interval
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The batch went back into _pending; retried on the next tick.
+                log.exception('cart flush failed')
+            if self.recover_interval and time.monotonic() >= next_recover:
+                next_recover = time.monotonic() + self.recover_interval
+                self._recover_logged()
+
+    def _recover_logged(self):
+        try:
+            self.recover()
+        except Exception:
+            # The segments stay; the next attempt replays them.
+            log.exception('cart journal recovery failed')
+
+    def flush(self):
+        """Write all pending changes in one transaction; returns rows written."""
+        self._ensure_started()
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            closed = self._journal.rotate() if self._journal is not None else None
+            # Taken with the rotation: every change left in the journal is at
+            # least this recent, so replaying it doesn't look stale.
+            now = datetime.utcnow()
+
+        started = time.perf_counter()
+        try:
+            rows = write_changes(self.engine, pending, now)
+        except Exception:
+            self.flush_errors += 1
+            with self._lock:
+                # Put the batch back under anything written since.
+                for cart_id, changes in pending.items():
+                    newer = self._pending.get(cart_id, {})
+                    changes.update(newer)
+                    self._pending[cart_id] = changes
+            raise
+        elapsed = time.perf_counter() - started
+        if closed is not None:
+            self._journal.discard(closed)
+        self.flushes += 1
+        self.rows_written += rows
+        self.flush_seconds += elapsed
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        return rows
+
+    def recover(self):
+        """Replay and flush journal segments left by dead processes."""
+        if not self.journal_dir or not os.path.isdir(self.journal_dir):
+            return 0
+        paths = orphaned_segments(self.journal_dir)
+        latest = {}  # (cart_id, product_id) -> (at, quantity)
+        for path in paths:
+            try:
+                f = open(path, encoding='utf-8')
+            except FileNotFoundError:
+                continue  # another worker recovered it first
+            with f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from the crash
+                    # Records from before timestamps were journaled always apply.
+                    at = datetime.fromisoformat(record['t']) if 't' in record else datetime.max
+                    key = (record['c'], record['p'])
+                    if key not in latest or at >= latest[key][0]:
+                        latest[key] = (at, record['q'])
+        rows = replay_changes(self.engine, latest) if latest else 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return rows
+
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        if self._journal is not None:
+            # Everything is in the database now; nothing left to replay.
+            self._journal.close()
+            self._journal.discard(self._journal.seq)
+        self._pid = None
+
+
+def write_changes(engine, pending, now=None):
+    """Apply {cart_id: {product_id: quantity}} to CartItem in one transaction."""
+    now = now or datetime.utcnow()
+    upserts, deletes = [], []
+    for cart_id, changes in pending.items():
+        for product_id, quantity in changes.items():
+            if quantity > 0:
+                upserts.append({'cart_id': cart_id, 'product_id': product_id,
+                                'quantity': quantity, 'created_at': now, 'updated_at': now})
+            else:
+                deletes.append({'_cart_id': cart_id, '_product_id': product_id})
+    items = CartItem.__table__
+    with engine.begin() as connection:
+        if upserts:
+            stmt = sqlite_insert(items)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['cart_id', 'product_id'],
+                set_={'quantity': stmt.excluded.quantity, 'updated_at': stmt.excluded.updated_at})
+            connection.execute(stmt, upserts)
+        if deletes:
+            connection.execute(items.delete().where(
+                items.c.cart_id == bindparam('_cart_id'),
+                items.c.product_id == bindparam('_product_id')), deletes)
+        carts = Cart.__table__
+        connection.execute(carts.update().where(carts.c.id == bindparam('_id'))
+                           .values(updated_at=now), [{'_id': cart_id} for cart_id in pending])
+    return len(upserts) + len(deletes)
+
+
+def replay_changes(engine, changes):
+    """Apply journaled {(cart_id, product_id): (at, quantity)} in one transaction.
+
+    A change is skipped if its cart was written after it was made: those
+    contents are newer than the journal.  Carts that took changes get the
+    newest applied time as updated_at, so replays keep their order.
+    Returns the rows written.
+    """
+    items, carts = CartItem.__table__, Cart.__table__
+    cart_id, product_id = bindparam('_cart_id'), bindparam('_product_id')
+    at = bindparam('_at', type_=carts.c.updated_at.type)
+    current = (select(carts.c.updated_at).where(carts.c.id == cart_id)
+               .scalar_subquery() <= at)
+    upserts, deletes, touched = [], [], {}
+    for (cart, product), (when, quantity) in changes.items():
+        params = {'_cart_id': cart, '_product_id': product, '_at': when}
+        if quantity > 0:
+            upserts.append(dict(params, _quantity=quantity))
+        else:
+            deletes.append(params)
+        touched[cart] = max(when, touched.get(cart, when))
+    rows = 0
+    with engine.begin() as connection:
+        if upserts:
+            stamp = literal(datetime.utcnow(), carts.c.updated_at.type)
+            stmt = sqlite_insert(items).from_select(
+                ['cart_id', 'product_id', 'quantity', 'created_at', 'updated_at'],
+                select(cart_id, product_id, bindparam('_quantity'), stamp, stamp).where(current))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['cart_id', 'product_id'],
+                set_={'quantity': stmt.excluded.quantity, 'updated_at': stmt.excluded.updated_at})
+            rows += connection.execute(stmt, upserts).rowcount
+        if deletes:
+            rows += connection.execute(items.delete().where(
+                items.c.cart_id == cart_id, items.c.product_id == product_id, current),
+                deletes).rowcount
+        connection.execute(
+            carts.update().where(carts.c.id == cart_id, carts.c.updated_at <= at)
+            .values(updated_at=at),
+            [{'_cart_id': cart, '_at': min(when, datetime.utcnow())}
+             for cart, when in touched.items()])
+    return rows
+
+
+carts = CartStore()
+atexit.register(carts.close)
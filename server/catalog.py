@@ -0,0 +1,150 @@
+"""Product catalog queries.
+
+Pages are fetched with keyset (seek) pagination: the cursor carries the sort
+key of the last row seen, so page 1000 costs the same as page 1.  Reviews and
+currently active discounts are loaded with selectinload, so a page is always
+three statements (products, reviews, discounts) regardless of its size.
+
+    page = list_products(sort='newest', limit=24)
+    more = list_products(sort='newest', cursor=page.next_cursor)
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import load_only, selectinload
+
+from models import db, Product, Category, Review, Discount
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+MAX_LIMIT = 100
+
+# sort name -> (key column, descending)
+SORTS = {
+    'newest': (Product.created_at, True),
+    'oldest': (Product.created_at, False),
+    'price': (Product.price, False),
+    'price_desc': (Product.price, True),
+    'rating': (Product.rating_avg, True),
+}
+
+LISTING_COLUMNS = (
+    Product.id, Product.name, Product.price, Product.category, Product.category_id, Product.stock,
+    Product.image_url, Product.created_at, Product.updated_at, Product.rating_count,
+    Product.rating_avg,
+)
+# updated_at is loaded everywhere for response ETags (response_cache.py).
+REVIEW_COLUMNS = (Review.id, Review.product_id, Review.user_id, Review.rating,
+                  Review.comment, Review.created_at, Review.updated_at)
+DISCOUNT_COLUMNS = (Discount.id, Discount.product_id, Discount.discount_percentage,
+                    Discount.start_date, Discount.end_date, Discount.updated_at)
+
+
+def encode_cursor(sort, value, id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    # Any cursor the client sends back is untrusted: anything malformed,
+    # however it fails, is a ValueError the routes turn into a 400.
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, value, id = json.loads(raw)
+        column = SORTS[sort][0]
+        if column is Product.created_at:
+            value = datetime.fromisoformat(value)
+        elif value is not None and not isinstance(value, (int, float)):
+            raise TypeError(value)
+        if not isinstance(id, int):
+            raise TypeError(id)
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('invalid cursor')
+    return sort, value, id
+
+
+def _loaders(now, with_reviews=True, columns=LISTING_COLUMNS):
+    options = [
+        selectinload(Product.discounts.and_(
+            Discount.start_date <= now, Discount.end_date > now,
+        )).load_only(*DISCOUNT_COLUMNS),
+    ]
+    if columns:
+        options.append(load_only(*columns))
+    if with_reviews:
+        options.append(selectinload(Product.reviews).load_only(*REVIEW_COLUMNS))
+    return options
+
+
+def listing_query(sort='newest', cursor=None, limit=24, category=None,
+                  min_rating=None, with_reviews=True, now=None):
+    """(statement, sort, limit) behind list_products; the statement fetches
+    one row more than the page so paginate() can tell if there is another."""
+    if cursor is not None:
+        sort, after_value, after_id = decode_cursor(cursor)
+    if sort not in SORTS:
+        raise ValueError(f'unknown sort {sort!r}')
+    limit = max(1, min(limit, MAX_LIMIT))
+    now = now or datetime.utcnow()
+    column, descending = SORTS[sort]
+
+    stmt = select(Product).options(*_loaders(now, with_reviews))
+    if category is not None:
+        stmt = stmt.where(Product.category_id == select(Category.id)
+                          .where(Category.name == category).scalar_subquery())
+    if min_rating is not None:
+        stmt = stmt.where(Product.rating_avg >= min_rating)
+    if cursor is not None:
+        key = tuple_(column, Product.id)
+        stmt = stmt.where(key < (after_value, after_id) if descending
+                          else key > (after_value, after_id))
+    if descending:
+        stmt = stmt.order_by(column.desc(), Product.id.desc())
+    else:
+        stmt = stmt.order_by(column, Product.id)
+    # One extra row tells us whether there is a next page without a COUNT.
+    return stmt.limit(limit + 1), sort, limit
+
+
+def paginate(rows, sort, limit):
+    """The Page for rows fetched by a listing_query statement."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, SORTS[sort][0].key), last.id)
+    return Page(rows, next_cursor)
+
+
+def list_products(sort='newest', cursor=None, limit=24, category=None,
+                  min_rating=None, with_reviews=True, now=None):
+    """Return a Page of products after `cursor` in `sort` order."""
+    stmt, sort, limit = listing_query(sort, cursor, limit, category, min_rating,
+                                      with_reviews, now)
+    return paginate(db.session.execute(stmt).scalars().all(), sort, limit)
+
+
+def product_query(product_id, now=None):
+    now = now or datetime.utcnow()
+    return (select(Product)
+            .options(*_loaders(now, columns=None))
+            .where(Product.id == product_id))
+
+
+def get_product(product_id, now=None):
+    """A single product with its reviews and active discounts (3 statements)."""
+    return db.session.execute(product_query(product_id, now)).scalars().first()
+
+
+def reviews_query(product_id, limit=20, before=None):
+    """A product's reviews, newest first, older than review id `before`."""
+    stmt = (select(Review).where(Review.product_id == product_id)
+            .order_by(Review.id.desc()).limit(limit))
+    if before is not None:
+        stmt = stmt.where(Review.id < before)
+    return stmt
@@ -0,0 +1,107 @@
+"""Backfill Product.category_id and reconcile the Category facet counts.
+
+The ORM keeps Product.category_id and Category.product_count/in_stock_count
+in step through mapper events (and checkout adjusts in_stock_count itself),
+but raw SQL and Core bulk writes bypass them.  reconcile() first links any
+product whose category name has no id yet, one product id range at a time,
+then recomputes the counts from the product table.
+
+    python categories.py reconcile [--batch-size 5000] [--check]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, case, func, select
+
+import database
+from models import Category, Product
+
+
+def facets(session):
+    """(id, name, product_count, in_stock_count) for non-empty categories."""
+    c = Category.__table__.c
+    stmt = (select(c.id, c.name, c.product_count, c.in_stock_count)
+            .where(c.product_count > 0)
+            .order_by(c.name))
+    return session.execute(stmt).all()
+
+
+def _link(engine, batch_size, check):
+    p, c = Product.__table__, Category.__table__
+    unlinked = and_(p.c.category.is_not(None), p.c.category_id.is_(None))
+    with database.write_transaction(engine) as connection:
+        max_id = connection.execute(select(func.coalesce(func.max(p.c.id), 0))).scalar()
+        missing = connection.execute(
+            select(p.c.category).distinct()
+            .where(unlinked, p.c.category.not_in(select(c.c.name)))).scalars().all()
+        if missing and not check:
+            now = datetime.utcnow()
+            connection.execute(c.insert(), [{'name': name, 'created_at': now, 'updated_at': now}
+                                            for name in missing])
+
+    linked = 0
+    name_to_id = select(c.c.id).where(c.c.name == p.c.category).scalar_subquery()
+    for low in range(1, max_id + 1, batch_size):
+        in_range = and_(p.c.id.between(low, low + batch_size - 1), unlinked)
+        with engine.begin() as connection:
+            if check:
+                linked += connection.execute(select(func.count()).where(in_range)).scalar()
+            else:
+                linked += connection.execute(
+                    p.update().where(in_range).values(category_id=name_to_id)).rowcount
+    return linked
+
+
+def _recount(engine, check):
+    p, c = Product.__table__, Category.__table__
+    in_stock = func.sum(case((p.c.stock > 0, 1), else_=0))
+    with database.write_transaction(engine) as connection:
+        expected = {category_id: (count, stocked) for category_id, count, stocked in
+                    connection.execute(select(p.c.category_id, func.count(), in_stock)
+                                       .where(p.c.category_id.is_not(None))
+                                       .group_by(p.c.category_id))}
+        drifted = []
+        for category_id, count, stocked in connection.execute(
+                select(c.c.id, c.c.product_count, c.c.in_stock_count)):
+            want = expected.get(category_id, (0, 0))
+            if (count, stocked) != want:
+                drifted.append({'id': category_id, 'product_count': want[0],
+                                'in_stock_count': want[1]})
+        if drifted and not check:
+            stmt = (c.update()
+                    .where(c.c.id == bindparam('_id'))
+                    .values(product_count=bindparam('_product_count'),
+                            in_stock_count=bindparam('_in_stock_count')))
+            connection.execute(stmt, [{'_' + k: v for k, v in row.items()} for row in drifted])
+    return len(drifted)
+
+
+def reconcile(engine, batch_size=5000, check=False):
+    """Link unlinked products and fix drifted counts (or with check=True
+    only count them).  Returns (products linked, categories fixed)."""
+    linked = _link(engine, batch_size, check)
+    return linked, _recount(engine, check)
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    from models import db
+
+    parser = argparse.ArgumentParser(description='Backfill product categories and facet counts.')
+    parser.add_argument('command', choices=['reconcile'])
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--check', action='store_true', help='only report drift')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        linked, drifted = reconcile(db.engine, args.batch_size, args.check)
+        verb = 'out of step' if args.check else 'fixed'
+        print(f'{linked} products without category_id, {drifted} category counts {verb} '
+              f'in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Turn a cart into an order without overselling.
+
+Stock is reserved with one set-based conditional UPDATE over all cart lines:
+
+    UPDATE product SET stock = stock - CASE id WHEN :id1 THEN :qty1 ... END
+    WHERE id IN (:id1, ...) AND stock >= CASE id WHEN :id1 THEN :qty1 ... END
+    RETURNING id, price
+
+Products that come back are exactly the lines that could be filled.  If any
+line is missing the transaction is rolled back and OutOfStock lists every
+short line; otherwise the order and its items are inserted, the total is
+summed in SQL and the cart is emptied, all in the same short transaction.
+Each item is charged the price RETURNING reads less the best discount in
+effect (pricing.prices), as product views show it.
+The first statement of the transaction is a write, so SQLite takes the write
+lock up front instead of failing on a read-to-write upgrade.
+
+    try:
+        result = checkout(cart_id)
+    except OutOfStock as e:
+        e.shortages    # [Shortage(product_id, requested, available), ...]
+"""
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+
+from models import db, apply_category_counts, Cart, CartItem, Order, OrderItem, Product
+from pricing import apply_discount, prices
+from response_cache import cache
+
+Shortage = namedtuple('Shortage', ['product_id', 'requested', 'available'])
+CheckoutResult = namedtuple('CheckoutResult', ['order_id', 'total_amount', 'lines'])
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('insufficient stock for product(s) %s'
+                         % ', '.join(str(s.product_id) for s in shortages))
+
+
+def _cart_lines(connection, cart_id):
+    stmt = (select(CartItem.product_id, func.sum(CartItem.quantity))
+            .where(CartItem.cart_id == cart_id)
+            .group_by(CartItem.product_id)
+            .order_by(CartItem.product_id))
+    return [(product_id, int(quantity)) for product_id, quantity in connection.execute(stmt)
+            if quantity > 0]
+
+
+def _combine(lines):
+    # One line per product: the CASE keeps one quantity per id, and reserved
+    # is compared against the lines by count.
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return sorted((pid, qty) for pid, qty in quantities.items() if qty > 0)
+
+
+def _reserve(connection, lines):
+    """Decrement stock for every line that can be filled.
+
+    Returns {id: price} and a Counter of category ids whose products just
+    sold out.
+    """
+    # A CASE over the line quantities rather than a VALUES CTE: pysqlite only
+    # opens its implicit transaction for statements starting with a DML verb.
+    quantity = case(dict(lines), value=Product.id)
+    stmt = (update(Product)
+            .where(Product.id.in_([pid for pid, _ in lines]), Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+            .returning(Product.id, Product.price, Product.stock, Product.category_id))
+    rows = connection.execute(stmt).all()
+    sold_out = Counter(row.category_id for row in rows
+                       if row.stock == 0 and row.category_id is not None)
+    return {row.id: row.price for row in rows}, sold_out
+
+
+def _shortages(connection, lines, reserved):
+    missing = [(pid, qty) for pid, qty in lines if pid not in reserved]
+    stock = dict(connection.execute(
+        select(Product.id, Product.stock)
+        .where(Product.id.in_([pid for pid, _ in missing]))).all())
+    return [Shortage(pid, qty, stock.get(pid) or 0) for pid, qty in missing]
+
+
+def checkout(cart_id, user_id=None, lines=None, clear_cart=True, engine=None):
+    """Place an order for the cart's contents (or explicit [(product_id, qty)]).
+
+    Lines for the same product are merged.  Raises EmptyCart or OutOfStock;
+    on success returns CheckoutResult.  Discounts come from pricing.prices,
+    which must be bound to the same database as `engine`.
+    """
+    engine = engine or db.engine
+    if lines is None or user_id is None:
+        with engine.connect() as connection:
+            if user_id is None:
+                user_id = connection.execute(
+                    select(Cart.user_id).where(Cart.id == cart_id)).scalar_one()
+            if lines is None:
+                lines = _cart_lines(connection, cart_id)
+    lines = _combine(lines)
+    if not lines:
+        raise EmptyCart(f'cart {cart_id} is empty')
+
+    # Looked up before the write lock is taken; a reload reads the database.
+    discounts = {pid: prices.percentage(pid) for pid, _ in lines}
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        reserved, sold_out = _reserve(connection, lines)
+        if len(reserved) != len(lines):
+            shortages = _shortages(connection, lines, reserved)
+            connection.rollback()
+            raise OutOfStock(shortages)
+
+        order_id = connection.execute(
+            insert(Order).values(user_id=user_id, total_amount=0, status='Pending',
+                                 created_at=now, updated_at=now)
+            .returning(Order.id)).scalar_one()
+        connection.execute(insert(OrderItem), [
+            {'order_id': order_id, 'product_id': pid, 'quantity': qty,
+             'price': apply_discount(reserved[pid], discounts[pid]),
+             'created_at': now, 'updated_at': now}
+            for pid, qty in lines
+        ])
+        total = (select(func.coalesce(func.sum(OrderItem.quantity * OrderItem.price), 0))
+                 .where(OrderItem.order_id == order_id)
+                 .scalar_subquery())
+        total_amount = connection.execute(
+            update(Order).where(Order.id == order_id)
+            .values(total_amount=func.round(total, 2))
+            .returning(Order.total_amount)).scalar_one()
+        # Core UPDATE, so the Product mapper events don't keep the facets.
+        for category_id, count in sold_out.items():
+            apply_category_counts(connection, category_id, in_stock=-count)
+        if clear_cart:
+            connection.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+            connection.execute(update(Cart).where(Cart.id == cart_id).values(updated_at=now))
+    # Stock changed outside the ORM session, so its commit hooks didn't see it.
+    tags = [('product', pid) for pid, _ in lines] + [('products',)]
+    tags += [('category', category_id) for category_id in sold_out]
+    if sold_out:
+        tags.append(('categories',))
+    cache.invalidate(tags)
+    return CheckoutResult(order_id, total_amount, lines)
@@ -0,0 +1,80 @@
+import os
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-change-me')
+    BCRYPT_LOG_ROUNDS = 12
+    # Engine profile (database.py); only applies to file-backed SQLite.
+    SQLITE_PROFILE = True
+    # Also start the profile's read pool and group-commit writer thread for
+    # callers that submit to them; the app's own paths use db.engine.
+    SQLITE_WRITE_QUEUE = False
+    SQLITE_READ_POOL_SIZE = 8
+    # Asyncio read path (async_reads.py, served by asgi.py): aiosqlite
+    # connections per process.
+    ASYNC_POOL_SIZE = 8
+    # Conditional-GET cache for catalog reads (response_cache.py).
+    RESPONSE_CACHE_MAX_ENTRIES = 10_000
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL = 60
+    # Write-behind cart store (cart_store.py); the journal defaults to
+    # <instance>/cart-journal.
+    CART_STORE_FLUSH_INTERVAL = 1.0
+    CART_STORE_FSYNC = False
+    # Seconds between each worker's checks for journals left by dead workers.
+    CART_STORE_RECOVER_INTERVAL = 30.0
+    # SQL instrumentation (sql_metrics.py): fraction of requests traced, and
+    # how many runs of one statement fingerprint in a request count as N+1.
+    SQL_METRICS_SAMPLE_RATE = 0.1
+    SQL_METRICS_N_PLUS_ONE = 5
+    SQL_METRICS_SLOW_REQUEST_MS = 250
+    # Login throttling (throttle.py): token buckets per username and client
+    # address, checked before any bcrypt work.  With a shared path, every
+    # worker process on the host counts attempts together.
+    LOGIN_THROTTLE_ENABLED = True
+    LOGIN_THROTTLE_USER_BURST = 10
+    LOGIN_THROTTLE_USER_PER_MINUTE = 5
+    LOGIN_THROTTLE_ADDRESS_BURST = 50
+    LOGIN_THROTTLE_ADDRESS_PER_MINUTE = 30
+    LOGIN_THROTTLE_MAX_KEYS = 100_000
+    LOGIN_THROTTLE_SHARED_PATH = os.environ.get('LOGIN_THROTTLE_SHARED_PATH')
+    # Proxies in front of the app that append to X-Forwarded-For.  The client
+    # address (request.remote_addr, the throttle's address key) is then taken
+    # from that header; with 0 it is the peer's and the header is ignored.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    # Seconds between each process's reads of the shared token revocations
+    # (tokens.py): how long a logout can take to reach every worker.
+    TOKEN_REVOCATION_POLL = 1.0
+    # Seconds before the price engine (pricing.py) reloads every price, which
+    # is how long another process's price or discount change can go unseen.
+    PRICE_ENGINE_MAX_AGE = 60.0
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    BCRYPT_LOG_ROUNDS = 10
+    SQL_METRICS_SAMPLE_RATE = 1.0
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    BCRYPT_LOG_ROUNDS = 4
+    SQLITE_PROFILE = False
+    CART_STORE_JOURNAL_DIR = None
+
+
+class ProductionConfig(Config):
+    # Production must provide its own secret.
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    # Deployed behind one reverse proxy (see asgi.py).
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,19 @@
+"""pytest: run from the server directory's flat module layout.
+
+    cd server && python -m pytest -q
+"""
+import pytest
+
+import fixtures
+
+
+@pytest.fixture(scope='session')
+def app():
+    # seed_db()'s dataset on a ':memory:' clone of the cached template.
+    return fixtures.create_app()
+
+
+@pytest.fixture
+def client(app):
+    with fixtures.rollback(app):
+        yield app.test_client()
@@ -0,0 +1,288 @@
+"""Production SQLite engine profile.
+
+* Every connection gets WAL, synchronous=NORMAL, a busy timeout, mmap and a
+  larger page cache (set in a connect event).
+* Transactions are begun by SQLAlchemy, not pysqlite, so SAVEPOINTs work
+  and statements starting with WITH are transactional (pysqlite's implicit
+  BEGIN misses them).  Writes take the lock up front with BEGIN IMMEDIATE
+  instead of failing on a read-to-write upgrade: db.engine holds BEGIN
+  back until a transaction's first statement that isn't a read, so reads
+  before it run on their own and read-only requests never take the lock.
+  Blocks that read and then write what they read use write_transaction(),
+  which takes the lock at BEGIN so nothing commits in between.
+* SQLiteProfile adds a pool of read-only connections and one writer
+  connection fed by a queue.  The writer thread drains whatever jobs are
+  waiting and commits them together (group commit), each job in its own
+  SAVEPOINT so one failing job doesn't sink the batch.  The app's write
+  paths don't go through it, so init_app only starts one when
+  SQLITE_WRITE_QUEUE is set.
+
+    profile = SQLiteProfile('instance/app.db')
+    with profile.reader() as conn:
+        conn.execute(select(Product).limit(10))
+    profile.write(lambda conn: conn.execute(update(Product)...)).result()
+
+    with write_transaction(engine) as conn:     # read, then write, atomically
+        ...
+
+    # or, for the Flask app
+    database.init_app(app)     # configures db.engine
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,           # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # negative = KiB, i.e. 64 MiB
+    'temp_store': 'MEMORY',
+}
+
+
+# Statements that can run ahead of a deferred BEGIN (see apply_pragmas).
+READ_PREFIXES = ('SELECT', 'PRAGMA', 'EXPLAIN')
+# connection.info flag: begin with the write lock (write_transaction).
+WRITE_LOCK = 'sqlite_write_lock'
+
+
+def apply_pragmas(engine, pragmas=None, readonly=False, begin='BEGIN', on_first_write=False):
+    """Install the connect/begin hooks on an existing pysqlite engine.
+
+    Read-only engines get no BEGIN: each SELECT runs in its own implicit
+    transaction, saving two round trips per read.  With on_first_write,
+    `begin` is issued just before a transaction's first statement that
+    isn't a plain read; a transaction that only reads never issues it.
+    """
+    pragmas = dict(PRAGMAS, **(pragmas or {}))
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy, not pysqlite, decide when transactions start.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if readonly and name == 'journal_mode':
+                continue  # a read-only connection can't change the journal mode
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if readonly:
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    if readonly:
+        return engine
+
+    if not on_first_write:
+        @event.listens_for(engine, 'begin')
+        def _on_begin(connection):
+            connection.exec_driver_sql(
+                'BEGIN IMMEDIATE' if connection.info.get(WRITE_LOCK) else begin)
+        return engine
+
+    @event.listens_for(engine, 'begin')
+    def _on_deferred_begin(connection):
+        if connection.info.get(WRITE_LOCK):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.info['sqlite_begin_pending'] = True
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _on_execute(connection, cursor, statement, parameters, context, executemany):
+        if (connection.info.get('sqlite_begin_pending')
+                and not statement.lstrip()[:7].upper().startswith(READ_PREFIXES)):
+            connection.info['sqlite_begin_pending'] = False
+            cursor.execute(begin)
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def _on_end(connection):
+        connection.info['sqlite_begin_pending'] = False
+
+    return engine
+
+
+@contextmanager
+def write_transaction(engine):
+    """engine.begin() holding SQLite's write lock from the first statement.
+
+    Under a deferred BEGIN another writer can commit between a block's reads
+    and its first write; here it waits for the lock instead.
+    """
+    with engine.connect() as connection:
+        connection.info[WRITE_LOCK] = True
+        try:
+            with connection.begin():
+                if (connection.dialect.name == 'sqlite'
+                        and not connection.connection.dbapi_connection.in_transaction):
+                    # No begin hook: pysqlite's own handling starts nothing yet.
+                    connection.exec_driver_sql('BEGIN IMMEDIATE')
+                yield connection
+        finally:
+            connection.info.pop(WRITE_LOCK, None)
+
+
+class WriteQueue:
+    """Single writer thread committing queued jobs in groups.
+
+    By default a batch is whatever is queued when the writer comes round;
+    max_delay > 0 makes it linger for stragglers, which only pays off when
+    many cores are submitting.
+    """
+
+    def __init__(self, engine, max_batch=256, max_delay=0.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._jobs = queue.Queue()
+        self._stopped = False
+        self.batches = 0
+        self.jobs_done = 0
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(connection, *args, **kwargs); returns a Future of its result."""
+        if self._stopped:
+            raise RuntimeError('write queue is closed')
+        future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def _take_batch(self):
+        first = self._jobs.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                job = self._jobs.get(timeout=timeout) if timeout > 0 else self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._jobs.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            results = []
+            try:
+                with self.engine.begin() as connection:
+                    for future, fn, args, kwargs in batch:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        savepoint = connection.begin_nested()
+                        try:
+                            value = fn(connection, *args, **kwargs)
+                        except Exception as exc:
+                            savepoint.rollback()
+                            results.append((future, None, exc))
+                        else:
+                            savepoint.commit()
+                            results.append((future, value, None))
+            except Exception as exc:
+                # The commit itself failed: nothing in the batch was written.
+                for future, _, _, _ in batch:
+                    if future.running():
+                        future.set_exception(exc)
+                continue
+            for future, value, exc in results:
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(value)
+            self.batches += 1
+            self.jobs_done += len(batch)
+
+    def close(self):
+        self._stopped = True
+        self._jobs.put(None)
+        self._thread.join()
+
+
+class SQLiteProfile:
+    def __init__(self, path, read_pool_size=8, pragmas=None, max_batch=256, max_delay=0.0):
+        self.path = path
+        self.write_engine = apply_pragmas(
+            create_engine(f'sqlite:///{path}', pool_size=1, max_overflow=0),
+            pragmas, begin='BEGIN IMMEDIATE')
+        # Create the WAL before any read-only connection needs it.
+        with self.write_engine.connect():
+            pass
+        self.read_engine = apply_pragmas(
+            create_engine(f'sqlite:///file:{path}?mode=ro&uri=true',
+                          pool_size=read_pool_size, max_overflow=0),
+            pragmas, readonly=True)
+        self.writer = WriteQueue(self.write_engine, max_batch, max_delay)
+
+    @contextmanager
+    def reader(self, snapshot=False):
+        """A pooled read-only connection; snapshot=True holds one read
+        transaction across all statements for a consistent view."""
+        with self.read_engine.connect() as connection:
+            if snapshot:
+                connection.exec_driver_sql('BEGIN')
+                try:
+                    yield connection
+                finally:
+                    connection.exec_driver_sql('COMMIT')
+            else:
+                yield connection
+
+    def write(self, fn, *args, **kwargs):
+        return self.writer.submit(fn, *args, **kwargs)
+
+    def after_fork(self):
+        # The writer thread didn't survive fork and the pooled connections
+        # belong to the parent; start over with fresh ones.
+        self.read_engine.dispose(close=False)
+        self.write_engine.dispose(close=False)
+        self.writer = WriteQueue(self.write_engine, self.writer.max_batch, self.writer.max_delay)
+
+    def close(self):
+        self.writer.close()
+        self.read_engine.dispose()
+        self.write_engine.dispose()
+
+
+def init_app(app, db=None):
+    """Apply the pragmas and the deferred BEGIN IMMEDIATE to Flask-SQLAlchemy's engine.
+
+    db.engine serves the ORM session and the Core write paths.  With
+    SQLITE_WRITE_QUEUE set, a SQLiteProfile on the same file is started too
+    and attached as app.extensions['sqlite_profile'] (prefork.py resets it
+    in each worker); nothing in the app submits to it yet.
+    """
+    if db is None:
+        from models import db
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'sqlite':
+            return None
+        pragmas = app.config.get('SQLITE_PRAGMAS')
+        apply_pragmas(engine, pragmas, begin='BEGIN IMMEDIATE', on_first_write=True)
+        engine.dispose()  # pooled connections predate the hooks
+        path = engine.url.database
+        if not app.config.get('SQLITE_WRITE_QUEUE') or not path or path == ':memory:':
+            return None
+        profile = SQLiteProfile(
+            path,
+            read_pool_size=app.config.get('SQLITE_READ_POOL_SIZE', 8),
+            pragmas=pragmas,
+            max_batch=app.config.get('SQLITE_WRITE_BATCH', 256),
+            max_delay=app.config.get('SQLITE_WRITE_DELAY', 0.0),
+        )
+    app.extensions['sqlite_profile'] = profile
+    return profile
@@ -0,0 +1,233 @@
+"""Streaming export of orders with their items and payment.
+
+Orders are read in keyset windows on order id (`id > last ORDER BY id LIMIT
+window`); each window's items and payments are fetched with one range query
+apiece and joined in Python.  Only one window is ever in memory, so memory use
+is flat regardless of table size, and the last exported id (plus the file
+size when it was written) is all that is needed to resume.
+
+    python export.py orders.ndjson.gz --format ndjson --gzip
+    python export.py orders.csv --format csv --resume     # continue after a crash
+
+    # in a view
+    return export.orders_response('csv', compress=True)
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+
+from flask import Response, stream_with_context
+from sqlalchemy import select
+
+from models import db, Order, OrderItem, Payment
+from serializers import serialize_rows
+
+ORDER_COLUMNS = (Order.id, Order.user_id, Order.total_amount, Order.status,
+                 Order.created_at, Order.updated_at)
+ITEM_COLUMNS = (OrderItem.id, OrderItem.order_id, OrderItem.product_id,
+                OrderItem.quantity, OrderItem.price)
+PAYMENT_COLUMNS = (Payment.id, Payment.order_id, Payment.amount,
+                   Payment.payment_method, Payment.status, Payment.created_at)
+
+CSV_FIELDS = [
+    'order_id', 'user_id', 'total_amount', 'status', 'created_at', 'updated_at',
+    'item_id', 'product_id', 'quantity', 'price',
+    'payment_id', 'payment_amount', 'payment_method', 'payment_status',
+]
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_orders(connection, after_id=0, window=1000):
+    """Yield order dicts (with 'items' and 'payment') in id order."""
+    last_id = after_id
+    while True:
+        orders = serialize_rows(connection.execute(
+            select(*ORDER_COLUMNS).where(Order.id > last_id).order_by(Order.id).limit(window)))
+        if not orders:
+            return
+        first_id, last_id = orders[0]['id'], orders[-1]['id']
+
+        items = {}
+        for item in serialize_rows(connection.execute(
+                select(*ITEM_COLUMNS)
+                .where(OrderItem.order_id.between(first_id, last_id))
+                .order_by(OrderItem.order_id, OrderItem.id))):
+            items.setdefault(item['order_id'], []).append(item)
+        payments = {payment['order_id']: payment for payment in serialize_rows(connection.execute(
+            select(*PAYMENT_COLUMNS).where(Payment.order_id.between(first_id, last_id))))}
+
+        for order in orders:
+            order['items'] = items.get(order['id'], [])
+            order['payment'] = payments.get(order['id'])
+            yield order
+
+
+def ndjson_lines(orders):
+    for order in orders:
+        yield order['id'], json.dumps(order, separators=(',', ':')) + '\n'
+
+
+def csv_lines(orders, header=True):
+    """One CSV row per order item (orders without items get one row)."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS)
+
+    def take():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    if header:
+        writer.writeheader()
+        yield None, take()
+    for order in orders:
+        payment = order['payment'] or {}
+        base = {
+            'order_id': order['id'], 'user_id': order['user_id'],
+            'total_amount': order['total_amount'], 'status': order['status'],
+            'created_at': order['created_at'], 'updated_at': order['updated_at'],
+            'payment_id': payment.get('id'), 'payment_amount': payment.get('amount'),
+            'payment_method': payment.get('payment_method'),
+            'payment_status': payment.get('status'),
+        }
+        for item in order['items'] or [{}]:
+            writer.writerow(dict(base, item_id=item.get('id'), product_id=item.get('product_id'),
+                                 quantity=item.get('quantity'), price=item.get('price')))
+        yield order['id'], take()
+
+
+def _lines(fmt, orders, header=True):
+    if fmt == 'ndjson':
+        return ndjson_lines(orders)
+    if fmt == 'csv':
+        return csv_lines(orders, header)
+    raise ValueError(f'unknown export format {fmt!r}')
+
+
+def _read_checkpoint(checkpoint):
+    """(last order id, byte offset of the last complete flush or None)."""
+    if not os.path.exists(checkpoint):
+        return 0, None
+    with open(checkpoint) as f:
+        parts = f.read().split()
+    if not parts:
+        return 0, None
+    return int(parts[0]), int(parts[1]) if len(parts) > 1 else None
+
+
+def _write_checkpoint(checkpoint, last_id, offset):
+    # Replaced, never rewritten in place, so a crash can't leave half of one.
+    with open(checkpoint + '.tmp', 'w') as f:
+        f.write(f'{last_id} {offset}')
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+
+def export_to_file(path, fmt='ndjson', compress=False, resume=False, window=1000, engine=None):
+    """Write the export to `path`, checkpointing the last fully written order id.
+
+    The checkpoint also records the file size after that flush.  With
+    resume=True an interrupted export is cut back to it, dropping whatever
+    was half written, and continues after the checkpointed order.  Gzip
+    output is written as one gzip member per flush (readers handle
+    concatenated members), so the cut always falls between complete
+    members.  Returns the number of orders written in this run.
+    """
+    engine = engine or db.engine
+    checkpoint = path + '.checkpoint'
+    after_id, offset = _read_checkpoint(checkpoint) if resume else (0, None)
+    appending = (after_id > 0 and offset is not None and os.path.exists(path)
+                 and os.path.getsize(path) >= offset)
+    if not appending:
+        after_id = 0
+
+    written = 0
+    pending = []
+    pending_size = 0
+    last_id = after_id
+    with engine.connect() as connection, open(path, 'r+b' if appending else 'wb') as out:
+        if appending:
+            out.truncate(offset)
+            out.seek(offset)
+
+        def flush():
+            nonlocal pending, pending_size
+            data = ''.join(pending).encode('utf-8')
+            if compress and data:
+                data = gzip.compress(data)
+            out.write(data)
+            out.flush()
+            pending, pending_size = [], 0
+            _write_checkpoint(checkpoint, last_id, out.tell())
+
+        orders = iter_orders(connection, after_id, window)
+        for order_id, text in _lines(fmt, orders, header=not appending):
+            pending.append(text)
+            pending_size += len(text)
+            if order_id is not None:
+                last_id = order_id
+                written += 1
+            if pending_size >= CHUNK_SIZE:
+                flush()
+        flush()
+    os.remove(checkpoint)
+    return written
+
+
+def iter_chunks(fmt='ndjson', compress=False, after_id=0, window=1000, engine=None):
+    """Yield the export as byte chunks of roughly CHUNK_SIZE, gzipped or not."""
+    engine = engine or db.engine
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending, pending_size = [], 0
+    with engine.connect() as connection:
+        for _, text in _lines(fmt, iter_orders(connection, after_id, window)):
+            pending.append(text)
+            pending_size += len(text)
+            if pending_size >= CHUNK_SIZE:
+                data = ''.join(pending).encode('utf-8')
+                pending, pending_size = [], 0
+                data = compressor.compress(data) if compressor else data
+                if data:
+                    yield data
+    data = ''.join(pending).encode('utf-8')
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def orders_response(fmt='ndjson', compress=False, after_id=0):
+    """A chunked Flask response streaming the export."""
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    headers = {'Content-Disposition': f'attachment; filename=orders.{fmt}'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(iter_chunks(fmt, compress, after_id)),
+                    mimetype=mimetype, headers=headers)
+
+
+def main():
+    import argparse
+    import time
+    from app import create_app
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Export orders with items and payment.')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--window', type=int, default=1000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        written = export_to_file(args.path, args.format, args.gzip, args.resume, args.window)
+        print(f'{written} orders exported in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Instant test and dev databases, cloned from a prebuilt template.
+
+seed_db() and seed.py start from drop_all/create_all and generate every
+row again, bcrypt hashes included.  Here the seeded database is built once:
+template() keeps it at <directory>/template-<schema hash>-<seed hash>.db and
+reuses it until the models' DDL or the SeedConfig changes.
+
+clone() copies the template with SQLite's online backup API (pages, not
+SQL) into :memory: or a file, so a fresh database takes milliseconds.
+create_app() builds the testing app on such a copy.  rollback() makes one
+test's changes disposable: db.session is joined to an outer transaction
+on a single connection, so commits in the code under test only release
+SAVEPOINTs, and the whole transaction is rolled back when the block ends.
+
+    import fixtures
+    app = fixtures.create_app(SeedConfig(users=20, products=50))  # once
+    with fixtures.rollback(app):                                  # per test
+        client = app.test_client()
+        ...
+
+The price engine (pricing.prices) and token revocations (tokens.tokens)
+read through an engine of their own; inside rollback() they are bound to
+the test's connection too, so priced endpoints, login and logout see and
+undo the test's rows.  Code that writes through db.engine rather than
+db.session (checkout, cart flushes, product_import) runs its own
+transactions, which can't nest inside rollback(); give those tests a
+create_app() of their own.
+"""
+import dataclasses
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import app as application
+import database
+import search
+from config import TestingConfig
+from models import db
+from pricing import prices
+from response_cache import cache
+from seeding import SeedConfig, seed
+from tokens import tokens
+
+# seed_db()'s dataset, hashed at the testing config's bcrypt cost.
+DEFAULT_SEED = SeedConfig(users=10, products=10, orders=10, reviews=10, bcrypt_rounds=4)
+DEFAULT_DIRECTORY = os.environ.get(
+    'TEMPLATE_DB_DIR', os.path.join(tempfile.gettempdir(), 'db-templates'))
+
+
+def schema_hash():
+    # Templates are rebuilt whenever the models' DDL changes.
+    dialect = sqlite.dialect()
+    tables = db.metadata.sorted_tables
+    ddl = [str(CreateTable(table).compile(dialect=dialect)) for table in tables]
+    ddl += [str(CreateIndex(index).compile(dialect=dialect))
+            for table in tables for index in sorted(table.indexes, key=lambda i: i.name)]
+    ddl += search.FTS_DDL
+    return hashlib.blake2b('\n'.join(ddl).encode(), digest_size=6).hexdigest()
+
+
+def seed_hash(config):
+    return hashlib.blake2b(repr(dataclasses.asdict(config)).encode(), digest_size=6).hexdigest()
+
+
+def template(config=None, directory=None, name='template'):
+    """Path of the seeded template for `config`, building it if it isn't cached."""
+    config = config or DEFAULT_SEED
+    directory = directory or DEFAULT_DIRECTORY
+    path = os.path.join(directory, f'{name}-{schema_hash()}-{seed_hash(config)}.db')
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    # Per process, so parallel test runners building the same template don't collide.
+    building = f'{path}.{os.getpid()}.building'
+    print(f'seeding template {path} ...', file=sys.stderr)
+    started = time.perf_counter()
+    engine = create_engine(f'sqlite:///{building}')
+    try:
+        db.metadata.create_all(engine)
+        seed(engine, config)
+    finally:
+        engine.dispose()
+    os.replace(building, path)
+    print(f'seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    return path
+
+
+def clone(path, target=':memory:'):
+    """A sqlite3 connection to a fresh copy of the database at `path`.
+
+    target is ':memory:' or a file path; an existing file is overwritten.
+    """
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        copy = sqlite3.connect(target, check_same_thread=False)
+        source.backup(copy)
+    finally:
+        source.close()
+    return copy
+
+
+def create_app(config=None, target=':memory:', **overrides):
+    """The testing app on a clone of the template for `config`.
+
+    A ':memory:' clone is a single connection shared by the app's engine
+    (StaticPool); it disappears with the app.  A file target is opened by
+    URL like any other database.
+    """
+    copy = clone(template(config), target)
+    settings = {key: getattr(TestingConfig, key) for key in dir(TestingConfig) if key.isupper()}
+    if target == ':memory:':
+        settings['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        settings['SQLALCHEMY_ENGINE_OPTIONS'] = {'creator': lambda: copy,
+                                                 'poolclass': StaticPool}
+    else:
+        copy.close()
+        settings['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(target)}'
+    settings.update(overrides)
+    app = application.create_app(settings)
+    if not app.config.get('SQLITE_PROFILE'):
+        # pysqlite's own transaction handling breaks SAVEPOINTs; let
+        # SQLAlchemy issue BEGIN, as the profile does.
+        with app.app_context():
+            database.apply_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    return app
+
+
+class JoinedSession(Session):
+    """A Flask-SQLAlchemy session that runs everything on its own bind.
+
+    The stock session picks the app's engine for every query, which would
+    step outside the test's transaction.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return bind if bind is not None else self.bind
+
+
+class JoinedEngine:
+    """Engine stand-in that hands out the test's connection.
+
+    On a ':memory:' clone a real engine.connect() is that same SQLite
+    connection, which can't BEGIN again inside the test's transaction.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextmanager
+    def connect(self):
+        yield self.connection
+
+    @contextmanager
+    def begin(self):
+        with self.connection.begin_nested():
+            yield self.connection
+
+
+@contextmanager
+def rollback(app):
+    """Run the block in one transaction and roll it back at the end.
+
+    db.session is swapped for one bound to that transaction with
+    join_transaction_mode='create_savepoint': its commit() and rollback()
+    work on SAVEPOINTs, so the code under test behaves as it does in
+    production.  prices and tokens are bound to the same connection (see
+    JoinedEngine) and rebound afterwards, and the response cache is
+    cleared, since they may hold rows that no longer exist.
+    """
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        original = db.session
+        engines = prices.engine, tokens.engine
+        db.session = scoped_session(sessionmaker(
+            class_=JoinedSession, db=db, bind=connection,
+            join_transaction_mode='create_savepoint'))
+        prices.bind(JoinedEngine(connection))
+        tokens.bind(JoinedEngine(connection))
+        try:
+            yield db.session
+        finally:
+            db.session.remove()
+            db.session = original
+            transaction.rollback()
+            connection.close()
+            prices.bind(engines[0])
+            tokens.bind(engines[1])
+            cache.clear()
@@ -0,0 +1,12 @@
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 1))
+
+# Load (and warm) the app in the master so workers share its memory
+# copy-on-write.  wsgi.py registers the post-fork reset with os.register_at_fork.
+preload_app = True
+max_requests = 10_000
+max_requests_jitter = 1_000
@@ -0,0 +1,154 @@
+"""Bounded thread pool for bcrypt hashing and verification.
+
+bcrypt releases the GIL while it works, so running it on a thread pool gives
+real parallelism and keeps request threads free.  The number of jobs waiting
+for a worker is capped; once the cap is hit callers wait up to `timeout`
+seconds for a slot and then get a PoolBusy error they can turn into a 503.
+
+    from hashing import pool
+    pool.configure(rounds=12, workers=4, max_queue=64)
+    hashed = pool.hash_password("secret")            # blocking
+    ok = await pool.check_password_async(hashed, "secret")
+"""
+import asyncio
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt as _bcrypt
+
+DEFAULT_ROUNDS = 12
+
+
+class PoolBusy(Exception):
+    """Raised when the hashing queue is full and no slot freed up in time."""
+
+
+def hash_rounds(password_hash):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _hash(password, rounds):
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password_hash, password):
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    try:
+        return _bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        # Malformed or empty stored hash.
+        return False
+
+
+class HashingPool:
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=None, max_queue=None, timeout=5.0):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+        self.configure(rounds, workers, max_queue, timeout)
+        self.submitted = 0
+        self.rejected = 0
+
+    def configure(self, rounds=DEFAULT_ROUNDS, workers=None, max_queue=None, timeout=5.0):
+        """(Re)size the pool.  Jobs already running finish on the old executor."""
+        workers = workers or min(os.cpu_count() or 1, 8)
+        max_queue = max_queue if max_queue is not None else workers * 8
+        with self._lock:
+            old = self._executor
+            self.rounds = rounds
+            self.workers = workers
+            self.max_queue = max_queue
+            self.timeout = timeout
+            # Slots cover jobs running on a worker plus jobs waiting for one.
+            self._slots = threading.BoundedSemaphore(workers + max_queue)
+            self._executor = ThreadPoolExecutor(max_workers=workers,
+                                                thread_name_prefix='bcrypt')
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def after_fork(self):
+        # Executor threads don't survive fork; build a fresh pool.
+        self._executor = None
+        self._lock = threading.Lock()
+        self.configure(self.rounds, self.workers, self.max_queue, self.timeout)
+
+    def init_app(self, app):
+        self.configure(
+            rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_ROUNDS),
+            workers=app.config.get('BCRYPT_POOL_WORKERS'),
+            max_queue=app.config.get('BCRYPT_POOL_MAX_QUEUE'),
+            timeout=app.config.get('BCRYPT_POOL_TIMEOUT', 5.0),
+        )
+
+    def _submit(self, fn, *args):
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            self.rejected += 1
+            raise PoolBusy('password hashing queue is full')
+        self.submitted += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def submit_hash(self, password, rounds=None):
+        return self._submit(_hash, password, rounds or self.rounds)
+
+    def submit_check(self, password_hash, password):
+        return self._submit(_check, password_hash, password)
+
+    def hash_password(self, password, rounds=None):
+        return self.submit_hash(password, rounds).result()
+
+    def check_password(self, password_hash, password):
+        return self.submit_check(password_hash, password).result()
+
+    async def hash_password_async(self, password, rounds=None):
+        # Acquiring a slot may block, so do it off the event loop too.
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit_hash, password, rounds)
+        return await asyncio.wrap_future(future)
+
+    async def check_password_async(self, password_hash, password):
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit_check, password_hash, password)
+        return await asyncio.wrap_future(future)
+
+    def check_unknown(self, password):
+        """Check against a throwaway hash at the current cost; always False.
+
+        A login for a username that doesn't exist then takes as long as a
+        wrong password, so response times don't tell which names exist.
+        """
+        dummy = self._dummy_hash
+        if dummy is None or hash_rounds(dummy) != self.rounds:
+            dummy = self._dummy_hash = self.hash_password(secrets.token_urlsafe(16))
+        self.check_password(dummy, password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def queue_depth(self):
+        # Approximate: executor internals, only meant for metrics.
+        return self._executor._work_queue.qsize()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+pool = HashingPool()
@@ -0,0 +1,284 @@
+"""Index advisor for the app's canonical queries (SQLite).
+
+Runs EXPLAIN QUERY PLAN over every query in QUERIES, flags full table scans,
+and proposes the index each query needs.  It can time the queries before and
+after creating the proposed indexes (inside a transaction that is rolled back)
+and emit an Alembic revision creating them.
+
+    # seed a scratch db without secondary indexes and report
+    python index_advisor.py --seed 100000 --db /tmp/advisor.db --timings
+    # write a migration for whatever is still missing in app.db
+    python index_advisor.py --db instance/app.db --emit-migration
+"""
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+CanonicalQuery = namedtuple('CanonicalQuery', ['name', 'sql', 'table', 'columns'])
+
+NOW = '2023-06-01 00:00:00.000000'
+PARAMS = {
+    'user_id': 1, 'product_id': 1, 'order_id': 1, 'cart_id': 1,
+    'category': 'Kitchen', 'category_id': 1, 'status': 'Pending', 'now': NOW,
+}
+
+# Each query names the index that serves it: equality columns first, then the
+# range/sort column.
+QUERIES = [
+    CanonicalQuery('products by category',
+                   'SELECT id, name, price FROM product WHERE category_id = :category_id',
+                   'product', ('category_id',)),
+    CanonicalQuery('catalog page, newest first',
+                   'SELECT id, name, price FROM product WHERE (created_at, id) < (:now, :product_id) '
+                   'ORDER BY created_at DESC, id DESC LIMIT 25',
+                   'product', ('created_at', 'id')),
+    CanonicalQuery('catalog page, by price',
+                   'SELECT id, name, price FROM product WHERE (price, id) > (0, :product_id) '
+                   'ORDER BY price, id LIMIT 25',
+                   'product', ('price', 'id')),
+    CanonicalQuery('catalog page, best rated',
+                   'SELECT id, name, price FROM product WHERE (rating_avg, id) < (5, :product_id) '
+                   'ORDER BY rating_avg DESC, id DESC LIMIT 25',
+                   'product', ('rating_avg', 'id')),
+    CanonicalQuery('products by creator',
+                   'SELECT id, name FROM product WHERE creator_id = :user_id',
+                   'product', ('creator_id',)),
+    CanonicalQuery('order items of order',
+                   'SELECT * FROM order_item WHERE order_id = :order_id',
+                   'order_item', ('order_id',)),
+    CanonicalQuery('order items of product',
+                   'SELECT * FROM order_item WHERE product_id = :product_id',
+                   'order_item', ('product_id',)),
+    CanonicalQuery('reviews of product',
+                   'SELECT * FROM review WHERE product_id = :product_id',
+                   'review', ('product_id',)),
+    CanonicalQuery('reviews by user',
+                   'SELECT * FROM review WHERE user_id = :user_id',
+                   'review', ('user_id',)),
+    CanonicalQuery('cart items of cart',
+                   'SELECT * FROM cart_item WHERE cart_id = :cart_id',
+                   'cart_item', ('cart_id',)),
+    CanonicalQuery('cart items of product',
+                   'SELECT * FROM cart_item WHERE product_id = :product_id',
+                   'cart_item', ('product_id',)),
+    CanonicalQuery('cart of user',
+                   'SELECT * FROM cart WHERE user_id = :user_id',
+                   'cart', ('user_id',)),
+    CanonicalQuery('addresses of user',
+                   'SELECT * FROM address WHERE user_id = :user_id',
+                   'address', ('user_id',)),
+    CanonicalQuery('payment of order',
+                   'SELECT * FROM payment WHERE order_id = :order_id',
+                   'payment', ('order_id',)),
+    CanonicalQuery('payments of user',
+                   'SELECT * FROM payment WHERE user_id = :user_id',
+                   'payment', ('user_id',)),
+    CanonicalQuery('order history of user',
+                   'SELECT * FROM "order" WHERE user_id = :user_id ORDER BY created_at DESC',
+                   'order', ('user_id', 'created_at')),
+    CanonicalQuery('orders by status',
+                   'SELECT * FROM "order" WHERE status = :status ORDER BY created_at',
+                   'order', ('status', 'created_at')),
+    CanonicalQuery('active discounts of product',
+                   'SELECT * FROM discount WHERE product_id = :product_id '
+                   'AND start_date <= :now AND end_date > :now',
+                   'discount', ('product_id', 'start_date', 'end_date')),
+    CanonicalQuery('active discounts',
+                   'SELECT * FROM discount WHERE start_date <= :now AND end_date > :now',
+                   'discount', ('start_date', 'end_date')),
+]
+
+_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def index_name(table, columns):
+    return 'ix_%s_%s' % (table, '_'.join(columns))
+
+
+def explain(conn, query):
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + query.sql, PARAMS).fetchall()
+    return [row[3] for row in rows]
+
+
+def scans(plan):
+    # "SCAN order_item" is a full scan; "SCAN x USING INDEX ..." is not.
+    return [m.group(1) for m in map(_SCAN.match, plan) if m]
+
+
+def existing_indexes(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    return {name for name, in rows}
+
+
+def advise(conn):
+    """Return [(query, plan, scanned tables, suggested index name or None)]."""
+    have = existing_indexes(conn)
+    report = []
+    for query in QUERIES:
+        plan = explain(conn, query)
+        scanned = scans(plan)
+        name = index_name(query.table, query.columns)
+        suggestion = name if scanned and name not in have else None
+        report.append((query, plan, scanned, suggestion))
+    return report
+
+
+def suggestions(report):
+    seen = {}
+    for query, _, _, name in report:
+        if name and name not in seen:
+            seen[name] = (query.table, query.columns)
+    return seen
+
+
+def _time(conn, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(query.sql, PARAMS).fetchall()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def timings(conn, indexes, repeat=5):
+    """Time every query before and after creating `indexes`, then roll back."""
+    before = {q.name: _time(conn, q, repeat) for q in QUERIES}
+    conn.execute('BEGIN')
+    try:
+        for name, (table, columns) in indexes.items():
+            cols = ', '.join(columns)
+            conn.execute(f'CREATE INDEX "{name}" ON "{table}" ({cols})')
+        conn.execute('ANALYZE')
+        after = {q.name: _time(conn, q, repeat) for q in QUERIES}
+    finally:
+        conn.execute('ROLLBACK')
+    return before, after
+
+
+def render_migration(indexes, down_revision, message='add indexes'):
+    revision = uuid.uuid4().hex[:12]
+    upgrades = []
+    downgrades = []
+    for name, (table, columns) in indexes.items():
+        if len(columns) == 1:
+            upgrades.append(f"    op.create_index(op.f('{name}'), '{table}', {list(columns)!r}, unique=False)")
+            downgrades.append(f"    op.drop_index(op.f('{name}'), table_name='{table}')")
+        else:
+            upgrades.append(f"    op.create_index('{name}', '{table}', {list(columns)!r}, unique=False)")
+            downgrades.append(f"    op.drop_index('{name}', table_name='{table}')")
+    downgrades.reverse()
+    upgrade_body = '\n'.join(upgrades) or '    pass'
+    downgrade_body = '\n'.join(downgrades) or '    pass'
+    source = f'''"""{message}
+
+Revision ID: {revision}
+Revises: {down_revision or ''}
+Create Date: {datetime.now()}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = {revision!r}
+down_revision = {down_revision!r}
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+{upgrade_body}
+
+
+def downgrade():
+{downgrade_body}
+'''
+    return revision, source
+
+
+def head_revision(versions_dir):
+    revisions, parents = set(), set()
+    for filename in os.listdir(versions_dir):
+        if not filename.endswith('.py'):
+            continue
+        with open(os.path.join(versions_dir, filename)) as f:
+            text = f.read()
+        rev = re.search(r"^revision = '(\w+)'", text, re.M)
+        down = re.search(r"^down_revision = '(\w+)'", text, re.M)
+        if rev:
+            revisions.add(rev.group(1))
+        if down:
+            parents.add(down.group(1))
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+
+def seed_database(path, size):
+    """Build a seeded db with the baseline schema (no secondary indexes)."""
+    from sqlalchemy import create_engine
+    from models import db
+    from seeding import SeedConfig, seed
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        names = conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'").scalars().all()
+        for name in names:
+            conn.exec_driver_sql(f'DROP INDEX "{name}"')
+    seed(engine, SeedConfig(users=size // 10 or 1, products=size, orders=size,
+                            reviews=size, bcrypt_rounds=4))
+    engine.dispose()
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Flag full scans in canonical queries.')
+    parser.add_argument('--db', default=os.path.join(here, 'instance', 'app.db'))
+    parser.add_argument('--seed', type=int, help='build --db from scratch with this many products/orders')
+    parser.add_argument('--timings', action='store_true', help='report before/after query timings')
+    parser.add_argument('--emit-migration', action='store_true')
+    parser.add_argument('--versions', default=os.path.join(here, 'migrations', 'versions'))
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_database(args.db, args.seed)
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    report = advise(conn)
+    for query, plan, scanned, suggestion in report:
+        status = 'SCAN ' + ','.join(scanned) if scanned else 'ok'
+        print(f'{query.name:<30} {status:<20} {suggestion or ""}')
+        for line in plan:
+            print(f'    {line}')
+
+    indexes = suggestions(report)
+    if args.timings and indexes:
+        before, after = timings(conn, indexes)
+        print(f'\n{"query":<30} {"before ms":>10} {"after ms":>10} {"speedup":>8}')
+        for query in QUERIES:
+            b, a = before[query.name] * 1000, after[query.name] * 1000
+            print(f'{query.name:<30} {b:>10.3f} {a:>10.3f} {b / a if a else 0:>7.1f}x')
+
+    if args.emit_migration:
+        if not indexes:
+            print('No missing indexes.')
+            return
+        revision, source = render_migration(indexes, head_revision(args.versions))
+        path = os.path.join(args.versions, f'{revision}_add_indexes.py')
+        with open(path, 'w') as f:
+            f.write(source)
+        print(f'Wrote {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""cart item unique line
+
+Revision ID: 0c5e9a7f3b18
+Revises: f1b6d8a2c574
+Create Date: 2026-10-18 17:24:03.118640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c5e9a7f3b18'
+down_revision = 'f1b6d8a2c574'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Merge duplicate lines into the oldest row before making them unique.
+    op.execute("""
+        UPDATE cart_item SET quantity = (
+            SELECT sum(d.quantity) FROM cart_item d
+            WHERE d.cart_id = cart_item.cart_id AND d.product_id = cart_item.product_id)
+        WHERE id IN (SELECT min(id) FROM cart_item GROUP BY cart_id, product_id
+                     HAVING count(*) > 1)
+    """)
+    op.execute("""
+        DELETE FROM cart_item WHERE id NOT IN (
+            SELECT min(id) FROM cart_item GROUP BY cart_id, product_id)
+    """)
+    op.create_index('ix_cart_item_cart_id_product_id', 'cart_item', ['cart_id', 'product_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_cart_item_cart_id_product_id', table_name='cart_item')
@@ -0,0 +1,26 @@
+"""catalog keyset indexes
+
+Revision ID: 40de0a70e925
+Revises: a4eb46a35813
+Create Date: 2026-10-18 15:38:13.006821
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '40de0a70e925'
+down_revision = 'a4eb46a35813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_product_created_at_id', 'product', ['created_at', 'id'], unique=False)
+    op.create_index('ix_product_price_id', 'product', ['price', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_price_id', table_name='product')
+    op.drop_index('ix_product_created_at_id', table_name='product')
@@ -0,0 +1,34 @@
+"""product neighbors
+
+Revision ID: 5d3a9c1e7b24
+Revises: c4b165ee08b9
+Create Date: 2026-10-18 17:05:12.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d3a9c1e7b24'
+down_revision = 'c4b165ee08b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_neighbor',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['product.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'rank'),
+    sqlite_with_rowid=False
+    )
+    # Filled by `python recommendations.py build`.
+
+
+def downgrade():
+    op.drop_table('product_neighbor')
@@ -0,0 +1,32 @@
+"""product sku
+
+Revision ID: 8e4f2b6a9d13
+Revises: 5d3a9c1e7b24
+Create Date: 2026-10-18 17:31:40.118265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4f2b6a9d13'
+down_revision = '5d3a9c1e7b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('product', sa.Column('sku', sa.String(length=64), nullable=True))
+    # Existing products have no sku; NULLs never conflict in a unique index.
+    op.create_index('ix_product_creator_id_sku', 'product', ['creator_id', 'sku'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_product_creator_id_sku', table_name='product')
+    if op.get_bind().dialect.name == 'sqlite':
+        # Native DROP COLUMN (SQLite 3.35+) keeps the product_fts triggers,
+        # which a batch-mode table rebuild would lose.
+        op.execute('ALTER TABLE product DROP COLUMN sku')
+    else:
+        op.drop_column('product', 'sku')
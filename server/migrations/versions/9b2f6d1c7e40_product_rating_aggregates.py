@@ -0,0 +1,36 @@
+"""product rating aggregates
+
+Revision ID: 9b2f6d1c7e40
+Revises: 40de0a70e925
+Create Date: 2026-10-18 15:52:06.114203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2f6d1c7e40'
+down_revision = '40de0a70e925'
+branch_labels = None
+depends_on = None
+
+COUNT_COLUMNS = ['rating_count', 'rating_sum', 'rating_1_count', 'rating_2_count',
+                 'rating_3_count', 'rating_4_count', 'rating_5_count']
+
+
+def upgrade():
+    for name in COUNT_COLUMNS:
+        op.add_column('product', sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+    op.add_column('product', sa.Column('rating_avg', sa.Float(), server_default='0', nullable=False))
+    op.create_index('ix_product_rating_avg_id', 'product', ['rating_avg', 'id'], unique=False)
+    # Existing reviews are folded in by `python ratings.py reconcile`, which
+    # works in short batches instead of one long migration transaction.
+
+
+def downgrade():
+    op.drop_index('ix_product_rating_avg_id', table_name='product')
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('rating_avg')
+        for name in reversed(COUNT_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,54 @@
+"""add indexes
+
+Revision ID: a4eb46a35813
+Revises: 451218cbb250
+Create Date: 2026-10-18 15:37:40.726611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4eb46a35813'
+down_revision = '451218cbb250'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_product_category'), 'product', ['category'], unique=False)
+    op.create_index(op.f('ix_product_creator_id'), 'product', ['creator_id'], unique=False)
+    op.create_index(op.f('ix_order_item_order_id'), 'order_item', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_item_product_id'), 'order_item', ['product_id'], unique=False)
+    op.create_index(op.f('ix_review_product_id'), 'review', ['product_id'], unique=False)
+    op.create_index(op.f('ix_review_user_id'), 'review', ['user_id'], unique=False)
+    op.create_index(op.f('ix_cart_item_cart_id'), 'cart_item', ['cart_id'], unique=False)
+    op.create_index(op.f('ix_cart_item_product_id'), 'cart_item', ['product_id'], unique=False)
+    op.create_index(op.f('ix_cart_user_id'), 'cart', ['user_id'], unique=False)
+    op.create_index(op.f('ix_address_user_id'), 'address', ['user_id'], unique=False)
+    op.create_index(op.f('ix_payment_order_id'), 'payment', ['order_id'], unique=False)
+    op.create_index(op.f('ix_payment_user_id'), 'payment', ['user_id'], unique=False)
+    op.create_index('ix_order_user_id_created_at', 'order', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_order_status_created_at', 'order', ['status', 'created_at'], unique=False)
+    op.create_index('ix_discount_product_id_start_date_end_date', 'discount', ['product_id', 'start_date', 'end_date'], unique=False)
+    op.create_index('ix_discount_start_date_end_date', 'discount', ['start_date', 'end_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_discount_start_date_end_date', table_name='discount')
+    op.drop_index('ix_discount_product_id_start_date_end_date', table_name='discount')
+    op.drop_index('ix_order_status_created_at', table_name='order')
+    op.drop_index('ix_order_user_id_created_at', table_name='order')
+    op.drop_index(op.f('ix_payment_user_id'), table_name='payment')
+    op.drop_index(op.f('ix_payment_order_id'), table_name='payment')
+    op.drop_index(op.f('ix_address_user_id'), table_name='address')
+    op.drop_index(op.f('ix_cart_user_id'), table_name='cart')
+    op.drop_index(op.f('ix_cart_item_product_id'), table_name='cart_item')
+    op.drop_index(op.f('ix_cart_item_cart_id'), table_name='cart_item')
+    op.drop_index(op.f('ix_review_user_id'), table_name='review')
+    op.drop_index(op.f('ix_review_product_id'), table_name='review')
+    op.drop_index(op.f('ix_order_item_product_id'), table_name='order_item')
+    op.drop_index(op.f('ix_order_item_order_id'), table_name='order_item')
+    op.drop_index(op.f('ix_product_creator_id'), table_name='product')
+    op.drop_index(op.f('ix_product_category'), table_name='product')
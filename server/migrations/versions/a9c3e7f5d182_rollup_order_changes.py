@@ -0,0 +1,29 @@
+"""rollups follow order status changes
+
+Revision ID: a9c3e7f5d182
+Revises: d2f4a8c61b37
+Create Date: 2026-10-18 20:31:05.227840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e7f5d182'
+down_revision = 'd2f4a8c61b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('rollup_watermark', sa.Column('checked_at', sa.DateTime(), nullable=True))
+    # Changes before the upgrade are left to `python rollups.py backfill`.
+    op.execute('UPDATE rollup_watermark SET checked_at = updated_at')
+    op.create_index('ix_order_updated_at', 'order', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_updated_at', table_name='order')
+    with op.batch_alter_table('rollup_watermark', schema=None) as batch_op:
+        batch_op.drop_column('checked_at')
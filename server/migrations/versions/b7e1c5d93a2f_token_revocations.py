@@ -0,0 +1,35 @@
+"""token revocations
+
+Revision ID: b7e1c5d93a2f
+Revises: 8e4f2b6a9d13
+Create Date: 2026-10-18 18:05:12.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1c5d93a2f'
+down_revision = '8e4f2b6a9d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_revocation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revoked_ms', sa.BigInteger(), nullable=False),
+    sa.Column('forget_after', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index(op.f('ix_token_revocation_forget_after'), 'token_revocation',
+                    ['forget_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_token_revocation_forget_after'), table_name='token_revocation')
+    op.drop_table('token_revocation')
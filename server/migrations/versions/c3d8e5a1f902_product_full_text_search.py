@@ -0,0 +1,55 @@
+"""product full-text search
+
+Revision ID: c3d8e5a1f902
+Revises: 9b2f6d1c7e40
+Create Date: 2026-10-18 16:05:41.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e5a1f902'
+down_revision = '9b2f6d1c7e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE VIRTUAL TABLE product_fts USING fts5(
+            name, description,
+            content='product', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER product_fts_ai AFTER INSERT ON product BEGIN
+            INSERT INTO product_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER product_fts_ad AFTER DELETE ON product BEGIN
+            INSERT INTO product_fts(product_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER product_fts_au AFTER UPDATE OF name, description ON product BEGIN
+            INSERT INTO product_fts(product_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO product_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """)
+    # Index the rows that already exist.
+    op.execute("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS product_fts_au')
+    op.execute('DROP TRIGGER IF EXISTS product_fts_ad')
+    op.execute('DROP TRIGGER IF EXISTS product_fts_ai')
+    op.execute('DROP TABLE IF EXISTS product_fts')
@@ -0,0 +1,85 @@
+"""order archive
+
+Revision ID: c4b165ee08b9
+Revises: 0c5e9a7f3b18
+Create Date: 2026-10-18 16:18:50.939125
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4b165ee08b9'
+down_revision = '0c5e9a7f3b18'
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True)]
+
+
+def upgrade():
+    op.create_table('order_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    *_timestamps(),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_archive_created_at', 'order_archive', ['created_at'], unique=False)
+    op.create_index('ix_order_archive_user_id_created_at', 'order_archive', ['user_id', 'created_at'], unique=False)
+    op.create_table('order_item_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    *_timestamps(),
+    sa.ForeignKeyConstraint(['order_id'], ['order_archive.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_order_item_archive_order_id'), 'order_item_archive', ['order_id'], unique=False)
+    op.create_index(op.f('ix_order_item_archive_product_id'), 'order_item_archive', ['product_id'], unique=False)
+    op.create_table('payment_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('payment_method', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    *_timestamps(),
+    sa.ForeignKeyConstraint(['order_id'], ['order_archive.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_payment_archive_order_id'), 'payment_archive', ['order_id'], unique=False)
+    op.create_index(op.f('ix_payment_archive_user_id'), 'payment_archive', ['user_id'], unique=False)
+    # Orders are moved in by `python archive.py`.
+
+
+def downgrade():
+    # Put archived orders back before dropping the archive.
+    op.execute('INSERT INTO "order" (id, user_id, total_amount, status, created_at, updated_at) '
+               'SELECT id, user_id, total_amount, status, created_at, updated_at FROM order_archive')
+    op.execute('INSERT INTO order_item (id, order_id, product_id, quantity, price, created_at, updated_at) '
+               'SELECT id, order_id, product_id, quantity, price, created_at, updated_at '
+               'FROM order_item_archive')
+    op.execute('INSERT INTO payment (id, user_id, order_id, amount, payment_method, status, created_at, updated_at) '
+               'SELECT id, user_id, order_id, amount, payment_method, status, created_at, updated_at '
+               'FROM payment_archive')
+    op.drop_index(op.f('ix_payment_archive_user_id'), table_name='payment_archive')
+    op.drop_index(op.f('ix_payment_archive_order_id'), table_name='payment_archive')
+    op.drop_table('payment_archive')
+    op.drop_index(op.f('ix_order_item_archive_product_id'), table_name='order_item_archive')
+    op.drop_index(op.f('ix_order_item_archive_order_id'), table_name='order_item_archive')
+    op.drop_table('order_item_archive')
+    op.drop_index('ix_order_archive_user_id_created_at', table_name='order_archive')
+    op.drop_index('ix_order_archive_created_at', table_name='order_archive')
+    op.drop_table('order_archive')
@@ -0,0 +1,42 @@
+"""order, order item and payment ids never reused
+
+Revision ID: d2f4a8c61b37
+Revises: b7e1c5d93a2f
+Create Date: 2026-10-18 19:42:37.816204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f4a8c61b37'
+down_revision = 'b7e1c5d93a2f'
+branch_labels = None
+depends_on = None
+
+# Without AUTOINCREMENT SQLite hands out max(id) + 1, which is an archived
+# row's id once the newest order has been moved to the archive.
+TABLES = [('order', 'order_archive'), ('order_item', 'order_item_archive'),
+          ('payment', 'payment_archive')]
+
+
+def upgrade():
+    for table, archive in TABLES:
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}):
+            pass
+        # Start past every id handed out so far, archived ones included.
+        op.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name')
+                   .bindparams(name=table))
+        op.execute(sa.text(
+            f'INSERT INTO sqlite_sequence (name, seq) SELECT :name, max('
+            f'coalesce((SELECT max(id) FROM "{table}"), 0), '
+            f'coalesce((SELECT max(id) FROM {archive}), 0))').bindparams(name=table))
+
+
+def downgrade():
+    for table, _ in reversed(TABLES):
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': False}):
+            pass
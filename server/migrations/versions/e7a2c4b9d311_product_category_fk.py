@@ -0,0 +1,98 @@
+"""product category foreign key and facet counts
+
+Revision ID: e7a2c4b9d311
+Revises: c3d8e5a1f902
+Create Date: 2026-10-18 16:31:12.402857
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c4b9d311'
+down_revision = 'c3d8e5a1f902'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# Recreated on downgrade: SQLite can't DROP a foreign key column, and the
+# batch-mode table rebuild drops the product_fts triggers with the old table.
+FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER product_fts_au AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def upgrade():
+    op.add_column('category', sa.Column('product_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('category', sa.Column('in_stock_count', sa.Integer(), server_default='0', nullable=False))
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # A plain ADD COLUMN with an inline REFERENCES (allowed for a NULL
+        # column), so the product table and its FTS triggers aren't rebuilt.
+        op.execute('ALTER TABLE product ADD COLUMN category_id INTEGER REFERENCES category (id)')
+    else:
+        op.add_column('product', sa.Column('category_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_product_category_id', 'product', 'category',
+                              ['category_id'], ['id'])
+    op.create_index(op.f('ix_product_category_id'), 'product', ['category_id'], unique=False)
+
+    now = datetime.utcnow()
+    bind.execute(sa.text(
+        'INSERT INTO category (name, created_at, updated_at) '
+        'SELECT DISTINCT category, :now, :now FROM product '
+        'WHERE category IS NOT NULL AND category NOT IN (SELECT name FROM category)'),
+        {'now': now})
+    # Backfill one id range at a time so no single statement touches the
+    # whole table.
+    max_id = bind.execute(sa.text('SELECT coalesce(max(id), 0) FROM product')).scalar()
+    for low in range(1, max_id + 1, BATCH_SIZE):
+        bind.execute(sa.text(
+            'UPDATE product SET category_id = '
+            '(SELECT id FROM category WHERE category.name = product.category) '
+            'WHERE id BETWEEN :low AND :high AND category IS NOT NULL'),
+            {'low': low, 'high': low + BATCH_SIZE - 1})
+    bind.execute(sa.text(
+        'UPDATE category SET '
+        'product_count = (SELECT count(*) FROM product WHERE category_id = category.id), '
+        'in_stock_count = (SELECT count(*) FROM product '
+        'WHERE category_id = category.id AND stock > 0)'))
+
+
+def downgrade():
+    op.drop_index(op.f('ix_product_category_id'), table_name='product')
+    if op.get_bind().dialect.name == 'sqlite':
+        for name in ('product_fts_au', 'product_fts_ad', 'product_fts_ai'):
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        with op.batch_alter_table('product', schema=None) as batch_op:
+            batch_op.drop_column('category_id')
+        for ddl in FTS_TRIGGERS:
+            op.execute(ddl)
+    else:
+        op.drop_constraint('fk_product_category_id', 'product', type_='foreignkey')
+        op.drop_column('product', 'category_id')
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_column('in_stock_count')
+        batch_op.drop_column('product_count')
@@ -0,0 +1,63 @@
+"""daily sales rollups
+
+Revision ID: f1b6d8a2c574
+Revises: e7a2c4b9d311
+Create Date: 2026-10-18 16:58:20.914377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d8a2c574'
+down_revision = 'e7a2c4b9d311'
+branch_labels = None
+depends_on = None
+
+
+def _measures():
+    return [sa.Column('units', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('orders', sa.Integer(), nullable=False)]
+
+
+def upgrade():
+    op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    *_measures(),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('daily_product_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    *_measures(),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    op.create_index(op.f('ix_daily_product_sales_product_id'), 'daily_product_sales', ['product_id'], unique=False)
+    op.create_table('daily_category_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    *_measures(),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    op.create_index(op.f('ix_daily_category_sales_category_id'), 'daily_category_sales', ['category_id'], unique=False)
+    op.create_table('rollup_watermark',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_order_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index('ix_order_created_at', 'order', ['created_at'], unique=False)
+    # Existing orders are rolled up by `python rollups.py backfill`.
+
+
+def downgrade():
+    op.drop_index('ix_order_created_at', table_name='order')
+    op.drop_table('rollup_watermark')
+    op.drop_index(op.f('ix_daily_category_sales_category_id'), table_name='daily_category_sales')
+    op.drop_table('daily_category_sales')
+    op.drop_index(op.f('ix_daily_product_sales_product_id'), table_name='daily_product_sales')
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
@@ -1,15 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy_serializer import SerializerMixin
+from sqlalchemy import event, inspect
 from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
 from flask_bcrypt import Bcrypt
+import hashing
  
 db = SQLAlchemy()
 bcrypt = Bcrypt()
  
  
 class User(db.Model, SerializerMixin):
-    # serialize_rules = ("-_password_hash",)  # Exclude password_hash from serialization
+    serialize_rules = ("-_password_hash",)  # Exclude password_hash from serialization
  
     id = db.Column(db.Integer, primary_key=True)
     firstname = db.Column(db.String, nullable=False)
@@ -36,30 +38,76 @@ class User(db.Model, SerializerMixin):
  
     @password_hash.setter
     def password_hash(self, password):
-        # utf-8 encoding and decoding is required in python 3
-        password_hash = bcrypt.generate_password_hash(
-            password.encode('utf-8'))
-        self._password_hash = password_hash.decode('utf-8')
+        # Hashed on the shared bcrypt pool so request threads don't burn CPU.
+        self._password_hash = hashing.pool.hash_password(password)
  
     def authenticate(self, password):
-        return bcrypt.check_password_hash(
-            self._password_hash, password.encode('utf-8'))
+        if not hashing.pool.check_password(self._password_hash, password):
+            return False
+        if hashing.pool.needs_rehash(self._password_hash):
+            # Cost factor changed since this hash was made; upgrade it while
+            # we have the plaintext. The caller's commit persists it.
+            self._password_hash = hashing.pool.hash_password(password)
+        return True
+
+    async def authenticate_async(self, password):
+        if not await hashing.pool.check_password_async(self._password_hash, password):
+            return False
+        if hashing.pool.needs_rehash(self._password_hash):
+            self._password_hash = await hashing.pool.hash_password_async(password)
+        return True
     
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
     price = db.Column(db.Float, nullable=False)
-    category = db.Column(db.String(100), nullable=True)
-    stock = db.Column(db.Integer, default=0)
+    category = db.Column(db.String(100), nullable=True, index=True)
+    # The Category row for `category`; the two are kept in step on flush and
+    # drive Category.product_count / in_stock_count (see below).
+    category_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True, index=True),
+        active_history=True)
+    stock = db.column_property(db.Column(db.Integer, default=0), active_history=True)
     image_url = db.Column(db.String, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     cart_items = db.relationship('CartItem', backref='product', lazy=True)
     reviews = db.relationship('Review', backref='product', lazy=True)
-    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # The merchant's own product code; bulk imports (product_import.py) upsert
+    # on (creator_id, sku).  Products added one at a time may leave it empty.
+    sku = db.Column(db.String(64), nullable=True)
     discounts = db.relationship('Discount', backref='product', lazy=True)
+    # Review aggregates, kept in step with Review by the mapper events below.
+    # `python ratings.py reconcile` rebuilds them from the review table.
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        # Keyset pagination keys for the catalog (see catalog.py).
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_rating_avg_id', 'rating_avg', 'id'),
+        db.Index('ix_product_creator_id_sku', 'creator_id', 'sku', unique=True),
+    )
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in RATINGS}
+
+    @property
+    def effective_price(self):
+        # The price with its best active discount; pricing imports this module.
+        from pricing import prices
+        return prices.price(self.id)
  
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -70,49 +118,120 @@ class Order(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
     payment = db.relationship('Payment', backref='order', uselist=False, lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_order_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_order_status_created_at', 'status', 'created_at'),
+        # Date-range scans: rollup backfill and reporting (rollups.py).
+        db.Index('ix_order_created_at', 'created_at'),
+        # Orders changed since the last rollup run (rollups.py).
+        db.Index('ix_order_updated_at', 'updated_at'),
+        # archive.py moves old orders out; a reused id would collide with the
+        # archived row and slip under the rollup watermark (rollups.py).
+        {'sqlite_autoincrement': True},
+    )
+
+    # ArchivedOrder says True; archive.order_history() returns both kinds.
+    archived = False
  
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Ids are never reused once archived (see Order).
+    __table_args__ = {'sqlite_autoincrement': True}
  
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
+    # Facet counts, maintained by the Product mapper events below and by
+    # checkout; `python categories.py reconcile` rebuilds them.
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    in_stock_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
  
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     cart_items = db.relationship('CartItem', backref='cart', lazy=True)
  
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Upsert target for the write-behind cart store (cart_store.py).
+        db.Index('ix_cart_item_cart_id_product_id', 'cart_id', 'product_id', unique=True),
+    )
  
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    rating = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # active_history so the old values are loaded before a change; the rating
+    # aggregate events need them to back the old rating out of Product.
+    product_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True),
+        active_history=True)
+    rating = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
  
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def _apply_rating(connection, product_id, rating, sign):
+    c = Product.__table__.c
+    values = {
+        'rating_count': c.rating_count + sign,
+        'rating_sum': c.rating_sum + sign * rating,
+        'rating_avg': db.func.coalesce(
+            (c.rating_sum + sign * rating) * 1.0 / db.func.nullif(c.rating_count + sign, 0), 0),
+    }
+    if rating in RATINGS:
+        column = f'rating_{rating}_count'
+        values[column] = c[column] + sign
+    connection.execute(Product.__table__.update().where(c.id == product_id).values(**values))
+
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, target):
+    _apply_rating(connection, target.product_id, target.rating, 1)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, target):
+    state = inspect(target)
+    rating = state.attrs.rating.history
+    product = state.attrs.product_id.history
+    if not (rating.has_changes() or product.has_changes()):
+        return
+    old_rating = rating.deleted[0] if rating.deleted else target.rating
+    old_product = product.deleted[0] if product.deleted else target.product_id
+    _apply_rating(connection, old_product, old_rating, -1)
+    _apply_rating(connection, target.product_id, target.rating, 1)
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, target):
+    _apply_rating(connection, target.product_id, target.rating, -1)
+
+ 
 class Address(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     street = db.Column(db.String(200), nullable=False)
     city = db.Column(db.String(100), nullable=False)
     state = db.Column(db.String(100), nullable=False)
@@ -123,13 +242,16 @@ class Address(db.Model):
  
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     amount = db.Column(db.Float, nullable=False)
     payment_method = db.Column(db.String(100), nullable=False)
     status = db.Column(db.String(50), default='Pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Ids are never reused once archived (see Order).
+    __table_args__ = {'sqlite_autoincrement': True}
  
 class Discount(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -138,4 +260,180 @@ class Discount(db.Model):
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_discount_product_id_start_date_end_date', 'product_id', 'start_date', 'end_date'),
+        db.Index('ix_discount_start_date_end_date', 'start_date', 'end_date'),
+    )
+
+
+# Orders moved out of the live tables by archive.py: same columns and ids,
+# plus when they were moved.
+class ArchivedOrder(db.Model):
+    __tablename__ = 'order_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    order_items = db.relationship('ArchivedOrderItem', backref='order', lazy=True)
+    payment = db.relationship('ArchivedPayment', backref='order', uselist=False, lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_order_archive_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_order_archive_created_at', 'created_at'),
+    )
+
+    archived = True
+
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'order_item_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+
+class ArchivedPayment(db.Model):
+    __tablename__ = 'payment_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order_archive.id'), nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    payment_method = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+
+# Sales rollups, filled incrementally from Order/OrderItem by rollups.py.
+class DailySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyProductSales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyCategorySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    # 0 for products without a category, so the key is never NULL.
+    category_id = db.Column(db.Integer, primary_key=True, index=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RollupWatermark(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Orders up to last_order_id updated after this haven't been refolded.
+    checked_at = db.Column(db.DateTime)
+
+
+# "Customers also bought" (recommendations.py): each product's top co-purchased
+# products, rank 1 first.  Rebuilt by a job; the product page reads one range.
+class ProductNeighbor(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+
+# Session token revocations (tokens.py), shared by every process.  Rows are
+# only appended, so each process catches up by reading past the last id it
+# saw; they are pruned once no token they could affect is still valid.
+class TokenRevocation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    revoked_ms = db.Column(db.BigInteger, nullable=False)
+    forget_after = db.Column(db.Float, nullable=False, index=True)
+
+    # Ids must never be reused after a prune, or a process could skip a row.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+def apply_category_counts(connection, category_id, products=0, in_stock=0):
+    if category_id is None or not (products or in_stock):
+        return
+    c = Category.__table__.c
+    connection.execute(Category.__table__.update().where(c.id == category_id).values(
+        product_count=c.product_count + products,
+        in_stock_count=c.in_stock_count + in_stock))
+
+
+def _category_id_for(connection, name):
+    c = Category.__table__.c
+    category_id = connection.execute(
+        db.select(c.id).where(c.name == name)).scalar()
+    if category_id is None:
+        now = datetime.utcnow()
+        category_id = connection.execute(
+            Category.__table__.insert().values(name=name, created_at=now, updated_at=now)
+            .returning(c.id)).scalar_one()
+    return category_id
+
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def _sync_category(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.category_id.history.has_changes():
+        if target.category_id is None:
+            target.category = None
+        else:
+            target.category = connection.execute(
+                db.select(Category.__table__.c.name)
+                .where(Category.__table__.c.id == target.category_id)).scalar()
+    elif state.attrs.category.history.has_changes() or (
+            target.category_id is None and target.category is not None):
+        target.category_id = (_category_id_for(connection, target.category)
+                              if target.category is not None else None)
+
+
+def _in_stock(stock):
+    return 1 if (stock or 0) > 0 else 0
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    apply_category_counts(connection, target.category_id, 1, _in_stock(target.stock))
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    category = state.attrs.category_id.history
+    stock = state.attrs.stock.history
+    if not (category.has_changes() or stock.has_changes()):
+        return
+    old_category = category.deleted[0] if category.deleted else target.category_id
+    old_stock = stock.deleted[0] if stock.deleted else target.stock
+    if old_category == target.category_id:
+        apply_category_counts(connection, old_category,
+                              in_stock=_in_stock(target.stock) - _in_stock(old_stock))
+    else:
+        apply_category_counts(connection, old_category, -1, -_in_stock(old_stock))
+        apply_category_counts(connection, target.category_id, 1, _in_stock(target.stock))
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    apply_category_counts(connection, target.category_id, -1, -_in_stock(target.stock))
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Pre-fork warm-up and post-fork cleanup for multi-process servers.
+
+Before forking, warm_up() does the one-off work every worker would otherwise
+repeat: configuring mappers, compiling serializer plans and the hot SQL
+statements into the engine's compiled cache.  It then closes all database
+connections and freezes the GC so the warmed objects stay in shared,
+copy-on-write pages instead of being touched by each worker's collector.
+
+After fork, every worker must drop the connections and threads it inherited:
+pooled SQLite handles can't be shared across processes, and threads (the
+bcrypt pool, the SQLite writer) don't survive fork at all.  install() hooks
+after_fork() into os.register_at_fork so this works under any pre-fork server.
+"""
+import gc
+import os
+
+from sqlalchemy.orm import configure_mappers
+
+import hashing
+from models import db
+
+
+def _engines(app):
+    with app.app_context():
+        return list(db.engines.values())
+
+
+def warm_up(app):
+    import catalog
+    import serializers
+
+    configure_mappers()
+    for model, views in serializers.VIEWS.items():
+        for view in views:
+            serializers.compile_view(model, view)
+    with app.app_context():
+        # Run the hot queries once so their compiled SQL is cached on the engine.
+        try:
+            catalog.list_products(limit=1)
+            catalog.get_product(1)
+        except Exception:
+            app.logger.warning('catalog warm-up skipped', exc_info=True)
+        db.session.remove()
+    for engine in _engines(app):
+        engine.dispose()
+    profile = app.extensions.get('sqlite_profile')
+    if profile is not None:
+        profile.read_engine.dispose()
+        profile.write_engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork(app):
+    """Reset per-process state in a freshly forked worker."""
+    for engine in _engines(app):
+        # close=False: leave the parent's connections alone, just forget them.
+        engine.dispose(close=False)
+    profile = app.extensions.get('sqlite_profile')
+    if profile is not None:
+        profile.after_fork()
+    hashing.pool.after_fork()
+
+
+def install(app):
+    os.register_at_fork(after_in_child=lambda: after_fork(app))
@@ -0,0 +1,292 @@
+"""Effective product prices with discounts applied.
+
+PriceEngine loads product prices and every active or upcoming Discount once
+and turns each product's discount windows into a piecewise-constant timeline
+(boundaries + best percentage per segment).  A price at any moment is a bisect
+over that product's boundaries, and the current price of every discounted
+product is cached until the next boundary anywhere in the catalog.
+
+A discount is in effect from start_date up to, not including, end_date;
+catalog.py loads "active" discounts by the same rule.  Product views show
+prices.price() as effective_price and checkout charges it.
+
+When a session commits changes to Discount rows or Product prices, only the
+products involved are reloaded on the next lookup (all of them after a bulk
+session.execute() on either table).  Commits in other
+processes aren't seen, so the whole index is also reloaded every `max_age`
+seconds (PRICE_ENGINE_MAX_AGE).  Lookups are dict reads; reloads are short
+queries on the engine's own connection, so no app context is needed.  The
+asyncio app checks fresh() and runs refresh() in a worker thread, so no
+reload happens on the event loop.
+
+    from pricing import prices
+    prices.init_app(app)
+    prices.price(product_id)
+    prices.prices([1, 2, 3])
+    ids, effective = catalog_prices()       # NumPy arrays, whole catalog
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Product, Discount
+
+
+def _timeline(windows):
+    """[(start, end, pct)] -> (boundaries, pct in effect from each boundary).
+
+    Overlapping discounts don't stack; the best one wins.
+    """
+    points = sorted({t for start, end, _ in windows for t in (start, end)})
+    percentages = []
+    for point in points:
+        active = [pct for start, end, pct in windows if start <= point < end]
+        percentages.append(max(active, default=0.0))
+    return points, percentages
+
+
+def _pct_at(timeline, when):
+    points, percentages = timeline
+    i = bisect_right(points, when) - 1
+    return percentages[i] if i >= 0 else 0.0
+
+
+def apply_discount(price, pct):
+    # Rounded the same way as np.round so catalog_prices() agrees to the cent.
+    return round(price * (1 - pct / 100.0) * 100) / 100
+
+
+def _windows(connection, now, product_ids=None):
+    """{product_id: [(start, end, pct)]} of the discounts ending after now."""
+    stmt = (select(Discount.product_id, Discount.start_date, Discount.end_date,
+                   Discount.discount_percentage)
+            .where(Discount.end_date > now))
+    if product_ids is not None:
+        stmt = stmt.where(Discount.product_id.in_(product_ids))
+    windows = {}
+    for product_id, start, end, pct in connection.execute(stmt):
+        windows.setdefault(product_id, []).append((start, end, pct))
+    return windows
+
+
+class PriceEngine:
+    def __init__(self, engine=None, max_age=60.0):
+        self.engine = engine
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stale = True
+        self._dirty = set()  # product ids to reload
+        self._base = {}
+        self._timelines = {}
+        self._current = {}
+        self._valid_until = None
+        # Windows that ended before this aren't indexed.
+        self._indexed_from = None
+        self._expires = 0.0
+
+    def init_app(self, app):
+        self.max_age = app.config.get('PRICE_ENGINE_MAX_AGE', self.max_age)
+        with app.app_context():
+            self.bind(db.engine)
+
+    def bind(self, engine):
+        """Price from `engine`'s database; everything reloads on the next lookup."""
+        self.engine = engine
+        self.invalidate()
+
+    def _connect(self):
+        return (self.engine or db.engine).connect()
+
+    def invalidate(self, product_ids=None):
+        """Reload everything on the next lookup, or only these products."""
+        if product_ids is None:
+            self._stale = True
+            return
+        with self._lock:
+            self._dirty.update(product_ids)
+
+    def _load(self, now):
+        # Cleared first, so an invalidate() during the load isn't lost.
+        self._stale = False
+        self._dirty.clear()
+        with self._connect() as connection:
+            base = dict(connection.execute(select(Product.id, Product.price)).all())
+            windows = _windows(connection, now)
+        self._base = base
+        self._timelines = {pid: _timeline(w) for pid, w in windows.items()}
+        self._indexed_from = now
+        self._expires = time.monotonic() + self.max_age if self.max_age else float('inf')
+
+    def _reload(self, product_ids, now):
+        ids = list(product_ids)
+        with self._connect() as connection:
+            base = dict(connection.execute(
+                select(Product.id, Product.price).where(Product.id.in_(ids))).all())
+            windows = _windows(connection, now, ids)
+        for pid in ids:
+            if pid in base:
+                self._base[pid] = base[pid]
+            else:
+                self._base.pop(pid, None)
+            if pid in windows:
+                self._timelines[pid] = _timeline(windows[pid])
+            else:
+                self._timelines.pop(pid, None)
+        self._indexed_from = now
+
+    def _snapshot(self, now):
+        # Current prices are only valid until the next boundary anywhere.
+        current = {}
+        next_boundary = None
+        for pid, timeline in self._timelines.items():
+            pct = _pct_at(timeline, now)
+            if pct:
+                current[pid] = apply_discount(self._base.get(pid, 0.0), pct)
+            points = timeline[0]
+            i = bisect_right(points, now)
+            if i < len(points) and (next_boundary is None or points[i] < next_boundary):
+                next_boundary = points[i]
+        self._current = current
+        self._valid_until = next_boundary
+
+    def _ensure(self, now):
+        if (not self._stale and not self._dirty and time.monotonic() < self._expires
+                and (self._valid_until is None or now < self._valid_until)):
+            return
+        with self._lock:
+            if self._stale or time.monotonic() >= self._expires:
+                self._load(now)
+                self._snapshot(now)
+            elif self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                self._reload(dirty, now)
+                self._snapshot(now)
+            elif self._valid_until is not None and now >= self._valid_until:
+                self._snapshot(now)
+
+    def fresh(self, margin=1.0):
+        """True if current-price lookups won't query for `margin` seconds.
+
+        Crossing a discount boundary only re-snapshots what is in memory.
+        """
+        return (not self._stale and not self._dirty
+                and time.monotonic() + margin < self._expires)
+
+    def refresh(self):
+        """Do now whatever loading the next lookup would."""
+        self._ensure(datetime.utcnow())
+
+    def percentage(self, product_id, when=None):
+        """Best discount percentage in effect for the product; 0.0 if none."""
+        now = datetime.utcnow()
+        self._ensure(now)
+        when = when or now
+        if when < self._indexed_from:
+            # Before the index's horizon: ask the database.
+            with self._connect() as connection:
+                return connection.execute(
+                    select(func.max(Discount.discount_percentage))
+                    .where(Discount.product_id == product_id, Discount.start_date <= when,
+                           Discount.end_date > when)).scalar() or 0.0
+        timeline = self._timelines.get(product_id)
+        return _pct_at(timeline, when) if timeline else 0.0
+
+    def price(self, product_id, when=None):
+        """Effective price of one product; None if it doesn't exist.
+
+        For a `when` in the past the discounts then in effect apply to the
+        current base price.
+        """
+        self._ensure(datetime.utcnow())
+        base = self._base.get(product_id)
+        if base is None:
+            return None
+        if when is None:
+            return self._current.get(product_id, base)
+        pct = self.percentage(product_id, when)
+        return apply_discount(base, pct) if pct else base
+
+    def prices(self, product_ids, when=None):
+        return {pid: self.price(pid, when) for pid in product_ids}
+
+    @property
+    def valid_until(self):
+        return self._valid_until
+
+
+def catalog_prices(session=None, when=None):
+    """Effective price of every product, computed in bulk with NumPy.
+
+    Returns (ids, prices) arrays ordered by product id.  Meant for exports and
+    feeds, where building per-product timelines would be wasted work.
+    """
+    import numpy as np
+
+    session = session or db.session
+    when = when or datetime.utcnow()
+    rows = session.execute(select(Product.id, Product.price).order_by(Product.id)).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    base = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+
+    active = session.execute(
+        select(Discount.product_id, Discount.discount_percentage)
+        .where(Discount.start_date <= when, Discount.end_date > when)).all()
+    pct = np.zeros(len(ids), dtype=np.float64)
+    if active:
+        d_ids = np.array([r[0] for r in active], dtype=np.int64)
+        d_pct = np.array([r[1] for r in active], dtype=np.float64)
+        pos = np.searchsorted(ids, d_ids)
+        known = (pos < len(ids)) & (ids[np.minimum(pos, len(ids) - 1)] == d_ids)
+        np.maximum.at(pct, pos[known], d_pct[known])
+    return ids, np.round(base * (1 - pct / 100.0), 2)
+
+
+prices = PriceEngine()
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_price_changes(session, flush_context):
+    changed = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Discount):
+            # A discount moved to another product changes both.
+            changed.add(obj.product_id)
+            changed.update(inspect(obj).attrs.product_id.history.deleted)
+        elif isinstance(obj, Product) and (
+                obj in session.new or obj in session.deleted
+                or inspect(obj).attrs.price.history.has_changes()):
+            changed.add(obj.id)
+    changed.discard(None)
+    if changed:
+        session.info.setdefault('pricing_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_bulk_price_changes(orm_execute_state):
+    # session.execute(insert/update/delete(...)) never reaches the flush, and
+    # which rows it touched isn't known: reload everything.
+    state = orm_execute_state
+    if ((state.is_insert or state.is_update or state.is_delete)
+            and any(mapper.class_ in (Product, Discount) for mapper in state.all_mappers)):
+        state.session.info['pricing_reload'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_prices(session):
+    changed = session.info.pop('pricing_changed', None)
+    if session.info.pop('pricing_reload', False):
+        prices.invalidate()
+    elif changed:
+        prices.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_price_changes(session):
+    session.info.pop('pricing_changed', None)
+    session.info.pop('pricing_reload', None)
@@ -0,0 +1,298 @@
+"""Streaming bulk product import from CSV or NDJSON.
+
+Rows are read and validated one at a time and collected into batches, so
+memory stays flat for any file size.  Each batch is one transaction:
+
+* creators (the importing merchant, or a `creator` username column) and
+  category names are resolved with one query each, and missing categories
+  are created;
+* the existing products with the batch's (creator_id, sku) keys are read,
+  to count inserts and updates and to adjust the Category facet counts,
+  which the Product mapper events don't see for Core writes;
+* every row is written by one executemany INSERT ... ON CONFLICT (creator_id,
+  sku) DO UPDATE, with the search index's per-row triggers lifted: the new
+  rows and the rows whose text changed are reindexed with one statement
+  (search.bulk_indexing), which is several times cheaper.
+
+A bad row (missing sku or name, unparsable price or stock, unknown
+creator) becomes a RowError in that batch's report, and the rest of the
+file carries on.  Within a batch the last row for a sku wins.  Batches that
+have already been committed stay committed.  The response cache and price
+engine are told about the changes.
+
+    for report in import_products(db.engine, open('catalog.csv'), owner_id, 'csv'):
+        print(report.batch, report.inserted, report.updated, report.errors)
+
+    python product_import.py catalog.ndjson --owner user42 --errors errors.ndjson
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+import search
+from models import db, apply_category_counts, Category, Product, User
+from pricing import prices
+from response_cache import cache
+
+FORMATS = ('csv', 'ndjson')
+FIELDS = ('sku', 'name', 'description', 'price', 'category', 'stock', 'image_url', 'creator')
+UPDATED_COLUMNS = ('name', 'description', 'price', 'category', 'category_id', 'stock',
+                   'image_url', 'updated_at')
+MAX_LENGTHS = {'sku': 64, 'name': 200, 'category': 100}
+
+RowError = namedtuple('RowError', ['line', 'sku', 'message'])
+BatchReport = namedtuple('BatchReport', ['batch', 'rows', 'inserted', 'updated', 'errors',
+                                         'seconds'])
+
+
+def read_csv(stream):
+    """Yield (line number, record or error message) from a CSV with a header row."""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None or not {'sku', 'name', 'price'} <= set(reader.fieldnames):
+        raise ValueError('CSV header must include sku, name and price')
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_ndjson(stream):
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, f'invalid JSON: {e}'
+            continue
+        yield line, record if isinstance(record, dict) else 'expected a JSON object'
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def _text(value):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    return value.strip() or None
+
+
+def validate(record):
+    """(row dict, None) for a good record, (None, message) for a bad one."""
+    get = record.get
+    row = {field: _text(get(field)) for field in FIELDS}
+    if row['sku'] is None:
+        return None, 'sku is required'
+    if row['name'] is None:
+        return None, 'name is required'
+    for field, limit in MAX_LENGTHS.items():
+        if row[field] is not None and len(row[field]) > limit:
+            return None, f'{field} is longer than {limit} characters'
+    try:
+        row['price'] = float(row['price'])
+    except (TypeError, ValueError):
+        return None, f"price {record.get('price')!r} is not a number"
+    if not 0 <= row['price'] < float('inf'):
+        return None, 'price must be a non-negative number'
+    try:
+        row['stock'] = int(row['stock']) if row['stock'] is not None else 0
+    except ValueError:
+        return None, f"stock {record.get('stock')!r} is not a whole number"
+    if row['stock'] < 0:
+        return None, 'stock must not be negative'
+    return row, None
+
+
+def _creators(connection, usernames):
+    """username -> id for the merchants (is_owner) among `usernames`."""
+    if not usernames:
+        return {}
+    return dict(connection.execute(
+        select(User.username, User.id)
+        .where(User.username.in_(usernames), User.is_owner.is_(True))).all())
+
+
+def _categories(connection, names, now):
+    """name -> id, creating the categories that don't exist yet."""
+    if not names:
+        return {}
+    connection.execute(
+        sqlite_insert(Category).on_conflict_do_nothing(index_elements=['name']),
+        [{'name': name, 'created_at': now, 'updated_at': now} for name in names])
+    return dict(connection.execute(
+        select(Category.name, Category.id).where(Category.name.in_(names))).all())
+
+
+# Written with a plain DB-API executemany: at this volume SQLAlchemy's
+# per-row parameter processing costs more than SQLite's own insert.  Columns
+# not listed here (the rating aggregates) take their server defaults.
+INSERT_COLUMNS = ('creator_id', 'sku', 'name', 'description', 'price', 'category',
+                  'category_id', 'stock', 'image_url', 'created_at', 'updated_at')
+UPSERT_SQL = (
+    f"INSERT INTO product ({', '.join(INSERT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(INSERT_COLUMNS))}) "
+    f"ON CONFLICT (creator_id, sku) DO UPDATE SET "
+    f"{', '.join(f'{name} = excluded.{name}' for name in UPDATED_COLUMNS)} "
+    # An unchanged row is left alone, updated_at included.
+    f"WHERE {' OR '.join(f'{name} IS NOT excluded.{name}' for name in UPDATED_COLUMNS[:-1])}")
+
+
+def _by_creator(connection, columns, keys):
+    """Rows of `columns` for the products with these (creator_id, sku) keys."""
+    p = Product.__table__.c
+    skus = {}
+    for creator_id, sku in keys:
+        skus.setdefault(creator_id, []).append(sku)
+    for creator_id, batch in skus.items():
+        yield from connection.execute(
+            select(*columns).where(p.creator_id == creator_id, p.sku.in_(batch)))
+
+
+def write_batch(connection, rows, owner_id, errors, now=None):
+    """Upsert one batch of validated (line, row) pairs; returns (inserted, updated)."""
+    now = now or datetime.utcnow()
+    creators = _creators(connection, {row['creator'] for _, row in rows if row['creator']})
+    by_key = {}
+    for line, row in rows:
+        creator_id = owner_id
+        if row['creator']:
+            creator_id = creators.get(row['creator'])
+            if creator_id is None:
+                errors.append(RowError(line, row['sku'],
+                                       f"creator {row['creator']!r} is not a merchant"))
+                continue
+        by_key[(creator_id, row['sku'])] = row
+    if not by_key:
+        return 0, 0
+
+    categories = _categories(connection, {row['category'] for row in by_key.values()
+                                          if row['category']}, now)
+    p = Product.__table__.c
+    existing = {(creator_id, sku): rest for creator_id, sku, *rest in _by_creator(
+        connection, [p.creator_id, p.sku, p.id, p.name, p.description, p.category_id, p.stock],
+        by_key)}
+
+    products, in_stock = Counter(), Counter()
+    values, retext = [], []
+    timestamp = now.strftime('%Y-%m-%d %H:%M:%S.%f')  # as SQLAlchemy's DateTime stores it
+    for key, row in by_key.items():
+        category_id = categories.get(row['category'])
+        old = existing.get(key)
+        if old is not None:
+            product_id, name, description, old_category_id, old_stock = old
+            products[old_category_id] -= 1
+            in_stock[old_category_id] -= (old_stock or 0) > 0
+            if (name, description) != (row['name'], row['description']):
+                retext.append((product_id, name, description))
+        products[category_id] += 1
+        in_stock[category_id] += row['stock'] > 0
+        values.append((key[0], key[1], row['name'], row['description'], row['price'],
+                       row['category'], category_id, row['stock'], row['image_url'],
+                       timestamp, timestamp))
+
+    # The caller holds the write lock from BEGIN (database.write_transaction),
+    # so the new rows are exactly those above the current max id.
+    last_id = connection.execute(select(func.coalesce(func.max(p.id), 0))).scalar()
+    with search.bulk_indexing(connection):
+        search.unindex(connection, retext)
+        connection.exec_driver_sql(UPSERT_SQL, values)
+        search.reindex(connection, [product_id for product_id, _, _ in retext], after_id=last_id)
+    for category_id in products.keys() | in_stock.keys():
+        apply_category_counts(connection, category_id, products[category_id],
+                              in_stock[category_id])
+    return len(values) - len(existing), len(existing)
+
+
+def import_products(engine, stream, owner_id, fmt='csv', batch_size=5_000):
+    """Import products from a text stream, yielding a BatchReport per batch.
+
+    Rows without a `creator` column belong to owner_id.
+    """
+    if fmt not in READERS:
+        raise ValueError(f'unknown format {fmt!r}; expected one of {FORMATS}')
+    batch, rows, errors = 0, [], []
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal batch, rows, errors, started
+        batch += 1
+        count = len(rows) + len(errors)
+        inserted = updated = 0
+        if rows:
+            with database.write_transaction(engine) as connection:
+                inserted, updated = write_batch(connection, rows, owner_id, errors)
+        report = BatchReport(batch, count, inserted, updated, errors,
+                             time.perf_counter() - started)
+        rows, errors, started = [], [], time.perf_counter()
+        return report
+
+    for line, record in READERS[fmt](stream):
+        if isinstance(record, str):
+            errors.append(RowError(line, None, record))
+        else:
+            row, message = validate(record)
+            if message:
+                errors.append(RowError(line, _text(record.get('sku')), message))
+            else:
+                rows.append((line, row))
+        if len(rows) + len(errors) >= batch_size:
+            yield flush()
+            _changed()
+    if rows or errors:
+        yield flush()
+        _changed()
+
+
+def _changed():
+    # Core writes skip the session hooks that normally do this.
+    cache.invalidate([('products',), ('categories',)])
+    prices.invalidate()
+
+
+def main():
+    from app import create_app
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Bulk import products from CSV or NDJSON.')
+    parser.add_argument('path', help="input file, or '-' for stdin")
+    parser.add_argument('--owner', required=True, help='username of the importing merchant')
+    parser.add_argument('--format', choices=FORMATS,
+                        help='defaults to the file extension (.csv or .ndjson/.jsonl)')
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--errors', help='write row errors here as NDJSON (default: stderr)')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'ndjson')
+    stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    errors_out = open(args.errors, 'w') if args.errors else sys.stderr
+    totals = Counter()
+    started = time.perf_counter()
+    with app.app_context(), stream:
+        owner_id = db.session.execute(select(User.id).where(
+            User.username == args.owner, User.is_owner.is_(True))).scalar()
+        if owner_id is None:
+            parser.error(f'{args.owner} is not a merchant')
+        for report in import_products(db.engine, stream, owner_id, fmt, args.batch_size):
+            totals.update(rows=report.rows, inserted=report.inserted, updated=report.updated,
+                          errors=len(report.errors))
+            for error in report.errors:
+                errors_out.write(json.dumps(error._asdict()) + '\n')
+            print(f'batch {report.batch}: {report.rows} rows, {report.inserted} inserted, '
+                  f'{report.updated} updated, {len(report.errors)} errors '
+                  f'in {report.seconds * 1000:.0f} ms')
+    elapsed = time.perf_counter() - started
+    print(f"{totals['rows']} rows in {elapsed:.1f}s ({totals['rows'] / elapsed:,.0f} rows/s): "
+          f"{totals['inserted']} inserted, {totals['updated']} updated, "
+          f"{totals['errors']} errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Backfill / reconcile the denormalized rating aggregates on Product.
+
+The ORM keeps Product.rating_* in step with Review through mapper events, but
+Core bulk inserts (seeding, imports) and raw SQL bypass them.  reconcile()
+recomputes the aggregates from the review table one product id range at a
+time, each range in its own short transaction.
+
+    python ratings.py reconcile [--batch-size 5000] [--check]
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, case, func, select
+
+import database
+from models import Product, Review, RATINGS
+
+AGGREGATE_COLUMNS = ['rating_count', 'rating_sum', 'rating_avg'] + \
+    [f'rating_{star}_count' for star in RATINGS]
+
+
+def _aggregates(connection, low, high):
+    r = Review.__table__.c
+    columns = [
+        r.product_id,
+        func.count(),
+        func.coalesce(func.sum(r.rating), 0),
+    ] + [func.sum(case((r.rating == star, 1), else_=0)) for star in RATINGS]
+    stmt = (select(*columns)
+            .where(r.product_id.between(low, high))
+            .group_by(r.product_id))
+    result = {}
+    for product_id, count, total, *histogram in connection.execute(stmt):
+        row = {'rating_count': count, 'rating_sum': total,
+               'rating_avg': total / count if count else 0}
+        row.update({f'rating_{star}_count': n for star, n in zip(RATINGS, histogram)})
+        result[product_id] = row
+    return result
+
+
+def _current(connection, low, high):
+    p = Product.__table__.c
+    stmt = select(p.id, *(p[name] for name in AGGREGATE_COLUMNS)).where(p.id.between(low, high))
+    return {row[0]: dict(zip(AGGREGATE_COLUMNS, row[1:])) for row in connection.execute(stmt)}
+
+
+def _drifted(current, expected):
+    return any(abs((current[name] or 0) - expected[name]) > 1e-9 for name in AGGREGATE_COLUMNS)
+
+
+def reconcile(engine, batch_size=5000, check=False):
+    """Fix (or with check=True only count) products whose aggregates drifted.
+
+    Returns the number of products that were out of step.
+    """
+    p = Product.__table__
+    zero = dict.fromkeys(AGGREGATE_COLUMNS, 0)
+    with engine.connect() as connection:
+        max_id = connection.execute(select(func.coalesce(func.max(p.c.id), 0))).scalar()
+
+    drifted = 0
+    for low in range(1, max_id + 1, batch_size):
+        high = low + batch_size - 1
+        with database.write_transaction(engine) as connection:
+            expected = _aggregates(connection, low, high)
+            updates = []
+            for product_id, current in _current(connection, low, high).items():
+                want = expected.get(product_id, zero)
+                if _drifted(current, want):
+                    row = {'_' + name: value for name, value in want.items()}
+                    row['_id'] = product_id
+                    updates.append(row)
+            drifted += len(updates)
+            if updates and not check:
+                stmt = (p.update()
+                        .where(p.c.id == bindparam('_id'))
+                        .values({name: bindparam('_' + name) for name in AGGREGATE_COLUMNS}))
+                connection.execute(stmt, updates)
+    return drifted
+
+
+def main():
+    from app import create_app
+    app = create_app()
+    from models import db
+
+    parser = argparse.ArgumentParser(description='Rebuild Product rating aggregates.')
+    parser.add_argument('command', choices=['reconcile'])
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--check', action='store_true', help='only report drift')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        drifted = reconcile(db.engine, args.batch_size, args.check)
+        verb = 'out of step' if args.check else 'fixed'
+        print(f'{drifted} products {verb} in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
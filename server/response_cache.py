@@ -0,0 +1,252 @@
+"""Conditional-GET response cache for catalog reads.
+
+Responses are identified by a strong ETag hashed from the (id, updated_at)
+of every row that went into them.  A request whose If-None-Match matches gets
+a bodyless 304 and the serializer never runs; otherwise the rendered JSON body
+is kept in an in-process LRU capped by entry count and total bytes.
+
+Every entry carries tags such as ('product', 7) or ('products',).  After a
+session commits, the tags of the rows it inserted, updated or deleted are
+invalidated, so a cached body is dropped exactly when one of its rows changes.
+Writes that bypass the ORM session (e.g. checkout's Core UPDATE) call
+cache.invalidate() themselves.  Other processes' commits aren't seen, so
+entries also expire after RESPONSE_CACHE_TTL seconds.  Discount windows
+open and close with the clock: responses with effective prices put them in
+their versions and pass `until`, which ends the entry at the next boundary.
+
+    from response_cache import cache
+    return cache.respond(request.full_path, tags, load)
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from flask import Response, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Product, Category, Review, Discount
+
+Entry = namedtuple('Entry', ['etag', 'body', 'tags', 'expires'])
+
+
+def make_etag(versions):
+    """Strong ETag for an iterable of (id, updated_at) tuples."""
+    digest = hashlib.blake2b(digest_size=16)
+    for id, updated_at in versions:
+        digest.update(f'{id}:{updated_at.isoformat() if updated_at else ""};'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _matches(etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip() for tag in header.split(','))
+
+
+class ResponseCache:
+    def __init__(self, max_entries=10_000, max_bytes=64 * 1024 * 1024, ttl=60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'not_modified': self.not_modified,
+            'bytes_saved': self.bytes_saved,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, body, tags, generation=None, until=None):
+        """Store a body unless something was invalidated since `generation`.
+
+        The entry expires after the TTL or at `until` (a UTC datetime),
+        whichever comes first.
+        """
+        if len(body) > self.max_bytes:
+            return
+        ttl = self.ttl
+        if until is not None:
+            ttl = min(ttl, (until - datetime.utcnow()).total_seconds())
+            if ttl <= 0:
+                return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return  # rendered from rows that may since have changed
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = Entry(etag, body, frozenset(tags), time.monotonic() + ttl)
+            self._bytes += len(body)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def respond(self, key, tags, load, until=None):
+        """Serve `key` from cache, or call load() -> (versions, render).
+
+        `versions` are the (id, updated_at) pairs behind the response and
+        render() returns the JSON-able payload; it is only called when the
+        client doesn't already hold the current version.  until(), called
+        after rendering, returns when the body goes stale on its own (a UTC
+        datetime or None).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            if _matches(entry.etag):
+                self.not_modified += 1
+                self.bytes_saved += len(entry.body)
+                return self._not_modified(entry.etag)
+            return self._response(entry.etag, entry.body, 'HIT')
+
+        self.misses += 1
+        generation = self._generation
+        versions, render = load()
+        if versions is None:
+            return Response(json.dumps({'error': 'not found'}), status=404,
+                            mimetype='application/json')
+        etag = make_etag(versions)
+        if _matches(etag):
+            self.not_modified += 1
+            return self._not_modified(etag)
+        body = json.dumps(render(), separators=(',', ':')).encode('utf-8')
+        self.put(key, etag, body, tags, generation, until() if until else None)
+        return self._response(etag, body, 'MISS')
+
+    @staticmethod
+    def _not_modified(etag):
+        response = Response(status=304)
+        response.headers['ETag'] = etag
+        return response
+
+    @staticmethod
+    def _response(etag, body, status):
+        response = Response(body, mimetype='application/json')
+        response.headers['ETag'] = etag
+        response.headers['X-Cache'] = status
+        return response
+
+
+cache = ResponseCache()
+
+
+def _old(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else None
+
+
+def tags_for(obj):
+    """Cache tags a change to obj invalidates."""
+    if isinstance(obj, Product):
+        # Category facet counts move with product inserts, deletes and stock.
+        tags = [('product', obj.id), ('products',), ('categories',),
+                ('category', obj.category_id)]
+        old = _old(obj, 'category_id')
+        if old is not None:
+            tags.append(('category', old))
+        return tags
+    if isinstance(obj, Category):
+        return [('category', obj.id), ('categories',)]
+    if isinstance(obj, Review):
+        # Reviews also change the product's rating aggregates.
+        tags = [('reviews', obj.product_id), ('product', obj.product_id), ('products',)]
+        old = _old(obj, 'product_id')
+        if old is not None:
+            tags += [('reviews', old), ('product', old)]
+        return tags
+    if isinstance(obj, Discount):
+        tags = [('product', obj.product_id), ('products',)]
+        old = _old(obj, 'product_id')
+        if old is not None:
+            tags.append(('product', old))
+        return tags
+    return []
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_changes(session, flush_context):
+    tags = session.info.setdefault('response_cache_tags', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tags.update(tags_for(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    tags = session.info.pop('response_cache_tags', None)
+    if tags:
+        cache.invalidate(tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes(session):
+    session.info.pop('response_cache_tags', None)
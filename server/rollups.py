@@ -0,0 +1,281 @@
+"""Daily sales rollups (per day, day x product, day x category) fed from OrderItem.
+
+run() folds in orders newer than the stored watermark: one chunk of order ids
+at a time, aggregated in SQL and upserted (units/revenue/orders added to any
+existing row), with the watermark advanced in the same transaction.  Each
+chunk reads the watermark under the write lock (database.write_transaction)
+and is either applied together with it or not at all, so re-running after a
+crash or concurrently never counts an order twice.  An order's items are
+assumed fixed once placed; checkout writes an order and its items in one
+transaction.
+
+Only orders in REVENUE_STATUSES count, and checkout places them as Pending.
+So each run() also rebuilds the days of rolled-up orders whose updated_at
+moved since the last check (the ORM's onupdate stamps it; Core writes that
+change a status must set it too).  That is how an order going through, or
+being cancelled, reaches the rollups.
+
+backfill() rebuilds a date range from scratch, a few days per transaction:
+delete those days' rollup rows, then re-aggregate every order up to the
+watermark, live or archived (archive.py only moves orders that are already
+rolled up).  Orders past the watermark are left for run(), so backfill and
+run can be mixed freely.  Before anything has been rolled up, backfill only
+accepts a range covering every order, and rebuilds it and sets the
+watermark in one transaction.
+
+The dashboard queries below read only the rollup tables.
+
+    python rollups.py run
+    python rollups.py backfill --start 2023-01-01 --end 2024-01-01 --chunk-days 7
+    python rollups.py backfill --days 7        # the last week, up to today
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+from models import (db, ArchivedOrder, ArchivedOrderItem, Category, DailyCategorySales,
+                    DailyProductSales, DailySales, Order, OrderItem, Product, RollupWatermark)
+
+WATERMARK = 'daily_sales'
+# Orders that count as sales; Pending isn't paid yet and Cancelled never will be.
+REVENUE_STATUSES = ('Processing', 'Shipped', 'Completed')
+ROLLUP_COLUMNS = ['units', 'revenue', 'orders']
+# Overlap between status-change checks, for writers that stamp updated_at
+# and then wait for the write lock before committing.
+CHANGE_SLACK = timedelta(minutes=5)
+
+RunReport = namedtuple('RunReport', ['orders', 'chunks', 'watermark', 'days'])
+
+
+def _sources():
+    # (orders, items): live orders, and those archive.py moved out of them.
+    return [(Order.__table__, OrderItem.__table__),
+            (ArchivedOrder.__table__, ArchivedOrderItem.__table__)]
+
+
+def _aggregate(keys, where, orders, items):
+    """SELECT day, *keys, units, revenue, orders over the matching orders."""
+    o, i = orders.c, items.c
+    day = func.date(o.created_at)
+    stmt = (select(day, *keys, func.sum(i.quantity), func.sum(i.quantity * i.price),
+                   func.count(func.distinct(o.id)))
+            .select_from(items.join(orders, o.id == i.order_id))
+            .where(o.status.in_(REVENUE_STATUSES), *where(o))
+            .group_by(day, *keys))
+    if keys:
+        stmt = stmt.join(Product.__table__, Product.__table__.c.id == i.product_id)
+    return stmt
+
+
+def _rollups():
+    # (table, key column names, key expressions); a separate per-day table
+    # because order counts can't be summed across products or categories.
+    p = Product.__table__.c
+    return [(DailySales.__table__, [], []),
+            (DailyProductSales.__table__, ['product_id'], [p.id]),
+            (DailyCategorySales.__table__, ['category_id'], [func.coalesce(p.category_id, 0)])]
+
+
+def _upsert(connection, where, sources):
+    """Add the orders matching where(order columns) in each source to the rollups."""
+    for table, key_names, keys in _rollups():
+        for orders, items in sources:
+            stmt = sqlite_insert(table).from_select(
+                ['day'] + key_names + ROLLUP_COLUMNS, _aggregate(keys, where, orders, items))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['day'] + key_names,
+                set_={name: table.c[name] + stmt.excluded[name] for name in ROLLUP_COLUMNS})
+            connection.execute(stmt)
+
+
+def _watermark(connection):
+    w = RollupWatermark.__table__
+    last = connection.execute(select(w.c.last_order_id).where(w.c.name == WATERMARK)).scalar()
+    if last is None:
+        now = datetime.utcnow()
+        connection.execute(w.insert().values(name=WATERMARK, last_order_id=0,
+                                             updated_at=now, checked_at=now))
+        last = 0
+    return last
+
+
+def _advance(connection, last_order_id):
+    w = RollupWatermark.__table__
+    connection.execute(w.update().where(w.c.name == WATERMARK)
+                       .values(last_order_id=last_order_id))
+
+
+def _refold_changed(connection):
+    """Rebuild the days of rolled-up orders updated since the last check."""
+    w, o = RollupWatermark.__table__.c, Order.__table__.c
+    now = datetime.utcnow()
+    watermark = _watermark(connection)
+    checked = connection.execute(
+        select(w.checked_at).where(w.name == WATERMARK)).scalar() or now
+    days = sorted(date.fromisoformat(day) for day in connection.execute(
+        select(func.date(o.created_at)).distinct()
+        .where(o.updated_at > checked - CHANGE_SLACK, o.id <= watermark)).scalars())
+    for day in days:
+        _rebuild(connection, day, day + timedelta(days=1))
+    connection.execute(RollupWatermark.__table__.update().where(w.name == WATERMARK)
+                       .values(checked_at=now))
+    return days
+
+
+def run(engine, chunk_size=50_000):
+    """Refold days with changed orders, then fold in orders past the
+    watermark; returns a RunReport."""
+    with database.write_transaction(engine) as connection:
+        days = len(_refold_changed(connection))
+    o = Order.__table__.c
+    orders = chunks = 0
+    while True:
+        with database.write_transaction(engine) as connection:
+            low = _watermark(connection)
+            high, count = connection.execute(
+                select(func.max(o.id), func.count())
+                .where(o.id.in_(select(o.id).where(o.id > low).order_by(o.id)
+                                .limit(chunk_size)))).one()
+            if not count:
+                return RunReport(orders, chunks, low, days)
+            # Only orders at or below the watermark are ever archived.
+            _upsert(connection, lambda o: [o.id > low, o.id <= high], _sources()[:1])
+            _advance(connection, high)
+        orders += count
+        chunks += 1
+
+
+def backfill(engine, start, end, chunk_days=7):
+    """Recompute [start, end) from the raw tables; returns days rebuilt.
+
+    Raises ValueError if nothing has been rolled up yet and the range
+    doesn't cover every order.
+    """
+    with database.write_transaction(engine) as connection:
+        if _watermark(connection) == 0:
+            _bootstrap(connection, start, end)
+            return (end - start).days
+
+    day = start
+    while day < end:
+        chunk_end = min(day + timedelta(days=chunk_days), end)
+        with database.write_transaction(engine) as connection:
+            _rebuild(connection, day, chunk_end)
+        day = chunk_end
+    return (end - start).days
+
+
+def _rebuild(connection, start, end):
+    # Days [start, end) from scratch: every order up to the watermark, live
+    # or archived.  The caller holds the write lock.
+    for table, _, _ in _rollups():
+        connection.execute(table.delete().where(table.c.day >= start, table.c.day < end))
+    watermark = _watermark(connection)
+    low = datetime.combine(start, datetime.min.time())
+    high = datetime.combine(end, datetime.min.time())
+    _upsert(connection, lambda o: [o.id <= watermark, o.created_at >= low,
+                                   o.created_at < high], _sources())
+
+
+def _bootstrap(connection, start, end):
+    # Moving the watermark past orders that weren't rebuilt would leave them
+    # out of the rollups for good (and archive.py would then move them), so
+    # the first backfill must cover all of history, in one transaction.
+    o = Order.__table__.c
+    first, last, newest = connection.execute(
+        select(func.min(o.created_at), func.max(o.created_at), func.max(o.id))).one()
+    if newest is None:
+        return
+    if first.date() < start or last.date() >= end:
+        raise ValueError(f'nothing is rolled up yet: run() first, or backfill all of '
+                         f'history ({first.date()} to {last.date()} inclusive)')
+    for table, _, _ in _rollups():
+        connection.execute(table.delete())
+    _upsert(connection, lambda o: [o.id <= newest], _sources()[:1])
+    _advance(connection, newest)
+
+
+# Dashboard queries: rollup tables only.
+
+def revenue_by_day(session, start, end):
+    t = DailySales
+    return session.execute(
+        select(t.day, t.units, t.revenue, t.orders)
+        .where(t.day >= start, t.day < end)
+        .order_by(t.day)).all()
+
+
+def revenue_by_category(session, start, end):
+    t = DailyCategorySales
+    return session.execute(
+        select(t.category_id, Category.name, func.sum(t.units).label('units'),
+               func.sum(t.revenue).label('revenue'))
+        .outerjoin(Category, Category.id == t.category_id)
+        .where(t.day >= start, t.day < end)
+        .group_by(t.category_id, Category.name)
+        .order_by(func.sum(t.revenue).desc())).all()
+
+
+def top_products(session, start, end, limit=10):
+    t = DailyProductSales
+    # Rank on the rollup alone, then fetch names for the winners only.
+    top = (select(t.product_id, func.sum(t.units).label('units'),
+                  func.sum(t.revenue).label('revenue'))
+           .where(t.day >= start, t.day < end)
+           .group_by(t.product_id)
+           .order_by(func.sum(t.revenue).desc()).limit(limit)
+           .subquery())
+    return session.execute(
+        select(top.c.product_id, Product.name, top.c.units, top.c.revenue)
+        .join(Product, Product.id == top.c.product_id)
+        .order_by(top.c.revenue.desc())).all()
+
+
+def product_sales(session, product_id, start, end):
+    t = DailyProductSales
+    return session.execute(
+        select(t.day, t.units, t.revenue, t.orders)
+        .where(t.product_id == product_id, t.day >= start, t.day < end)
+        .order_by(t.day)).all()
+
+
+def main():
+    from app import create_app
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Maintain the daily sales rollups.')
+    parser.add_argument('command', choices=['run', 'backfill'])
+    parser.add_argument('--start', type=date.fromisoformat)
+    parser.add_argument('--end', type=date.fromisoformat)
+    parser.add_argument('--days', type=int, help='backfill the last N days, up to today')
+    parser.add_argument('--chunk-days', type=int, default=7)
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        if args.command == 'run':
+            report = run(db.engine, args.chunk_size)
+            print(f'{report.days} changed days rebuilt, {report.orders} orders in '
+                  f'{report.chunks} chunks, watermark {report.watermark}', end='')
+        else:
+            if args.days:
+                args.end = datetime.utcnow().date() + timedelta(days=1)
+                args.start = args.end - timedelta(days=args.days)
+            if not (args.start and args.end):
+                parser.error('backfill needs --start and --end, or --days')
+            try:
+                days = backfill(db.engine, args.start, args.end, args.chunk_days)
+            except ValueError as exc:
+                parser.error(str(exc))
+            print(f'{days} days rebuilt', end='')
+        print(f' in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
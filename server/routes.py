@@ -0,0 +1,221 @@
+"""Read-only catalog endpoints and product search, served through the
+conditional-GET cache, the signed-in user's order history, login and logout,
+plus the cache and SQL metrics.
+
+asgi.py serves the same catalog, review and order-history reads on the
+asyncio path (async_reads.py)."""
+import math
+
+from flask import Blueprint, Response, abort, jsonify, request
+from sqlalchemy import select
+
+import archive
+import catalog
+import recommendations
+import search
+from hashing import PoolBusy
+from models import db, Product, Category, Review, User
+from pricing import prices
+from response_cache import cache
+from serializers import serialize, serialize_many
+from sql_metrics import metrics
+from throttle import Throttled, throttle
+from tokens import InvalidToken, tokens
+
+bp = Blueprint('catalog', __name__)
+
+MAX_REVIEWS = 100
+MAX_ORDERS = 100
+
+
+def _versions(kind, rows):
+    return [((kind, row.id), row.updated_at) for row in rows]
+
+
+def _price_versions(products):
+    # Effective prices change when a discount window opens or closes, with
+    # no row updated; they go into the ETag themselves.
+    return [(('price', product.id, product.effective_price), None) for product in products]
+
+
+def _price_boundary():
+    return prices.valid_until
+
+
+@bp.get('/products')
+def list_products():
+    args = request.args
+    category = args.get('category')
+
+    def load():
+        try:
+            page = catalog.list_products(sort=args.get('sort', 'newest'),
+                                         cursor=args.get('cursor'),
+                                         limit=args.get('limit', 24, type=int),
+                                         category=category, with_reviews=False)
+        except ValueError:
+            abort(400)
+        versions = _versions('product', page.items) + _price_versions(page.items)
+        return versions, lambda: {
+            'items': serialize_many(page.items, 'listing', Product),
+            'next_cursor': page.next_cursor,
+        }
+
+    return cache.respond(request.full_path, [('products',)], load, _price_boundary)
+
+
+@bp.get('/products/<int:product_id>')
+def get_product(product_id):
+    def load():
+        product = catalog.get_product(product_id)
+        if product is None:
+            return None, None
+        versions = (_versions('product', [product]) + _versions('review', product.reviews)
+                    + _versions('discount', product.discounts) + _price_versions([product]))
+        return versions, lambda: serialize(product, 'detail')
+
+    return cache.respond(request.full_path, [('product', product_id)], load, _price_boundary)
+
+
+@bp.get('/products/<int:product_id>/reviews')
+def list_reviews(product_id):
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_REVIEWS))
+    before = request.args.get('before', type=int)
+
+    def load():
+        reviews = db.session.execute(
+            catalog.reviews_query(product_id, limit, before)).scalars().all()
+        return _versions('review', reviews), lambda: serialize_many(reviews, 'default', Review)
+
+    return cache.respond(request.full_path, [('reviews', product_id)], load)
+
+
+@bp.get('/products/<int:product_id>/also-bought')
+def also_bought(product_id):
+    limit = max(1, min(request.args.get('limit', 10, type=int), recommendations.DEFAULT_K))
+
+    def load():
+        products = recommendations.also_bought(db.session, product_id, limit)
+        # The neighbour list itself comes from a batch job, so it is part of
+        # the ETag too; the response cache's TTL picks up a rebuild.
+        versions = [(('also-bought', product_id, *(p.id for p in products)), None)]
+        versions += _versions('product', products) + _price_versions(products)
+        return versions, lambda: serialize_many(products, 'listing', Product)
+
+    return cache.respond(request.full_path, [('product', product_id), ('products',)], load,
+                         _price_boundary)
+
+
+@bp.get('/search')
+def search_products():
+    args = request.args
+    query = args.get('q', '')
+
+    def load():
+        page = search.search_products(query, category=args.get('category'),
+                                      min_price=args.get('min_price', type=float),
+                                      max_price=args.get('max_price', type=float),
+                                      page=args.get('page', 1, type=int),
+                                      per_page=args.get('per_page', 20, type=int))
+        # Hits carry no updated_at; what they render is their version.
+        versions = [(('hit', *hit), None) for hit in page.items]
+        versions += [(('price', hit.id, prices.price(hit.id)), None) for hit in page.items]
+        return versions, lambda: {
+            'items': [dict(hit._asdict(), effective_price=prices.price(hit.id))
+                      for hit in page.items],
+            'page': page.page,
+            'has_more': page.has_more,
+        }
+
+    return cache.respond(request.full_path, [('products',)], load, _price_boundary)
+
+
+@bp.get('/categories')
+def list_categories():
+    def load():
+        categories = db.session.execute(select(Category).order_by(Category.name)).scalars().all()
+        return _versions('category', categories), lambda: serialize_many(categories, 'facet',
+                                                                         Category)
+
+    return cache.respond(request.full_path, [('categories',)], load)
+
+
+@bp.get('/categories/<int:category_id>')
+def get_category(category_id):
+    def load():
+        category = db.session.get(Category, category_id)
+        if category is None:
+            return None, None
+        return _versions('category', [category]), lambda: serialize(category, 'facet')
+
+    return cache.respond(request.full_path, [('category', category_id)], load)
+
+
+def bearer_user_id(header, poll=True):
+    """User id of a valid `Authorization: Bearer <token>` header, else None."""
+    scheme, _, token = (header or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return tokens.verify(token.strip(), poll)
+    except InvalidToken:
+        return None
+
+
+@bp.get('/orders')
+def order_history():
+    # Private data: not shared through the response cache.
+    user_id = bearer_user_id(request.headers.get('Authorization'))
+    if user_id is None:
+        abort(401)
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_ORDERS))
+    include_archived = request.args.get('archived', '1') != '0'
+    orders = archive.order_history(db.session, user_id, include_archived, limit)
+    return jsonify([serialize(order, 'detail') for order in orders])
+
+
+@bp.post('/login')
+def login():
+    data = request.get_json(silent=True) or {}
+    username, password = data.get('username'), data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        abort(400)
+    # Before the lookup and the bcrypt check: a rejected attempt costs nothing.
+    try:
+        throttle.admit(username, request.remote_addr)
+    except Throttled as e:
+        response = jsonify({'error': 'too many login attempts'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response
+    user = db.session.execute(select(User).where(User.username == username)).scalar()
+    try:
+        token = tokens.login(user, password)
+    except PoolBusy:
+        abort(503)
+    if token is None:
+        return jsonify({'error': 'invalid username or password'}), 401
+    db.session.commit()  # a password rehashed at the current cost
+    throttle.succeeded(username)
+    return jsonify({'token': token})
+
+
+@bp.post('/logout')
+def logout():
+    # Revokes every token the user holds, on every worker and the ASGI app.
+    user_id = bearer_user_id(request.headers.get('Authorization'))
+    if user_id is None:
+        abort(401)
+    tokens.revoke(user_id)
+    return '', 204
+
+
+@bp.get('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+
+@bp.get('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render() + throttle.render(),
+                    mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,222 @@
+"""Full-text product search on SQLite FTS5.
+
+product_fts is an external-content FTS5 table over product.name and
+product.description, kept in sync by triggers (created by migration
+c3d8e5a1f902, or by create_all through the after_create hook below).
+
+    from search import search_products
+    page = search_products('velvet sofa', category='Living Room', max_price=900)
+    for hit in page.items:
+        print(hit.id, hit.rank, hit.name_highlight, hit.snippet)
+
+name_highlight and snippet are HTML: the product text is escaped and the
+matched terms are wrapped in <mark>.  name is the raw product name.
+
+    python search.py rebuild     # reindex existing rows
+"""
+import html
+import re
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import DDL, bindparam, event, text
+
+from models import db, Product
+
+SearchHit = namedtuple('SearchHit', [
+    'id', 'name', 'price', 'category', 'image_url', 'rank', 'name_highlight', 'snippet',
+])
+SearchPage = namedtuple('SearchPage', ['items', 'page', 'has_more'])
+
+MAX_PER_PAGE = 100
+# bm25 column weights: a hit in the name counts much more than in the description.
+NAME_WEIGHT, DESCRIPTION_WEIGHT = 10.0, 1.0
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, description,
+        content='product', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    # Only text changes touch the index; stock/price/rating updates don't.
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+# The per-row triggers that bulk_indexing() lifts.
+ROW_TRIGGERS = {'product_fts_ai': FTS_DDL[1], 'product_fts_au': FTS_DDL[3]}
+FTS_DROP = [
+    'DROP TRIGGER IF EXISTS product_fts_au',
+    'DROP TRIGGER IF EXISTS product_fts_ad',
+    'DROP TRIGGER IF EXISTS product_fts_ai',
+    'DROP TABLE IF EXISTS product_fts',
+]
+
+for _statement in FTS_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in FTS_DROP:
+    event.listen(Product.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# highlight()/snippet() mark matches with these private-use characters, so
+# the text can be escaped before the real <mark> tags go in.
+OPEN_MARK, CLOSE_MARK = '\ue000', '\ue001'
+
+
+def _marked_html(value):
+    if value is None:
+        return None
+    return (html.escape(value)
+            .replace(OPEN_MARK, '<mark>').replace(CLOSE_MARK, '</mark>'))
+
+
+def to_match_query(query):
+    """Turn free text into a safe FTS5 query: every word must match, and the
+    last word is treated as a prefix so results show up while typing."""
+    words = _TOKEN.findall(query)
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_products(query, category=None, min_price=None, max_price=None,
+                    page=1, per_page=20):
+    """BM25-ranked page of products matching `query`, with HTML highlights."""
+    match = to_match_query(query)
+    if match is None:
+        return SearchPage([], page, False)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    page = max(1, page)
+
+    filters = []
+    params = {'match': match, 'limit': per_page + 1, 'offset': (page - 1) * per_page,
+              'name_weight': NAME_WEIGHT, 'description_weight': DESCRIPTION_WEIGHT,
+              'open': OPEN_MARK, 'close': CLOSE_MARK}
+    if category is not None:
+        filters.append('AND p.category_id = (SELECT id FROM category WHERE name = :category)')
+        params['category'] = category
+    if min_price is not None:
+        filters.append('AND p.price >= :min_price')
+        params['min_price'] = min_price
+    if max_price is not None:
+        filters.append('AND p.price <= :max_price')
+        params['max_price'] = max_price
+
+    # Rank first, then build highlights/snippets for the page rows only;
+    # snippet() is by far the most expensive part for common terms.
+    sql = text(f"""
+        WITH hits AS (
+            SELECT product_fts.rowid AS id,
+                   bm25(product_fts, :name_weight, :description_weight) AS rank
+            FROM product_fts
+            JOIN product AS p ON p.id = product_fts.rowid
+            WHERE product_fts MATCH :match {' '.join(filters)}
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT p.id, p.name, p.price, p.category, p.image_url, hits.rank,
+               highlight(product_fts, 0, :open, :close) AS name_highlight,
+               snippet(product_fts, 1, :open, :close, '…', 12) AS snippet
+        FROM hits
+        JOIN product_fts ON product_fts.rowid = hits.id
+        JOIN product AS p ON p.id = hits.id
+        WHERE product_fts MATCH :match
+        ORDER BY hits.rank
+    """)
+    rows = [SearchHit(*row[:6], _marked_html(row.name_highlight), _marked_html(row.snippet))
+            for row in db.session.execute(sql, params)]
+    return SearchPage(rows[:per_page], page, len(rows) > per_page)
+
+
+def install(connection):
+    """Create the FTS table and triggers if they are missing."""
+    for statement in FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def rebuild(connection):
+    """Reindex every product from the content table."""
+    install(connection)
+    connection.exec_driver_sql("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+    connection.exec_driver_sql("INSERT INTO product_fts(product_fts) VALUES ('optimize')")
+
+
+@contextmanager
+def bulk_indexing(connection):
+    """Write products without the per-row insert/update triggers.
+
+    Indexing rows one trigger at a time costs several times more than one
+    INSERT ... SELECT over the same rows, so bulk writers lift the triggers and
+    call unindex()/reindex() themselves.  Use it inside a transaction: other
+    connections never see the triggers missing.  The triggers are put back
+    even if the block raises, so nothing depends on the caller rolling back.
+    """
+    for name in ROW_TRIGGERS:
+        connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {name}')
+    try:
+        yield
+    finally:
+        for statement in ROW_TRIGGERS.values():
+            connection.exec_driver_sql(statement)
+
+
+def unindex(connection, rows):
+    """Remove (id, name, description) rows, as currently indexed, from product_fts."""
+    if rows:
+        connection.exec_driver_sql(
+            "INSERT INTO product_fts(product_fts, rowid, name, description) "
+            "VALUES ('delete', ?, ?, ?)", [tuple(row) for row in rows])
+
+
+def reindex(connection, ids=(), after_id=None):
+    """Index the current name and description of these products, and of
+    every product with an id above after_id (the rows inserted since)."""
+    ids = list(ids)
+    where, params = [], {}
+    if ids:
+        where.append('id IN :ids')
+        params['ids'] = ids
+    if after_id is not None:
+        where.append('id > :after_id')
+        params['after_id'] = after_id
+    if not where:
+        return
+    stmt = text('INSERT INTO product_fts(rowid, name, description) '
+                f"SELECT id, name, description FROM product WHERE {' OR '.join(where)}")
+    if ids:
+        stmt = stmt.bindparams(bindparam('ids', expanding=True))
+    connection.execute(stmt, params)
+
+
+def main():
+    import argparse
+    from app import create_app
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Product full-text index maintenance.')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args()
+    with app.app_context():
+        started = time.perf_counter()
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        print(f'product_fts rebuilt in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
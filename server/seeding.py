@@ -0,0 +1,452 @@
+"""Synthetic data generator for load-testing the schema in models.py.
+
+Rows are generated lazily and streamed through Core executemany inserts in
+large batches, all inside a single transaction.  Passwords are hashed once per
+distinct password (optionally in a process pool) instead of once per user.
+
+    from seeding import SeedConfig, seed
+    with app.app_context():
+        report = seed(db.engine, SeedConfig(users=100_000, products=50_000))
+        print(report)
+"""
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import bcrypt as _bcrypt
+from sqlalchemy import bindparam, func, select
+
+import database
+from models import (User, Product, Category, Order, OrderItem, Review, Cart,
+                    CartItem, Address, Payment, Discount, RATINGS)
+
+CATEGORY_NAMES = [
+    "Living Room", "Bedroom", "Kitchen", "Bathroom", "Office",
+    "Outdoor", "Lighting", "Decor", "Furniture", "Storage",
+]
+PRODUCT_WORDS = [
+    "Sofa", "Bed", "Table", "Chair", "Lamp", "Shelf", "Rug", "Mirror",
+    "Wardrobe", "Desk", "Stool", "Cabinet", "Curtain", "Vase", "Bench",
+]
+ADJECTIVES = [
+    "Modern", "Rustic", "Oak", "Velvet", "Compact", "Classic", "Nordic",
+    "Industrial", "Linen", "Walnut", "Marble", "Rattan",
+]
+ORDER_STATUSES = ["Pending", "Processing", "Shipped", "Completed", "Cancelled"]
+PAYMENT_METHODS = ["Credit Card", "PayPal", "Bank Transfer", "M-Pesa"]
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1_000
+    products: int = 1_000
+    orders: int = 5_000
+    items_per_order: tuple = (1, 5)
+    reviews: int = 5_000
+    cart_ratio: float = 0.3
+    items_per_cart: tuple = (1, 4)
+    address_ratio: float = 0.8
+    payment_ratio: float = 0.9
+    discount_ratio: float = 0.2
+    owner_ratio: float = 0.05
+    # 0 picks users/products uniformly; larger values skew towards low ids,
+    # giving a few "hot" customers and best-selling products.
+    skew: float = 1.0
+    passwords: list = field(default_factory=lambda: ["password"])
+    bcrypt_rounds: int = 12
+    hash_workers: int = 0
+    batch_size: int = 10_000
+    seed: int = 42
+    start: datetime = field(default_factory=lambda: datetime(2023, 1, 1))
+    days: int = 365
+
+
+class SeedReport:
+    def __init__(self):
+        self.tables = {}
+        self.hash_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def add(self, table, rows, seconds):
+        prev_rows, prev_seconds = self.tables.get(table, (0, 0.0))
+        self.tables[table] = (prev_rows + rows, prev_seconds + seconds)
+
+    @property
+    def total_rows(self):
+        return sum(rows for rows, _ in self.tables.values())
+
+    def rows_per_second(self):
+        return self.total_rows / self.total_seconds if self.total_seconds else 0.0
+
+    def __repr__(self):
+        lines = [f'{"table":<12} {"rows":>12} {"seconds":>9} {"rows/sec":>12}']
+        for table, (rows, seconds) in self.tables.items():
+            rate = rows / seconds if seconds else 0.0
+            lines.append(f'{table:<12} {rows:>12,} {seconds:>9.2f} {rate:>12,.0f}')
+        lines.append(f'{"total":<12} {self.total_rows:>12,} '
+                     f'{self.total_seconds:>9.2f} {self.rows_per_second():>12,.0f}')
+        lines.append(f'password hashing: {self.hash_seconds:.2f}s')
+        return "\n".join(lines)
+
+
+def _hash_one(args):
+    password, rounds = args
+    return _bcrypt.hashpw(password.encode('utf-8'),
+                          _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def hash_passwords(passwords, rounds=12, workers=0):
+    # bcrypt hashes are salted, so every distinct password needs its own hash,
+    # but users sharing a password can share the hash.
+    jobs = [(password, rounds) for password in passwords]
+    if workers and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_hash_one, jobs))
+    return [_hash_one(job) for job in jobs]
+
+
+def _picker(rng, n, skew):
+    # Returns a function picking an id in [1, n].  With skew > 0 the draw is a
+    # power distribution, which is cheap and puts most of the mass on low ids.
+    if skew <= 0:
+        return lambda: rng.randint(1, n)
+    exponent = 1.0 + skew
+    return lambda: min(n, int(n * rng.random() ** exponent) + 1)
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Generator:
+    def __init__(self, config, offsets, hashes):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.offsets = offsets
+        self.hashes = hashes
+        self.span = timedelta(days=config.days).total_seconds()
+        self.prices = array('d')
+
+    def _timestamp(self):
+        return self.config.start + timedelta(seconds=self.rng.random() * self.span)
+
+    def _pick_user(self):
+        return self.offsets['user'] + self.user_picker()
+
+    def _pick_product(self):
+        return self.offsets['product'] + self.product_picker()
+
+    def _price(self, pid):
+        index = pid - self.offsets['product'] - 1
+        return self.prices[index] if 0 <= index < len(self.prices) else 100.0
+
+    def prepare(self):
+        cfg = self.config
+        self.user_picker = _picker(self.rng, max(cfg.users, 1), cfg.skew)
+        self.product_picker = _picker(self.rng, max(cfg.products, 1), cfg.skew)
+
+    def categories(self):
+        for offset, name in enumerate(self.new_categories):
+            yield {'id': self.offsets['category'] + offset + 1, 'name': name}
+
+    def users(self):
+        cfg, rng = self.config, self.rng
+        base = self.offsets['user']
+        for i in range(1, cfg.users + 1):
+            uid = base + i
+            created = self._timestamp()
+            yield {
+                'id': uid,
+                'firstname': f'First{uid}',
+                'lastname': f'Last{uid}',
+                'username': f'user{uid}',
+                'email': f'user{uid}@example.com',
+                '_password_hash': self.hashes[i % len(self.hashes)],
+                'is_admin': i == 1 and base == 0,
+                'is_owner': rng.random() < cfg.owner_ratio,
+                'created_at': created,
+                'updated_at': created,
+            }
+
+    def addresses(self):
+        cfg, rng = self.config, self.rng
+        for i in range(1, cfg.users + 1):
+            if rng.random() >= cfg.address_ratio:
+                continue
+            created = self._timestamp()
+            yield {
+                'user_id': self.offsets['user'] + i,
+                'street': f'{rng.randint(1, 9999)} Main St',
+                'city': f'City{rng.randint(1, 500)}',
+                'state': f'State{rng.randint(1, 50)}',
+                'zip_code': f'{rng.randint(10000, 99999)}',
+                'country': 'USA',
+                'created_at': created,
+                'updated_at': created,
+            }
+
+    def products(self):
+        cfg, rng = self.config, self.rng
+        creators = max(cfg.users, 1)
+        self.category_tallies = {}
+        for i in range(1, cfg.products + 1):
+            pid = self.offsets['product'] + i
+            price = round(rng.uniform(5, 2500), 2)
+            self.prices.append(price)
+            created = self._timestamp()
+            word = rng.choice(PRODUCT_WORDS)
+            category = rng.choice(self.category_names)
+            category_id = self.category_ids[category]
+            stock = rng.randint(0, 500)
+            tally = self.category_tallies.setdefault(category_id, [0, 0])
+            tally[0] += 1
+            tally[1] += stock > 0
+            yield {
+                'id': pid,
+                'name': f'{rng.choice(ADJECTIVES)} {word} {pid}',
+                'description': f'A {rng.choice(ADJECTIVES).lower()} {word.lower()}.',
+                'price': price,
+                'category': category,
+                'category_id': category_id,
+                'stock': stock,
+                'image_url': f'http://example.com/products/{pid}.jpg',
+                'creator_id': self.offsets['user'] + rng.randint(1, creators),
+                'created_at': created,
+                'updated_at': created,
+            }
+
+    def discounts(self):
+        cfg, rng = self.config, self.rng
+        for i in range(1, cfg.products + 1):
+            if rng.random() >= cfg.discount_ratio:
+                continue
+            start = self._timestamp()
+            yield {
+                'product_id': self.offsets['product'] + i,
+                'discount_percentage': float(rng.choice([5, 10, 15, 20, 25, 50])),
+                'start_date': start,
+                'end_date': start + timedelta(days=rng.randint(1, 60)),
+                'created_at': start,
+                'updated_at': start,
+            }
+
+    def order_batches(self, size):
+        # Orders, their items and payment are generated together so an order's
+        # total is known when its row is written and nothing per-order has to
+        # be kept in memory beyond the current batch.
+        cfg, rng = self.config, self.rng
+        low, high = cfg.items_per_order
+        base = self.offsets['order']
+        orders, items, payments = [], [], []
+        for i in range(1, cfg.orders + 1):
+            oid = base + i
+            uid = self._pick_user()
+            total = 0.0
+            created = self._timestamp()
+            for _ in range(rng.randint(low, high)):
+                pid = self._pick_product()
+                quantity = rng.randint(1, 3)
+                price = self._price(pid)
+                total += price * quantity
+                items.append({
+                    'order_id': oid,
+                    'product_id': pid,
+                    'quantity': quantity,
+                    'price': price,
+                    'created_at': created,
+                    'updated_at': created,
+                })
+            total = round(total, 2)
+            orders.append({
+                'id': oid,
+                'user_id': uid,
+                'total_amount': total,
+                'status': rng.choice(ORDER_STATUSES),
+                'created_at': created,
+                'updated_at': created,
+            })
+            if rng.random() < cfg.payment_ratio:
+                payments.append({
+                    'user_id': uid,
+                    'order_id': oid,
+                    'amount': total,
+                    'payment_method': rng.choice(PAYMENT_METHODS),
+                    'status': 'Completed',
+                    'created_at': created,
+                    'updated_at': created,
+                })
+            if len(items) >= size:
+                yield orders, items, payments
+                orders, items, payments = [], [], []
+        if orders:
+            yield orders, items, payments
+
+    def reviews(self):
+        # Core inserts skip the Review mapper events, so tally the Product
+        # rating aggregates here: product id -> [count, sum, 1*, .., 5*].
+        cfg, rng = self.config, self.rng
+        self.ratings = {}
+        for _ in range(cfg.reviews):
+            created = self._timestamp()
+            pid = self._pick_product()
+            rating = rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 6])[0]
+            tally = self.ratings.setdefault(pid, [0, 0, 0, 0, 0, 0, 0])
+            tally[0] += 1
+            tally[1] += rating
+            tally[1 + rating] += 1
+            yield {
+                'user_id': self._pick_user(),
+                'product_id': pid,
+                'rating': rating,
+                'comment': rng.choice(['Great!', 'Okay.', 'Would buy again.', None]),
+                'created_at': created,
+                'updated_at': created,
+            }
+
+    def category_updates(self):
+        for category_id, (count, in_stock) in self.category_tallies.items():
+            yield {'_id': category_id, '_count': count, '_in_stock': in_stock}
+
+    def rating_updates(self):
+        for pid, (count, total, *histogram) in self.ratings.items():
+            row = {'_id': pid, '_count': count, '_sum': total}
+            row.update({f'_{star}': n for star, n in zip(RATINGS, histogram)})
+            yield row
+
+    def carts(self):
+        cfg, rng = self.config, self.rng
+        self.cart_ids = []
+        cid = self.offsets['cart']
+        for i in range(1, cfg.users + 1):
+            if rng.random() >= cfg.cart_ratio:
+                continue
+            cid += 1
+            self.cart_ids.append(cid)
+            created = self._timestamp()
+            yield {
+                'id': cid,
+                'user_id': self.offsets['user'] + i,
+                'created_at': created,
+                'updated_at': created,
+            }
+
+    def cart_items(self):
+        cfg, rng = self.config, self.rng
+        low, high = cfg.items_per_cart
+        for cid in self.cart_ids:
+            created = self._timestamp()
+            # One row per product: (cart_id, product_id) is unique.
+            for product_id in {self._pick_product() for _ in range(rng.randint(low, high))}:
+                yield {
+                    'cart_id': cid,
+                    'product_id': product_id,
+                    'quantity': rng.randint(1, 3),
+                    'created_at': created,
+                    'updated_at': created,
+                }
+
+
+def _max_id(conn, model):
+    return conn.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+
+def _insert(conn, report, model, rows, batch_size):
+    table = model.__table__
+    started = time.perf_counter()
+    for batch in _batches(rows, batch_size):
+        conn.execute(table.insert(), batch)
+        report.add(table.name, len(batch), 0.0)
+    report.add(table.name, 0, time.perf_counter() - started)
+
+
+def _add_ratings(conn, rows, batch_size):
+    # Added rather than assigned so seeding on top of existing data stays right.
+    c = Product.__table__.c
+    values = {
+        'rating_count': c.rating_count + bindparam('_count'),
+        'rating_sum': c.rating_sum + bindparam('_sum'),
+        'rating_avg': (c.rating_sum + bindparam('_sum')) * 1.0
+        / (c.rating_count + bindparam('_count')),
+    }
+    values.update({f'rating_{star}_count': c[f'rating_{star}_count'] + bindparam(f'_{star}')
+                   for star in RATINGS})
+    stmt = Product.__table__.update().where(c.id == bindparam('_id')).values(values)
+    for batch in _batches(rows, batch_size):
+        conn.execute(stmt, batch)
+
+
+def _add_category_counts(conn, rows, batch_size):
+    c = Category.__table__.c
+    stmt = Category.__table__.update().where(c.id == bindparam('_id')).values(
+        product_count=c.product_count + bindparam('_count'),
+        in_stock_count=c.in_stock_count + bindparam('_in_stock'))
+    for batch in _batches(rows, batch_size):
+        conn.execute(stmt, batch)
+
+
+def seed(engine, config=None):
+    """Populate every table with synthetic rows and return a SeedReport.
+
+    Ids are assigned up front (offset past any existing rows) so foreign keys
+    never need a round trip; everything is written in one transaction.
+    """
+    config = config or SeedConfig()
+    report = SeedReport()
+    started = time.perf_counter()
+
+    hash_started = time.perf_counter()
+    hashes = hash_passwords(config.passwords, config.bcrypt_rounds,
+                            config.hash_workers)
+    report.hash_seconds = time.perf_counter() - hash_started
+
+    # Locked from BEGIN: the offsets must still be free when the rows go in.
+    with database.write_transaction(engine) as conn:
+        offsets = {
+            'user': _max_id(conn, User),
+            'product': _max_id(conn, Product),
+            'order': _max_id(conn, Order),
+            'cart': _max_id(conn, Cart),
+            'category': _max_id(conn, Category),
+        }
+        gen = _Generator(config, offsets, hashes)
+        gen.prepare()
+
+        existing = dict(conn.execute(select(Category.name, Category.id)).all())
+        gen.new_categories = [n for n in CATEGORY_NAMES if n not in existing]
+        gen.category_names = CATEGORY_NAMES
+        gen.category_ids = dict(existing)
+        gen.category_ids.update((name, offsets['category'] + offset + 1)
+                                for offset, name in enumerate(gen.new_categories))
+
+        size = config.batch_size
+        _insert(conn, report, Category, gen.categories(), size)
+        _insert(conn, report, User, gen.users(), size)
+        _insert(conn, report, Address, gen.addresses(), size)
+        _insert(conn, report, Product, gen.products(), size)
+        _add_category_counts(conn, gen.category_updates(), size)
+        _insert(conn, report, Discount, gen.discounts(), size)
+        for orders, items, payments in gen.order_batches(size):
+            for model, rows in ((Order, orders), (OrderItem, items),
+                                (Payment, payments)):
+                step = time.perf_counter()
+                if rows:
+                    conn.execute(model.__table__.insert(), rows)
+                report.add(model.__table__.name, len(rows),
+                           time.perf_counter() - step)
+        _insert(conn, report, Review, gen.reviews(), size)
+        _add_ratings(conn, gen.rating_updates(), size)
+        _insert(conn, report, Cart, gen.carts(), size)
+        _insert(conn, report, CartItem, gen.cart_items(), size)
+
+    report.total_seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,210 @@
+"""Precompiled, per-view serializers for the models.
+
+SerializerMixin.to_dict() rediscovers columns and walks relationships on every
+call.  Here each (model, view) pair is compiled once into a field plan: one
+attrgetter fetching every column, a fixed list of keys, converters only where
+a column needs one (datetimes), and nested plans for the relationships the
+view names.  Underscore attributes such as User._password_hash can never be
+part of a view.
+
+    from serializers import serialize, serialize_many, serialize_rows
+    serialize(product, 'detail')
+    serialize_many(users, 'public')
+    serialize_rows(db.session.execute(select(Product.id, Product.name)))
+"""
+from datetime import date
+from operator import attrgetter
+
+from sqlalchemy import inspect
+
+from models import (User, Product, Category, Order, OrderItem, Review, Cart,
+                    CartItem, Address, Payment, Discount, ArchivedOrder, ArchivedOrderItem,
+                    ArchivedPayment)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# model -> {view: (fields, {relationship: view})}
+VIEWS = {
+    User: {
+        'public': (('id', 'username', 'firstname', 'lastname', 'created_at'), {}),
+        'private': (('id', 'username', 'firstname', 'lastname', 'email', 'is_admin',
+                     'is_owner', 'created_at', 'updated_at'), {}),
+        'profile': (('id', 'username', 'firstname', 'lastname', 'email', 'is_admin',
+                     'is_owner', 'created_at', 'updated_at'), {'addresses': 'default'}),
+    },
+    Product: {
+        'listing': (('id', 'name', 'price', 'effective_price', 'category', 'category_id',
+                     'stock', 'image_url', 'rating_avg', 'rating_count'), {}),
+        'detail': (('id', 'name', 'description', 'price', 'effective_price', 'category',
+                    'category_id', 'stock', 'image_url',
+                    'creator_id', 'sku', 'rating_avg', 'rating_count', 'rating_histogram',
+                    'created_at', 'updated_at'),
+                   {'reviews': 'default', 'discounts': 'default'}),
+    },
+    Category: {
+        'default': (('id', 'name'), {}),
+        'facet': (('id', 'name', 'product_count', 'in_stock_count'), {}),
+    },
+    Review: {
+        'default': (('id', 'user_id', 'product_id', 'rating', 'comment', 'created_at'), {}),
+    },
+    Discount: {
+        'default': (('id', 'product_id', 'discount_percentage', 'start_date', 'end_date'), {}),
+    },
+    Order: {
+        'summary': (('id', 'user_id', 'total_amount', 'status', 'created_at', 'archived'), {}),
+        'detail': (('id', 'user_id', 'total_amount', 'status', 'created_at', 'updated_at',
+                    'archived'),
+                   {'order_items': 'default', 'payment': 'default'}),
+    },
+    OrderItem: {
+        'default': (('id', 'order_id', 'product_id', 'quantity', 'price'), {}),
+    },
+    Payment: {
+        'default': (('id', 'order_id', 'amount', 'payment_method', 'status', 'created_at'), {}),
+    },
+    # Archived orders look like live ones (archive.order_history mixes them).
+    ArchivedOrder: {
+        'summary': (('id', 'user_id', 'total_amount', 'status', 'created_at', 'archived'), {}),
+        'detail': (('id', 'user_id', 'total_amount', 'status', 'created_at', 'updated_at',
+                    'archived'),
+                   {'order_items': 'default', 'payment': 'default'}),
+    },
+    ArchivedOrderItem: {
+        'default': (('id', 'order_id', 'product_id', 'quantity', 'price'), {}),
+    },
+    ArchivedPayment: {
+        'default': (('id', 'order_id', 'amount', 'payment_method', 'status', 'created_at'), {}),
+    },
+    Cart: {
+        'default': (('id', 'user_id', 'updated_at'), {'cart_items': 'default'}),
+    },
+    CartItem: {
+        'default': (('id', 'cart_id', 'product_id', 'quantity'), {}),
+    },
+    Address: {
+        'default': (('id', 'street', 'city', 'state', 'zip_code', 'country'), {}),
+    },
+}
+
+_plans = {}
+
+
+class _Plan:
+    __slots__ = ('keys', 'getter', 'converters', 'nested')
+
+    def __init__(self, keys, getter, converters, nested):
+        self.keys = keys
+        self.getter = getter
+        self.converters = converters  # [(index, fn)]
+        self.nested = nested  # [(key, attrgetter, plan, uselist)]
+
+    def __call__(self, obj):
+        values = self.getter(obj)
+        if len(self.keys) == 1:
+            values = (values,)
+        if self.converters:
+            values = list(values)
+            for index, convert in self.converters:
+                values[index] = convert(values[index])
+        result = dict(zip(self.keys, values))
+        for key, get, plan, uselist in self.nested:
+            value = get(obj)
+            if uselist:
+                result[key] = [plan(item) for item in value]
+            else:
+                result[key] = plan(value) if value is not None else None
+        return result
+
+
+def _converter_for(mapper, field):
+    column = mapper.columns.get(field)
+    if column is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return None
+    return _isoformat if issubclass(python_type, date) else None
+
+
+def compile_view(model, view):
+    """Build (once) and return the plan for model/view."""
+    plan = _plans.get((model, view))
+    if plan is not None:
+        return plan
+    try:
+        fields, relationships = VIEWS[model][view]
+    except KeyError:
+        raise KeyError(f'no {view!r} view for {model.__name__}')
+    mapper = inspect(model)
+    converters = []
+    for index, field in enumerate(fields):
+        if field.startswith('_'):
+            raise ValueError(f'{model.__name__}.{field} is private and cannot be serialized')
+        if not hasattr(model, field):
+            raise ValueError(f'{model.__name__} has no attribute {field!r}')
+        convert = _converter_for(mapper, field)
+        if convert is not None:
+            converters.append((index, convert))
+    nested = []
+    for name, nested_view in relationships.items():
+        relationship = mapper.relationships[name]
+        nested.append((name, attrgetter(name),
+                       compile_view(relationship.mapper.class_, nested_view),
+                       relationship.uselist))
+    plan = _Plan(tuple(fields), attrgetter(*fields), converters, nested)
+    _plans[(model, view)] = plan
+    return plan
+
+
+def serialize(obj, view='default'):
+    return compile_view(type(obj), view)(obj)
+
+
+def serialize_many(objs, view='default', model=None):
+    objs = list(objs) if model is None else objs
+    if model is None:
+        if not objs:
+            return []
+        model = type(objs[0])
+    plan = compile_view(model, view)
+    return [plan(obj) for obj in objs]
+
+
+def serialize_rows(rows):
+    """Serialize Core Row results (e.g. from a column select) to dicts.
+
+    Which columns need converting is worked out from the first row; columns
+    that were NULL there are checked per row.
+    """
+    result = []
+    keys = converters = unknown = None
+    for row in rows:
+        if keys is None:
+            keys, converters, unknown = _row_plan(row)
+        if converters or unknown:
+            values = list(row)
+            for index, convert in converters:
+                values[index] = convert(values[index])
+            for index in unknown:
+                if isinstance(values[index], date):
+                    values[index] = values[index].isoformat()
+            result.append(dict(zip(keys, values)))
+        else:
+            result.append(dict(zip(keys, row)))
+    return result
+
+
+def _row_plan(row):
+    keys = tuple(row._fields)
+    for key in keys:
+        if key.startswith('_'):
+            raise ValueError(f'column {key!r} is private and cannot be serialized')
+    converters = [(index, _isoformat) for index, value in enumerate(row)
+                  if isinstance(value, date)]
+    unknown = [index for index, value in enumerate(row) if value is None]
+    return keys, converters, unknown
@@ -0,0 +1,292 @@
+"""SQL instrumentation: per-request statement counts, DB time and N+1 detection.
+
+Cursor events on every Engine time each statement and attribute it to the
+trace of the current request.  Statements are grouped by a fingerprint, the
+SQL with literals, bound parameters and IN/VALUES lists collapsed, so
+`WHERE product_id = ?` run for 24 different products is one fingerprint seen
+24 times.  When a request ends its trace is folded into Prometheus-style
+histograms and counters, served as text from /metrics (routes.py).  A
+fingerprint repeated SQL_METRICS_N_PLUS_ONE times or more in one request is
+logged as a likely N+1 (typically a lazy=True relationship touched in a loop)
+and counted per endpoint.
+
+Only a SQL_METRICS_SAMPLE_RATE fraction of requests is traced; for the rest
+the events cost one context-variable lookup per statement.  Statements run
+outside a traced request (background flushers, the profile's writer thread)
+are not recorded.  Scripts and benchmarks can trace a block explicitly:
+
+    with metrics.trace('import') as trace:
+        ...
+    print(trace.statements, trace.db_time, trace.n_plus_one())
+
+Each worker process keeps its own registry, so /metrics reports the worker
+that served the scrape.
+"""
+import bisect
+import contextvars
+import heapq
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('sql_trace', default=None)
+
+STATEMENT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+REQUEST_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_PARAM = re.compile(r'%\(\w+\)s|:\w+|\$\d+|%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement):
+    """Normalize SQL so statements differing only in values compare equal."""
+    sql = _STRING.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PARAM.sub('?', sql)
+    sql = _LIST.sub('(...)', sql)
+    sql = _ROWS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _kind(statement):
+    word = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete', 'with') else 'other'
+
+
+class Trace:
+    """Statements seen while one request (or traced block) ran."""
+
+    def __init__(self, name, keep_slowest=5):
+        self.name = name
+        self.keep_slowest = keep_slowest
+        self.statements = 0
+        self.db_time = 0.0
+        self.counts = Counter()
+        self.slowest = []  # min-heap of (seconds, fingerprint)
+        self.kinds = []  # (kind, seconds) per statement, for the histograms
+
+    def record(self, statement, seconds):
+        fp = fingerprint(statement)
+        self.statements += 1
+        self.db_time += seconds
+        self.counts[fp] += 1
+        self.kinds.append((_kind(statement), seconds))
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, (seconds, fp))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, fp))
+
+    def slowest_statements(self):
+        return sorted(self.slowest, reverse=True)
+
+    def n_plus_one(self, threshold=5):
+        """Fingerprints executed at least `threshold` times, most repeated first."""
+        return [(fp, n) for fp, n in self.counts.most_common() if n >= threshold]
+
+    def report(self, threshold=5):
+        return {
+            'name': self.name,
+            'statements': self.statements,
+            'db_ms': round(self.db_time * 1000, 3),
+            'slowest': [{'ms': round(s * 1000, 3), 'sql': fp}
+                        for s, fp in self.slowest_statements()],
+            'n_plus_one': [{'count': n, 'sql': fp} for fp, n in self.n_plus_one(threshold)],
+        }
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, values)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}  # label values -> [bucket counts..., +Inf, sum, count]
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), series):
+                cumulative += n
+                le = _labels(self.labels + ('le',), values + (bound,))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _labels(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = Counter()
+
+    def inc(self, *label_values, amount=1):
+        self._series[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for values, n in sorted(self._series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, values)} {n}')
+        return lines
+
+
+class SQLMetrics:
+    def __init__(self, sample_rate=1.0, n_plus_one=5, keep_slowest=5, slow_request_ms=None,
+                 recent=100):
+        self.sample_rate = sample_rate
+        self.n_plus_one = n_plus_one
+        self.keep_slowest = keep_slowest
+        self.slow_request_ms = slow_request_ms
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self.reset()
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('SQL_METRICS_SAMPLE_RATE', self.sample_rate)
+        self.n_plus_one = app.config.get('SQL_METRICS_N_PLUS_ONE', self.n_plus_one)
+        self.keep_slowest = app.config.get('SQL_METRICS_KEEP_SLOWEST', self.keep_slowest)
+        self.slow_request_ms = app.config.get('SQL_METRICS_SLOW_REQUEST_MS',
+                                              self.slow_request_ms)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def reset(self):
+        self.requests = CounterMetric(
+            'sql_traced_requests_total', 'Requests traced for SQL metrics.', ['endpoint'])
+        self.statement_seconds = Histogram(
+            'sql_statement_duration_seconds', 'Time spent executing one SQL statement.',
+            STATEMENT_BUCKETS, ['kind'])
+        self.request_statements = Histogram(
+            'sql_request_statements', 'SQL statements issued per traced request.',
+            REQUEST_COUNT_BUCKETS, ['endpoint'])
+        self.request_seconds = Histogram(
+            'sql_request_db_seconds', 'Total SQL time per traced request.',
+            REQUEST_TIME_BUCKETS, ['endpoint'])
+        self.n_plus_one_total = CounterMetric(
+            'sql_n_plus_one_total', 'Traced requests with a repeated statement fingerprint.',
+            ['endpoint'])
+        self._recent.clear()
+
+    # Tracing
+
+    def _sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    @contextmanager
+    def trace(self, name='trace'):
+        """Record every statement run in this block (regardless of sampling)."""
+        trace = Trace(name, self.keep_slowest)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+            self.finish(trace)
+
+    def finish(self, trace):
+        """Fold a finished trace into the metrics; returns its report."""
+        repeated = trace.n_plus_one(self.n_plus_one)
+        with self._lock:
+            self.requests.inc(trace.name)
+            for kind, seconds in trace.kinds:
+                self.statement_seconds.observe(seconds, kind)
+            self.request_statements.observe(trace.statements, trace.name)
+            self.request_seconds.observe(trace.db_time, trace.name)
+            if repeated:
+                self.n_plus_one_total.inc(trace.name)
+        report = trace.report(self.n_plus_one)
+        self._recent.append(report)
+        if repeated:
+            fp, n = repeated[0]
+            log.warning('possible N+1 in %s: %d statements, %r ran %d times',
+                        trace.name, trace.statements, fp, n)
+        if self.slow_request_ms is not None and trace.db_time * 1000 >= self.slow_request_ms:
+            log.warning('slow SQL in %s: %.1f ms over %d statements; slowest %s',
+                        trace.name, trace.db_time * 1000, trace.statements,
+                        report['slowest'][:1])
+        return report
+
+    def recent(self):
+        """Reports of the most recently finished traces, oldest first."""
+        return list(self._recent)
+
+    def _before_request(self):
+        if self._sampled():
+            g.sql_trace = Trace(request.endpoint or 'unmatched', self.keep_slowest)
+            g.sql_trace_token = _current.set(g.sql_trace)
+
+    def _after_request(self, response):
+        trace = g.get('sql_trace')
+        if trace is not None:
+            response.headers.add('Server-Timing', f'db;dur={trace.db_time * 1000:.2f};'
+                                                  f'desc="{trace.statements} queries"')
+        return response
+
+    def _teardown_request(self, exc):
+        trace = g.pop('sql_trace', None)
+        if trace is not None:
+            _current.reset(g.pop('sql_trace_token'))
+            self.finish(trace)
+
+    # Exposition
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.statement_seconds, self.request_statements,
+                           self.request_seconds, self.n_plus_one_total):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = SQLMetrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        context._sql_metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        started = getattr(context, '_sql_metrics_start', None)
+        if started is not None:
+            trace.record(statement, time.perf_counter() - started)
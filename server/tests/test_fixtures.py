@@ -0,0 +1,44 @@
+"""fixtures.rollback() around real requests on the default ':memory:' clone."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import fixtures
+from models import db, Discount, Review, User
+from pricing import apply_discount
+
+
+def test_priced_listing(client):
+    response = client.get('/products')
+    assert response.status_code == 200
+    items = response.json['items']
+    assert items and all(item['effective_price'] is not None for item in items)
+
+
+def test_rollback_undoes_committed_rows(app):
+    with fixtures.rollback(app):
+        client = app.test_client()
+        now = datetime.utcnow()
+        db.session.add(Discount(product_id=1, discount_percentage=50,
+                                start_date=now - timedelta(days=1),
+                                end_date=now + timedelta(days=1)))
+        db.session.add(Review(user_id=1, product_id=1, rating=5, comment='great'))
+        db.session.commit()
+        body = client.get('/products/1').json
+        assert body['effective_price'] == apply_discount(body['price'], 50)
+        assert 'great' in [review['comment'] for review in body['reviews']]
+
+    with fixtures.rollback(app):
+        body = app.test_client().get('/products/1').json
+        assert body['effective_price'] == body['price']
+        assert 'great' not in [review['comment'] for review in body['reviews']]
+
+
+def test_logout_revokes_inside_rollback(client):
+    username = db.session.execute(select(User.username).order_by(User.id)).scalar()
+    login = client.post('/login', json={'username': username, 'password': 'password'})
+    assert login.status_code == 200
+    headers = {'Authorization': f"Bearer {login.json['token']}"}
+    assert client.get('/orders', headers=headers).status_code == 200
+    assert client.post('/logout', headers=headers).status_code == 204
+    assert client.get('/orders', headers=headers).status_code == 401
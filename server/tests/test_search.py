@@ -0,0 +1,32 @@
+"""GET /search on the ':memory:' clone: results, and escaped highlights."""
+from models import db, Product
+
+
+def test_search_finds_product(client):
+    name = db.session.get(Product, 1).name
+    response = client.get('/search', query_string={'q': name})
+    assert response.status_code == 200
+    items = response.json['items']
+    assert 1 in [item['id'] for item in items]
+    assert all('<mark>' in item['name_highlight'] for item in items)
+
+
+def test_search_escapes_product_text(client):
+    product = db.session.get(Product, 1)
+    product.name = 'Zanzibar <script>alert(1)</script> lamp'
+    product.description = '<img src=x onerror=alert(1)> zanzibar & brass'
+    db.session.commit()
+
+    hit = client.get('/search?q=zanzibar').json['items'][0]
+    assert hit['name'] == product.name
+    assert hit['name_highlight'] == ('<mark>Zanzibar</mark> &lt;script&gt;alert(1)'
+                                     '&lt;/script&gt; lamp')
+    assert '<img' not in hit['snippet']
+    assert '&lt;img src=x onerror=alert(1)&gt; <mark>zanzibar</mark> &amp; brass' \
+        in hit['snippet']
+
+
+def test_search_without_words(client):
+    response = client.get('/search?q=%20')
+    assert response.status_code == 200
+    assert response.json == {'items': [], 'page': 1, 'has_more': False}
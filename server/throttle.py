@@ -0,0 +1,252 @@
+"""Login throttling: token buckets per username and per client address.
+
+Every login attempt that reaches User.authenticate costs a full bcrypt check,
+so a credential-stuffing flood can take the workers' CPU.  admit() is called
+before the user is even looked up and rejects excess attempts for free.
+
+Each key has a bucket holding up to `burst` attempts, refilled at a steady
+rate.  An attempt takes one token from both its username's and its
+address's bucket.  If either is empty, nothing is taken and Throttled
+carries the seconds until both have a token again.  A successful login
+refills its username's bucket, so a user who mistyped a few times isn't
+locked out afterwards.
+
+Buckets live in a bounded LRU (MemoryBuckets): the least recently seen keys
+go first.  A missing bucket counts as full, so eviction can only err towards
+admitting.  The keys under attack are touched on every attempt and stay
+resident.  Set LOGIN_THROTTLE_SHARED_PATH to keep them in a small SQLite
+file instead (SQLiteBuckets), so every worker process on the host applies
+the same counts.
+
+    from throttle import throttle
+    throttle.init_app(app)
+    throttle.admit('alice', '203.0.113.7')     # raises Throttled
+    throttle.succeeded('alice')
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sql_metrics import CounterMetric
+
+DEFAULT_MAX_KEYS = 100_000
+# key prefix -> the `reason` label of a rejection
+REASONS = {'user': 'username', 'addr': 'address'}
+
+
+class Throttled(Exception):
+    """Too many login attempts; retry_after is in seconds."""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(f'too many login attempts ({reason}); retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _levels(states, limits, now):
+    """Current token counts for limits [(key, burst, rate)] given stored
+    states {key: (tokens, updated)}; a missing bucket is full."""
+    levels = []
+    for key, burst, rate in limits:
+        state = states.get(key)
+        if state is None:
+            levels.append(float(burst))
+        else:
+            tokens, updated = state
+            levels.append(min(burst, tokens + max(0.0, now - updated) * rate))
+    return levels
+
+
+def _blocked(levels, limits):
+    """[(key, seconds until it has a token)] for the empty buckets."""
+    return [(key, (1 - level) / rate)
+            for level, (key, _, rate) in zip(levels, limits) if level < 1]
+
+
+class MemoryBuckets:
+    """Buckets in this process, at most max_keys of them (LRU)."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, limits, now):
+        """Take a token from every bucket in limits, or none; returns _blocked()."""
+        with self._lock:
+            buckets = self._buckets
+            levels = _levels(buckets, limits, now)
+            blocked = _blocked(levels, limits)
+            for (key, _, _), level in zip(limits, levels):
+                buckets[key] = (level if blocked else level - 1, now)
+                buckets.move_to_end(key)
+            while len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+                self.evictions += 1
+            return blocked
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """Buckets in a SQLite file shared by the worker processes on one host.
+
+    Each take() is one BEGIN IMMEDIATE transaction, so concurrent workers
+    never both spend the last token.  Every `prune_every` takes, the least
+    recently updated rows beyond max_keys are deleted.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS login_bucket ('
+              'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID',
+              'CREATE INDEX IF NOT EXISTS ix_login_bucket_updated ON login_bucket (updated)')
+
+    def __init__(self, path, max_keys=DEFAULT_MAX_KEYS, prune_every=1_000):
+        self.path = path
+        self.max_keys = max_keys
+        self.prune_every = prune_every
+        self.evictions = 0
+        self._takes = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, and new ones after a fork.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            # Losing the last few updates in a power cut only forgets some attempts.
+            connection.execute('PRAGMA synchronous = OFF')
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def take(self, limits, now):
+        connection = self._connection()
+        keys = [key for key, _, _ in limits]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            states = {key: (tokens, updated) for key, tokens, updated in connection.execute(
+                f"SELECT key, tokens, updated FROM login_bucket "
+                f"WHERE key IN ({', '.join('?' * len(keys))})", keys)}
+            levels = _levels(states, limits, now)
+            blocked = _blocked(levels, limits)
+            connection.executemany(
+                'INSERT OR REPLACE INTO login_bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                [(key, level if blocked else level - 1, now)
+                 for key, level in zip(keys, levels)])
+            self._takes += 1
+            if self._takes % self.prune_every == 0:
+                self._prune(connection)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return blocked
+
+    def _prune(self, connection):
+        excess = connection.execute('SELECT count(*) FROM login_bucket').fetchone()[0]
+        excess -= self.max_keys
+        if excess > 0:
+            connection.execute('DELETE FROM login_bucket WHERE key IN ('
+                               'SELECT key FROM login_bucket ORDER BY updated LIMIT ?)',
+                               (excess,))
+            self.evictions += excess
+
+    def reset(self, key):
+        self._connection().execute('DELETE FROM login_bucket WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM login_bucket').fetchone()[0]
+
+
+class LoginThrottle:
+    def __init__(self, user_burst=10, user_per_minute=5, address_burst=50,
+                 address_per_minute=30, store=None, enabled=True):
+        self.user_burst = user_burst
+        self.user_rate = user_per_minute / 60
+        self.address_burst = address_burst
+        self.address_rate = address_per_minute / 60
+        self.store = store if store is not None else MemoryBuckets()
+        self.enabled = enabled
+        self.reset_stats()
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('LOGIN_THROTTLE_ENABLED', self.enabled)
+        self.user_burst = config.get('LOGIN_THROTTLE_USER_BURST', self.user_burst)
+        self.user_rate = config.get('LOGIN_THROTTLE_USER_PER_MINUTE', self.user_rate * 60) / 60
+        self.address_burst = config.get('LOGIN_THROTTLE_ADDRESS_BURST', self.address_burst)
+        self.address_rate = config.get('LOGIN_THROTTLE_ADDRESS_PER_MINUTE',
+                                       self.address_rate * 60) / 60
+        max_keys = config.get('LOGIN_THROTTLE_MAX_KEYS', DEFAULT_MAX_KEYS)
+        path = config.get('LOGIN_THROTTLE_SHARED_PATH')
+        self.store = SQLiteBuckets(path, max_keys) if path else MemoryBuckets(max_keys)
+
+    def reset_stats(self):
+        self.admitted = CounterMetric(
+            'login_attempts_admitted_total', 'Login attempts let through to the password check.')
+        self.rejected = CounterMetric(
+            'login_attempts_rejected_total', 'Login attempts rejected before any bcrypt work.',
+            ['reason'])
+
+    @staticmethod
+    def user_key(username):
+        return 'user:' + username.strip().lower()
+
+    def _limits(self, username, address):
+        limits = []
+        if username:
+            limits.append((self.user_key(username), self.user_burst, self.user_rate))
+        if address:
+            limits.append(('addr:' + address, self.address_burst, self.address_rate))
+        return limits
+
+    def admit(self, username, address=None, now=None):
+        """Count one attempt, or raise Throttled without counting it."""
+        if not self.enabled:
+            return
+        limits = self._limits(username, address)
+        if not limits:
+            return
+        blocked = self.store.take(limits, now if now is not None else time.time())
+        if blocked:
+            kinds = {key.split(':', 1)[0] for key, _ in blocked}
+            reason = 'both' if len(kinds) > 1 else REASONS[kinds.pop()]
+            self.rejected.inc(reason)
+            raise Throttled(max(wait for _, wait in blocked), reason)
+        self.admitted.inc()
+
+    def succeeded(self, username):
+        """A login went through: forget the username's failed attempts."""
+        if self.enabled and username:
+            self.store.reset(self.user_key(username))
+
+    def stats(self):
+        return {
+            'admitted': sum(self.admitted._series.values()),
+            'rejected': sum(self.rejected._series.values()),
+            'keys': len(self.store),
+            'evictions': self.store.evictions,
+        }
+
+    def render(self):
+        lines = self.admitted.render() + self.rejected.render()
+        lines += ['# HELP login_throttle_keys Buckets currently tracked.',
+                  '# TYPE login_throttle_keys gauge',
+                  f'login_throttle_keys {len(self.store)}',
+                  '# HELP login_throttle_evictions_total Buckets dropped to stay under max keys.',
+                  '# TYPE login_throttle_evictions_total counter',
+                  f'login_throttle_evictions_total {self.store.evictions}']
+        return '\n'.join(lines) + '\n'
+
+
+throttle = LoginThrottle()
@@ -0,0 +1,238 @@
+"""Signed session tokens.
+
+A token is issued once after a successful User.authenticate and afterwards
+verified with a single HMAC-SHA256, so authenticated requests never pay for
+bcrypt or touch the database.
+
+Layout (urlsafe base64, no padding, 48 chars):
+
+    user id (8 bytes) | issued at, ms (8 bytes) | expires, s (4 bytes) | mac (16 bytes)
+
+Revoking a user invalidates every token issued for them up to that moment.
+Revocations are written to the token_revocation table and every process
+(each gunicorn worker, the ASGI app) reads the ones it hasn't seen at most
+every `poll_interval` seconds, so a logout holds everywhere within about a
+second while verifying stays free of per-request queries.  They are only
+kept until the longest-lived token they could affect has expired, so the
+list stays small.
+
+Cached UserViews are dropped when the User row is updated or deleted in
+this process, or revoked anywhere; other processes' copies of an edited
+profile may be up to `cache_ttl` seconds old.
+
+    from tokens import tokens
+    tokens.init_app(app)
+    token = tokens.login(user, password)      # None if the password is wrong
+    db.session.commit()                       # keeps a rehashed password
+    view = tokens.load_user(token)            # cached, read-only UserView
+    tokens.revoke(user_id)                    # logout: all of the user's tokens
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+import hashing
+from models import db, TokenRevocation, User
+
+log = logging.getLogger(__name__)
+
+_PAYLOAD = struct.Struct('>QQI')
+_MAC_SIZE = 16
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+UserView = namedtuple('UserView', [
+    'id', 'firstname', 'lastname', 'username', 'email', 'is_admin', 'is_owner',
+    'created_at', 'updated_at',
+])
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class TokenManager:
+    def __init__(self, secret=None, max_age=DEFAULT_MAX_AGE, cache_size=10_000, cache_ttl=60,
+                 engine=None, poll_interval=1.0):
+        self._key = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # Where revocations are shared; None keeps them in this process only.
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._seen_id = 0  # last token_revocation row read
+        self._next_poll = 0.0
+        self._revoked = {}  # user id -> (revoked at ms, forget after s)
+        self._cache = OrderedDict()  # user id -> (UserView, loaded at)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        secret = app.config.get('TOKEN_SECRET_KEY') or app.config.get('SECRET_KEY')
+        if not secret:
+            raise RuntimeError('SECRET_KEY must be set to issue session tokens')
+        self._key = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.max_age = app.config.get('TOKEN_MAX_AGE', self.max_age)
+        self.cache_ttl = app.config.get('TOKEN_USER_CACHE_TTL', self.cache_ttl)
+        self.poll_interval = app.config.get('TOKEN_REVOCATION_POLL', self.poll_interval)
+        with app.app_context():
+            self.bind(db.engine)
+
+    def bind(self, engine):
+        """Share revocations through `engine`; what was read from before is dropped."""
+        with self._lock:
+            self.engine = engine
+            self._seen_id = 0
+            self._next_poll = 0.0
+            self._revoked.clear()
+            self._cache.clear()
+
+    def _mac(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:_MAC_SIZE]
+
+    def issue(self, user_id, max_age=None):
+        now = time.time()
+        expires = int(now + (max_age or self.max_age))
+        payload = _PAYLOAD.pack(user_id, int(now * 1000), expires)
+        return _b64encode(payload + self._mac(payload))
+
+    def login(self, user, password):
+        """Run the one bcrypt check and return a token, or None.
+
+        user is None for an unknown username; the check still runs, against
+        a dummy hash.  On success the caller commits, which saves a hash
+        User.authenticate upgraded to the current cost.
+        """
+        if user is None:
+            hashing.pool.check_unknown(password)
+            return None
+        if not user.authenticate(password):
+            return None
+        return self.issue(user.id)
+
+    def verify(self, token, poll=True):
+        """Return the user id a valid token belongs to, or raise InvalidToken.
+
+        poll=False skips reading new revocations, which queries the
+        database; the asyncio app polls from a worker thread instead.
+        """
+        try:
+            raw = _b64decode(token)
+        except (ValueError, TypeError):
+            raise InvalidToken('malformed token')
+        if len(raw) != _PAYLOAD.size + _MAC_SIZE:
+            raise InvalidToken('malformed token')
+        payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+        if not hmac.compare_digest(mac, self._mac(payload)):
+            raise InvalidToken('bad signature')
+        user_id, issued_ms, expires = _PAYLOAD.unpack(payload)
+        now = time.time()
+        if expires <= now:
+            raise InvalidToken('token expired')
+        if poll:
+            self.poll()
+        revoked = self._revoked.get(user_id)
+        if revoked is not None:
+            revoked_ms, forget_after = revoked
+            if forget_after <= now:
+                self._revoked.pop(user_id, None)
+            elif issued_ms <= revoked_ms:
+                raise InvalidToken('token revoked')
+        return user_id
+
+    def revoke(self, user_id):
+        """Invalidate every token issued to user_id so far, in every process."""
+        now = time.time()
+        revoked_ms, forget_after = int(now * 1000), now + self.max_age
+        if self.engine is not None:
+            table = TokenRevocation.__table__
+            with self.engine.begin() as connection:
+                connection.execute(insert(table).values(
+                    user_id=user_id, revoked_ms=revoked_ms, forget_after=forget_after))
+                connection.execute(delete(table).where(table.c.forget_after <= now))
+        self._remember(user_id, revoked_ms, forget_after)
+        self.evict_expired(now)
+
+    def _remember(self, user_id, revoked_ms, forget_after):
+        with self._lock:
+            known = self._revoked.get(user_id)
+            if known is None or known[0] < revoked_ms:
+                self._revoked[user_id] = (revoked_ms, forget_after)
+            self._cache.pop(user_id, None)
+
+    def poll(self):
+        """Read revocations made by other processes, at most once per poll_interval."""
+        if self.engine is None or time.monotonic() < self._next_poll:
+            return
+        self._next_poll = time.monotonic() + self.poll_interval
+        table = TokenRevocation.__table__
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    select(table.c.id, table.c.user_id, table.c.revoked_ms, table.c.forget_after)
+                    .where(table.c.id > self._seen_id, table.c.forget_after > time.time())
+                    .order_by(table.c.id)).all()
+        except SQLAlchemyError:
+            # Keep verifying against what is known; retried next interval.
+            log.exception('reading token revocations failed')
+            return
+        for row_id, user_id, revoked_ms, forget_after in rows:
+            self._remember(user_id, revoked_ms, forget_after)
+            self._seen_id = max(self._seen_id, row_id)
+
+    def evict_expired(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            for user_id in [uid for uid, (_, forget_after) in self._revoked.items()
+                            if forget_after <= now]:
+                del self._revoked[user_id]
+
+    def invalidate_user(self, user_id):
+        """Drop a cached UserView, e.g. after the User row changed."""
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def load_user(self, token):
+        """Resolve a token to a cached UserView; None if the user is gone."""
+        user_id = self.verify(token)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and now - cached[1] < self.cache_ttl:
+                self._cache.move_to_end(user_id)
+                return cached[0]
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        view = UserView(*(getattr(user, field) for field in UserView._fields))
+        with self._lock:
+            self._cache[user_id] = (view, now)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return view
+
+
+tokens = TokenManager()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    tokens.invalidate_user(target.id)
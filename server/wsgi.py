@@ -0,0 +1,15 @@
+"""WSGI entry point for pre-fork servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is built and warmed once in the master; each forked worker then
+resets its connections and thread pools (see prefork.py).
+"""
+import os
+
+import prefork
+from app import create_app
+
+app = create_app(os.environ.get('APP_CONFIG', 'production'))
+prefork.warm_up(app)
+prefork.install(app)